@@ -0,0 +1,161 @@
+""" Runs many jobs of the same kind of step in one process, from a manifest file named by
+INPUT_BATCH_MANIFEST. The manifest is YAML (a list of jobs, or a mapping with a 'jobs' list) or,
+for files ending in .ndjson or .jsonl, one JSON job per line. A job is a mapping of the action's
+inputs for that run, e.g.
+
+    - id: run-1
+      WORKFLOW_NODE_ID: workflow|workflow|1.0.0|...
+      STEP_NAME: process_data
+      INPUT_PARAMETERS_FILE_PATH: runs/1/input.yaml
+
+Keys are the input names as in action.yml (GITHUB_* variables, such as GITHUB_RUN_ID, are
+used as they are) and override the environment for that job only. Jobs run on a
+thread pool of INPUT_BATCH_CONCURRENCY workers, sharing the schema registry and the metastore
+connection, and one result record per job is appended to the results file (NDJSON) as soon as
+the job finishes. A failed job is recorded and the rest of the batch carries on. """
+import json
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml as YAML
+
+from utils.utils import setupLogger, KnownException  # noqa
+
+DEFAULT_BATCH_CONCURRENCY = 4
+NDJSON_SUFFIXES = [".ndjson", ".jsonl"]
+UNPREFIXED_VARIABLE_PREFIX = "GITHUB_"
+
+
+def load_manifest(manifest_path) -> list:
+    """ Reads the jobs from a YAML or NDJSON manifest. """
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        raise KnownException(
+            f"INPUT_BATCH_MANIFEST - The manifest '{str(manifest_path)}' does not exist."
+        )
+
+    manifest_text = manifest_path.read_text()
+    if manifest_path.suffix in NDJSON_SUFFIXES:
+        jobs = []
+        for (line_number, line) in enumerate(manifest_text.splitlines(), start=1):
+            if line.strip() == "":
+                continue
+            try:
+                jobs.append(json.loads(line))
+            except ValueError as ve:
+                raise KnownException(
+                    f"Line {line_number} of the manifest '{str(manifest_path)}' is not valid JSON: {str(ve)}"
+                )
+    else:
+        jobs = YAML.safe_load(manifest_text)
+        if isinstance(jobs, dict):
+            jobs = jobs.get("jobs", None)
+
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise KnownException(
+            f"The manifest '{str(manifest_path)}' should be a list of jobs (mappings of inputs), or a mapping with a 'jobs' list."
+        )
+    return jobs
+
+
+def get_job_id(job: dict, index: int) -> str:
+    return str(job.get("id", index))
+
+
+def get_job_environ(environ, job: dict) -> dict:
+    """ Returns environ with the job's inputs applied. Mappings and lists (e.g. the contents
+    of INPUT_PARAMETERS_RAW) are written as YAML. """
+    job_environ = dict(environ)
+    for (name, value) in job.items():
+        if name == "id":
+            continue
+        if not name.startswith(UNPREFIXED_VARIABLE_PREFIX):
+            name = f"INPUT_{name}"
+        if isinstance(value, (dict, list)):
+            value = YAML.safe_dump(value)
+        job_environ[name] = str(value)
+    return job_environ
+
+
+def get_results_path(manifest_path, results_path: str = "") -> Path:
+    """ Returns results_path, or '<manifest>.results.ndjson' next to the manifest. """
+    if results_path != "":
+        return Path(results_path)
+    manifest_path = Path(manifest_path)
+    return manifest_path.with_name(f"{manifest_path.stem}.results.ndjson")
+
+
+class ResultStream:
+    """ Appends result records to an NDJSON file, one line per record, from any thread. """
+
+    def __init__(self, results_path: Path):
+        self.results_path = Path(results_path)
+        self.results_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(str(self.results_path), "w")
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        with self._lock:
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def run_batch(
+    jobs: list,
+    environ,
+    run_job_function,
+    result_stream: ResultStream,
+    max_concurrency: int = None,
+) -> list:
+    """ Runs run_job_function(job environ) for every job, at most max_concurrency at a time.
+    It returns the job's StepResult. Returns the result records in manifest order; each is
+    also written to result_stream as its job finishes. """
+    if max_concurrency is None:
+        max_concurrency = DEFAULT_BATCH_CONCURRENCY
+
+    def run_batch_job(index: int, job: dict) -> dict:
+        job_environ = get_job_environ(environ, job)
+        record = {
+            "id": get_job_id(job, index),
+            "workflow_node_id": job_environ.get("INPUT_WORKFLOW_NODE_ID", ""),
+            "step_name": job_environ.get("INPUT_STEP_NAME", ""),
+        }
+        try:
+            step_result = run_job_function(job_environ)
+            record.update(
+                {
+                    "status": "succeeded",
+                    "input_node_id": step_result.input_node_id,
+                    "execution_node_id": step_result.execution_node_id,
+                    "output_node_id": step_result.output_node_id,
+                    "log_node_id": step_result.log_node_id,
+                }
+            )
+        except Exception as e:
+            setupLogger().get_root_logger().critical(
+                f"Job '{record['id']}' failed: {str(e)}"
+            )
+            record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+
+        result_stream.write(record)
+        return record
+
+    with ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="batch-job"
+    ) as job_executor:
+        record_futures = [
+            job_executor.submit(run_batch_job, index, job)
+            for (index, job) in enumerate(jobs)
+        ]
+        return [record_future.result() for record_future in record_futures]
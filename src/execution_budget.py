@@ -0,0 +1,281 @@
+""" Runs a step's execution (INPUT_EXECUTION_FILE or StepExecution) in a child process with a
+wall clock budget (INPUT_EXECUTION_TIMEOUT, in seconds) and a memory budget
+(INPUT_EXECUTION_MEMORY_LIMIT_MB, of resident memory). INPUT_EXECUTION_ISOLATION=process runs it
+in a child process without limits.
+
+The step's process is not forked, since it has other threads running (the execution profiler's,
+and the I/O or step scheduler workers) whose locks a forked child could inherit mid-update. The
+child is forked instead from multiprocessing's forkserver, a single-threaded process started
+once per step process with main (and so mlspeclib) already imported. The child is sent the
+environment, the loaded schema indexes (it registers schemas from them as it needs them) and
+the arguments, with MLObjects as plain dicts. What it prints is sent back to the step as it
+happens (and so reaches the raw log), and its results object comes back as a plain dict over
+the same pipe. As with any start method but fork, the child imports the script the step
+process was started from, so a script that runs steps needs an `if __name__ == "__main__":`
+guard (main.py and step_daemon.py have one).
+
+The parent polls the child's resident memory from /proc every 50ms (DEFAULT_POLL_INTERVAL)
+while it waits, and kills the child as soon as either budget is exceeded. The memory budget is
+only checked at those polls, so an execution that allocates quickly can go past it between
+two of them. """
+import os
+import sys
+import time
+import signal
+import traceback
+import multiprocessing
+
+from mlspeclib import MLObject
+
+from utils.utils import KnownException  # noqa
+from schema_registry import get_loaded_indexes, lazy_loading_scope  # noqa
+
+DEFAULT_POLL_INTERVAL = 0.05
+# Imported by the forkserver before it forks any child.
+FORKSERVER_PRELOAD = ["main"]
+EXIT_GRACE_SECONDS = 5
+
+
+class ExecutionFailed(KnownException):
+    """ Raised when the child ended without results that could be read back. resource_usage
+    holds what it used, and its exit code. """
+
+    def __init__(self, message: str, resource_usage: dict):
+        super().__init__(message)
+        self.resource_usage = resource_usage
+
+
+class ExecutionBudgetExceeded(ExecutionFailed):
+    """ Raised when the execution was stopped for running over its budget. resource_usage
+    holds what it used up to then. """
+
+
+class ExecutionBudget:
+    """ Limits for one step's execution, and (after run()) what it used. """
+
+    def __init__(
+        self,
+        timeout_seconds: float = None,
+        memory_limit_bytes: int = None,
+        isolated: bool = False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_bytes = memory_limit_bytes
+        self.isolated = (
+            isolated or timeout_seconds is not None or memory_limit_bytes is not None
+        )
+        self.poll_interval = poll_interval
+        self.resource_usage = None
+
+    @classmethod
+    def from_environ(cls, environ):
+        timeout = environ.get("INPUT_EXECUTION_TIMEOUT", "")
+        memory_limit = environ.get("INPUT_EXECUTION_MEMORY_LIMIT_MB", "")
+        return cls(
+            timeout_seconds=float(timeout) if timeout != "" else None,
+            memory_limit_bytes=int(float(memory_limit) * 1024 * 1024)
+            if memory_limit != ""
+            else None,
+            isolated=environ.get("INPUT_EXECUTION_ISOLATION", "").strip().lower()
+            == "process",
+        )
+
+    def describe(self) -> dict:
+        """ Limits and usage, for the log object's log_property_bag. """
+        return {
+            "timeout_seconds": self.timeout_seconds,
+            "memory_limit_bytes": self.memory_limit_bytes,
+            "resource_usage": self.resource_usage,
+        }
+
+    def run(self, function, *args, environ=None):
+        """ Returns function(*args), run in a child process within the budget, with environ
+        (os.environ if not given) as its environment. The function must be importable by name,
+        and its arguments and what it returns must be MLObjects or things that can be
+        pickled. """
+        if environ is None:
+            environ = os.environ
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        (reader, writer) = context.Pipe(duplex=False)
+        child = context.Process(
+            target=run_in_child,
+            args=(
+                writer,
+                dict(environ),
+                get_loaded_indexes(),
+                function,
+                [pack_value(arg) for arg in args],
+            ),
+            daemon=True,
+        )
+
+        start_time = time.monotonic()
+        child.start()
+        writer.close()
+
+        self.resource_usage = {
+            "wall_seconds": 0.0,
+            "peak_rss_bytes": 0,
+            "exit_code": None,
+            "stopped_for": None,
+        }
+        outcome = None
+        receive_error = None
+        try:
+            # The child's last message is its outcome; if it dies first, the pipe is closed.
+            while outcome is None:
+                if reader.poll(self.poll_interval):
+                    try:
+                        message = reader.recv()
+                    except EOFError:
+                        break
+                    except Exception as e:
+                        # e.g. an exception raised in the child whose class can't be
+                        # unpickled here.
+                        receive_error = e
+                        break
+                    if message[0] in ["stdout", "stderr"]:
+                        getattr(sys, message[0]).write(message[1])
+                    else:
+                        outcome = message
+                        break
+                self.check_child(child, start_time)
+        finally:
+            reader.close()
+            if outcome is not None or receive_error is not None:
+                # The child is done once its outcome is sent (readable or not); let it exit
+                # on its own.
+                child.join(EXIT_GRACE_SECONDS)
+            if child.is_alive():
+                # SIGKILL, since a runaway step may not stop for SIGTERM (Process.kill() is
+                # python 3.7+).
+                os.kill(child.pid, signal.SIGKILL)
+            child.join()
+            self.resource_usage["wall_seconds"] = round(
+                time.monotonic() - start_time, 3
+            )
+            self.resource_usage["exit_code"] = child.exitcode
+
+        if receive_error is not None:
+            raise ExecutionFailed(
+                f"The step's execution exited with code {child.exitcode}, and what it sent back could not be read: {type(receive_error).__name__}: {receive_error}",
+                self.resource_usage,
+            )
+        if outcome is None:
+            raise ExecutionFailed(
+                f"The step's execution exited with code {child.exitcode} before returning any results.",
+                self.resource_usage,
+            )
+        if outcome[0] == "error":
+            (_, exception, formatted_traceback) = outcome
+            sys.stderr.write(formatted_traceback)
+            raise exception
+        return unpack_value(outcome[1])
+
+    def check_child(self, child, start_time: float):
+        """ Records the child's memory and kills it if it is over either budget. """
+        rss_bytes = read_rss_bytes(child.pid)
+        self.resource_usage["peak_rss_bytes"] = max(
+            self.resource_usage["peak_rss_bytes"], rss_bytes
+        )
+        elapsed = time.monotonic() - start_time
+        self.resource_usage["wall_seconds"] = round(elapsed, 3)
+
+        if self.memory_limit_bytes is not None and rss_bytes > self.memory_limit_bytes:
+            self.resource_usage["stopped_for"] = "memory"
+            raise ExecutionBudgetExceeded(
+                f"The step's execution was stopped after using {rss_bytes // (1024 * 1024)} MB of memory (INPUT_EXECUTION_MEMORY_LIMIT_MB is {self.memory_limit_bytes // (1024 * 1024)} MB).",
+                self.resource_usage,
+            )
+        if self.timeout_seconds is not None and elapsed > self.timeout_seconds:
+            self.resource_usage["stopped_for"] = "timeout"
+            raise ExecutionBudgetExceeded(
+                f"The step's execution was stopped after running for {elapsed:.1f} seconds (INPUT_EXECUTION_TIMEOUT is {self.timeout_seconds} seconds).",
+                self.resource_usage,
+            )
+
+
+class ForwardingStream:
+    """ The child's stdout or stderr: sends each write to the parent. """
+
+    def __init__(self, connection, name: str):
+        self.connection = connection
+        self.name = name
+
+    def write(self, text: str) -> int:
+        if len(text) > 0:
+            self.connection.send((self.name, text))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def pack_value(value):
+    """ MLObjects hold their generated schema, which can't be pickled, so they are sent as
+    their type and contents. """
+    if isinstance(value, MLObject):
+        return (
+            "mlobject",
+            value.schema_type,
+            value.schema_version,
+            value.dict_without_internal_variables(),
+        )
+    return ("value", value)
+
+
+def unpack_value(packed_value):
+    if packed_value[0] == "mlobject":
+        (_, schema_type, schema_version, contents) = packed_value
+        ml_object = MLObject()
+        ml_object.set_type(schema_type=schema_type, schema_version=schema_version)
+        ml_object.update(contents)
+        return ml_object
+    return packed_value[1]
+
+
+def run_in_child(connection, environ, schema_indexes, function, packed_args):
+    sys.stdout = ForwardingStream(connection, "stdout")
+    sys.stderr = ForwardingStream(connection, "stderr")
+
+    try:
+        os.environ.clear()
+        os.environ.update(environ)
+        with lazy_loading_scope():
+            for schema_index in schema_indexes:
+                schema_index.enable_lazy_loading()
+
+            results = function(*[unpack_value(arg) for arg in packed_args])
+        message = ("results", pack_value(results))
+    except BaseException as e:
+        message = ("error", e, traceback.format_exc())
+
+    try:
+        connection.send(message)
+    except Exception as e:
+        # e.g. something in the results or the exception can't be pickled.
+        connection.send(
+            (
+                "error",
+                KnownException(f"The step's results could not be sent back: {str(e)}"),
+                "",
+            )
+        )
+    connection.close()
+
+
+def read_rss_bytes(pid: int) -> int:
+    """ Resident memory of the process, from /proc (0 where /proc isn't available). """
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
@@ -0,0 +1,94 @@
+""" Loads INPUT_EXECUTION_FILE as a module of its own instead of exec'ing it inside main. A file
+that defines the entry point
+
+    def execute(input_object, execution_object, results_ml_object):
+        ...
+        return results_ml_object
+
+is called with the step's input and execution objects and a results object already typed for the
+step's output (returning None keeps that object). A file without one runs as before: top level
+code that sees input_object, execution_object, results_ml_object,
+result_ml_object_schema_type and result_ml_object_schema_version, and leaves its results in
+results_ml_object. Either way the file runs in a fresh namespace, so nothing leaks into main.
+
+Compiled code is cached in memory by the sha256 of the file's content, so a daemon, batch or
+multi-step run compiles each version of a file once. It is never written to disk: code loaded
+from a cache directory would run whatever was planted there. """
+import types
+import hashlib
+import threading
+from pathlib import Path
+
+ENTRY_POINT = "execute"
+
+# Code objects by content hash, for runs in the same process.
+_code_cache = {}
+_code_cache_lock = threading.Lock()
+
+
+def get_content_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def compile_execution_file(execution_file_path: Path) -> (types.CodeType, str):
+    """ Returns the compiled code of the file and its content hash, compiling only if this
+    content has not been compiled before. """
+    source = Path(execution_file_path).read_text()
+    content_hash = get_content_hash(source)
+
+    with _code_cache_lock:
+        code = _code_cache.get(content_hash, None)
+    if code is not None:
+        return (code, content_hash)
+
+    code = compile(source, str(execution_file_path), "exec")
+
+    with _code_cache_lock:
+        _code_cache[content_hash] = code
+    return (code, content_hash)
+
+
+def defines_entry_point(code: types.CodeType) -> bool:
+    """ Whether the file defines a top level execute() function. """
+    return any(
+        isinstance(constant, types.CodeType) and constant.co_name == ENTRY_POINT
+        for constant in code.co_consts
+    )
+
+
+def run_execution_file(
+    execution_file_path: Path,
+    input_object,
+    execution_object,
+    results_ml_object,
+    result_ml_object_schema_type: str,
+    result_ml_object_schema_version: str,
+):
+    """ Runs the execution file and returns its results object. """
+    (code, content_hash) = compile_execution_file(execution_file_path)
+
+    module = types.ModuleType(f"mlspec_execution_{content_hash[:16]}")
+    module.__file__ = str(execution_file_path)
+
+    if defines_entry_point(code):
+        exec(code, module.__dict__)
+        results_ml_object.set_type(
+            schema_type=result_ml_object_schema_type,
+            schema_version=result_ml_object_schema_version,
+        )
+        returned_object = getattr(module, ENTRY_POINT)(
+            input_object, execution_object, results_ml_object
+        )
+        return results_ml_object if returned_object is None else returned_object
+
+    module.__dict__.update(
+        {
+            "input_object": input_object,
+            "execution_object": execution_object,
+            "results_ml_object": results_ml_object,
+            "result_ml_object_schema_type": result_ml_object_schema_type,
+            "result_ml_object_schema_version": result_ml_object_schema_version,
+        }
+    )
+    exec(code, module.__dict__)
+    return module.__dict__.get("results_ml_object", None)
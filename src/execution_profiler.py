@@ -0,0 +1,276 @@
+""" Measures what the machine does while a step's execution runs, and fills the results
+object's execution_profile with it. A background thread reads /proc every
+INPUT_EXECUTION_PROFILE_INTERVAL seconds (1 by default; 0 only reads at the start and the
+end) and keeps running totals and peaks of:
+
+    cpu_utilization            busy share of all CPUs, from /proc/stat
+    system_memory_utilization  share of memory not available, from /proc/meminfo
+    disk_io_utilization        busy share of the busiest disk, from /proc/diskstats
+    network_traffic_in_bytes   bytes received and sent on all but loopback, from /proc/net/dev
+
+The counters are machine wide, so they include an execution running in a child process
+(see execution_budget.py) and anything it starts. Each sample reads four small files and
+nothing is kept per sample, so it can stay on for every step.
+
+Fields the execution set itself are kept. /proc has nothing on GPUs, so the gpu_* fields
+are 0.0 unless the execution sets them. Where /proc is not available every field is 0. """
+import time
+import threading
+from pathlib import Path
+
+DEFAULT_SAMPLE_INTERVAL = 1.0
+PROC_PATH = Path("/proc")
+
+# Block devices that aren't disks.
+VIRTUAL_DISK_PREFIXES = ("loop", "ram", "zram")
+
+# Value for the execution_profile fields that aren't sampled (the gpu_* ones).
+UNSAMPLED_FIELD_VALUE = 0.0
+
+
+class ExecutionProfiler:
+    """ Samples /proc from start() to stop(); summary() has the averages and peaks. """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._first_reading = None
+        self._last_reading = None
+        self._peaks = {
+            "cpu_utilization": 0.0,
+            "disk_io_utilization": 0.0,
+            "network_bytes_per_second": 0.0,
+            "system_memory_utilization": 0.0,
+        }
+        self._memory_utilization_total = 0.0
+        self._disk_busy_seconds = 0.0
+
+    @classmethod
+    def from_environ(cls, environ):
+        interval = environ.get("INPUT_EXECUTION_PROFILE_INTERVAL", "")
+        return cls(float(interval) if interval != "" else DEFAULT_SAMPLE_INTERVAL)
+
+    def start(self):
+        with self._lock:
+            self._first_reading = read_proc_counters()
+            self._last_reading = self._first_reading
+            self._add_memory_sample(self._first_reading)
+        if self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._sample_until_stopped,
+                name="execution-profiler",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        # The last reading covers the time since the last sample.
+        self.sample()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop()
+
+    def _sample_until_stopped(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """ Reads /proc and adds the time since the previous reading to the totals. """
+        reading = read_proc_counters()
+        with self._lock:
+            previous = self._last_reading
+            elapsed = reading["time"] - previous["time"]
+            # A reading that failed is skipped; the next one covers its interval.
+            if elapsed <= 0 or reading["available"] is False:
+                return
+
+            self._peaks["cpu_utilization"] = max(
+                self._peaks["cpu_utilization"], get_cpu_utilization(previous, reading)
+            )
+
+            disk_busy_seconds = get_disk_busy_seconds(previous, reading)
+            self._disk_busy_seconds += disk_busy_seconds
+            self._peaks["disk_io_utilization"] = max(
+                self._peaks["disk_io_utilization"],
+                min(disk_busy_seconds / elapsed, 1.0),
+            )
+
+            network_bytes = reading["network_bytes"] - previous["network_bytes"]
+            self._peaks["network_bytes_per_second"] = max(
+                self._peaks["network_bytes_per_second"], max(network_bytes, 0) / elapsed
+            )
+
+            self._add_memory_sample(reading)
+            self._last_reading = reading
+
+    def _add_memory_sample(self, reading: dict):
+        self.sample_count += 1
+        self._memory_utilization_total += reading["memory_utilization"]
+        self._peaks["system_memory_utilization"] = max(
+            self._peaks["system_memory_utilization"], reading["memory_utilization"]
+        )
+
+    def summary(self) -> dict:
+        """ Averages over the whole run and peaks over any one interval, for the log object's
+        log_property_bag. """
+        with self._lock:
+            first = self._first_reading
+            last = self._last_reading
+            elapsed = max(last["time"] - first["time"], 0.0)
+            return {
+                "available": first["available"],
+                "interval_seconds": self.interval,
+                "sample_count": self.sample_count,
+                "wall_seconds": round(elapsed, 3),
+                "cpu_utilization": {
+                    "average": round(get_cpu_utilization(first, last), 4),
+                    "peak": round(self._peaks["cpu_utilization"], 4),
+                },
+                "system_memory_utilization": {
+                    "average": round(
+                        self._memory_utilization_total / self.sample_count, 4
+                    ),
+                    "peak": round(self._peaks["system_memory_utilization"], 4),
+                },
+                "disk_io_utilization": {
+                    "average": round(
+                        min(self._disk_busy_seconds / elapsed, 1.0)
+                        if elapsed > 0
+                        else 0.0,
+                        4,
+                    ),
+                    "peak": round(self._peaks["disk_io_utilization"], 4),
+                },
+                "network_traffic_in_bytes": {
+                    "total": max(last["network_bytes"] - first["network_bytes"], 0),
+                    "peak_bytes_per_second": round(
+                        self._peaks["network_bytes_per_second"], 1
+                    ),
+                },
+            }
+
+    def fill_execution_profile(self, results_ml_object):
+        """ Sets the execution_profile fields the execution left empty, if the results
+        object's schema has an execution_profile. """
+        execution_profile = results_ml_object.get("execution_profile", None)
+        if not isinstance(execution_profile, dict):
+            return
+
+        summary = self.summary()
+        sampled_values = {
+            "cpu_utilization": summary["cpu_utilization"]["average"],
+            "system_memory_utilization": summary["system_memory_utilization"][
+                "average"
+            ],
+            "disk_io_utilization": summary["disk_io_utilization"]["average"],
+            "network_traffic_in_bytes": summary["network_traffic_in_bytes"]["total"],
+        }
+        for (field_name, value) in execution_profile.items():
+            if value is not None or field_name == "nvidia_metrics":
+                continue
+            execution_profile[field_name] = sampled_values.get(
+                field_name, UNSAMPLED_FIELD_VALUE
+            )
+
+
+def read_proc_counters() -> dict:
+    """ One reading of the counters, with 'available' False where /proc can't be read. """
+    reading = {
+        "time": time.monotonic(),
+        "available": True,
+        "cpu_busy": 0,
+        "cpu_total": 0,
+        "memory_utilization": 0.0,
+        "disk_busy_ms": {},
+        "network_bytes": 0,
+    }
+    try:
+        (reading["cpu_busy"], reading["cpu_total"]) = read_cpu_times()
+        reading["memory_utilization"] = read_memory_utilization()
+        reading["disk_busy_ms"] = read_disk_busy_ms()
+        reading["network_bytes"] = read_network_bytes()
+    except (OSError, ValueError, IndexError, KeyError, ZeroDivisionError):
+        reading["available"] = False
+    return reading
+
+
+def read_cpu_times() -> (int, int):
+    """ Busy and total jiffies of all CPUs. """
+    with open(PROC_PATH / "stat") as stat_file:
+        fields = [int(field) for field in stat_file.readline().split()[1:9]]
+    # user nice system idle iowait irq softirq steal
+    idle = fields[3] + fields[4]
+    total = sum(fields)
+    return (total - idle, total)
+
+
+def read_memory_utilization() -> float:
+    """ Share of memory in use. Kernels older than 3.14 have no MemAvailable, so there it is
+    estimated from the free memory plus the buffers and page cache. """
+    memory = {}
+    with open(PROC_PATH / "meminfo") as meminfo_file:
+        for line in meminfo_file:
+            (name, value) = line.split(":", 1)
+            if name in ["MemTotal", "MemAvailable", "MemFree", "Buffers", "Cached"]:
+                memory[name] = int(value.split()[0])
+    available = memory.get("MemAvailable")
+    if available is None:
+        available = (
+            memory["MemFree"] + memory.get("Buffers", 0) + memory.get("Cached", 0)
+        )
+    return 1.0 - available / memory["MemTotal"]
+
+
+def read_disk_busy_ms() -> dict:
+    """ Milliseconds each disk has spent doing I/O (io_ticks). """
+    disk_busy_ms = {}
+    with open(PROC_PATH / "diskstats") as diskstats_file:
+        for line in diskstats_file:
+            fields = line.split()
+            if len(fields) < 13 or fields[2].startswith(VIRTUAL_DISK_PREFIXES):
+                continue
+            disk_busy_ms[fields[2]] = int(fields[12])
+    return disk_busy_ms
+
+
+def read_network_bytes() -> int:
+    """ Bytes received plus bytes sent on every interface but loopback. """
+    network_bytes = 0
+    with open(PROC_PATH / "net" / "dev") as dev_file:
+        for line in dev_file:
+            if ":" not in line:
+                continue  # Header lines
+            (interface, counters) = line.split(":", 1)
+            if interface.strip() == "lo":
+                continue
+            fields = counters.split()
+            network_bytes += int(fields[0]) + int(fields[8])
+    return network_bytes
+
+
+def get_cpu_utilization(previous: dict, reading: dict) -> float:
+    total = reading["cpu_total"] - previous["cpu_total"]
+    if total <= 0:
+        return 0.0
+    return (reading["cpu_busy"] - previous["cpu_busy"]) / total
+
+
+def get_disk_busy_seconds(previous: dict, reading: dict) -> float:
+    """ Busy time of the busiest disk between the two readings. """
+    busiest_ms = 0
+    for (disk, busy_ms) in reading["disk_busy_ms"].items():
+        busiest_ms = max(
+            busiest_ms, busy_ms - previous["disk_busy_ms"].get(disk, busy_ms)
+        )
+    return busiest_ms / 1000.0
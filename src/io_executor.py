@@ -0,0 +1,35 @@
+""" Executors for the metastore calls in sub_main. With concurrent I/O turned on, independent
+calls are submitted to a thread pool and only joined where a later phase needs the result.
+Otherwise a serial executor with the same interface runs each call as it is submitted, so
+sub_main keeps one code path and the original ordering. """
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class SerialExecutor:
+    """ Runs each call as soon as it is submitted and returns an already completed future.
+    Exceptions are raised from submit() itself, exactly where the serial code raised them. """
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        future = Future()
+        future.set_result(function(*args, **kwargs))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+        return False
+
+
+def get_io_executor(concurrent: bool, max_workers: int = DEFAULT_MAX_WORKERS):
+    if concurrent:
+        return ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="metastore-io"
+        )
+    return SerialExecutor()
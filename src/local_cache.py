@@ -0,0 +1,131 @@
+""" Helpers shared by the on-disk caches that are kept between step runs on the same host.
+
+Some entries (the schema registry snapshot) are unpickled, so whoever can write to the cache
+directory can run code in every step. The root is therefore private: the default one, in the
+system temp directory that every user shares, is per user and created with mode 0700, and a
+root (default or INPUT_CACHE_DIRECTORY) that is a symlink, belongs to another user, or can be
+written by its group or others is refused. The caches are then off for the run. """
+import os
+import stat
+import fcntl
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from utils.utils import setupLogger  # noqa
+
+CACHE_DIRECTORY_VARIABLE = "INPUT_CACHE_DIRECTORY"
+DEFAULT_CACHE_DIRECTORY_NAME = "mlspeclib-action-cache"
+
+# Roots already reported as unsafe, so each is only warned about once per process.
+_refused_roots = set()
+_refused_roots_lock = threading.Lock()
+
+
+def get_cache_root() -> Path:
+    """ Returns (and creates) the root of every cache, or None if it isn't safe to use. The
+    root is taken from INPUT_CACHE_DIRECTORY, falling back to a folder for this user in the
+    system temp directory. """
+    cache_root = os.environ.get(CACHE_DIRECTORY_VARIABLE, "")
+    if cache_root == "":
+        cache_root = (
+            Path(tempfile.gettempdir())
+            / f"{DEFAULT_CACHE_DIRECTORY_NAME}-{os.getuid()}"
+        )
+    cache_root = Path(cache_root)
+
+    try:
+        cache_root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        problem = get_ownership_problem(os.lstat(str(cache_root)))
+    except OSError as e:
+        problem = f"it can't be created ({e})"
+
+    if problem is None:
+        return cache_root
+
+    with _refused_roots_lock:
+        if str(cache_root) not in _refused_roots:
+            _refused_roots.add(str(cache_root))
+            setupLogger().get_root_logger().warning(
+                f"::warning::Not using the cache directory {cache_root}: {problem}. Caching is off."
+            )
+    return None
+
+
+def get_ownership_problem(directory_stat: os.stat_result):
+    """ Why a directory with this (lstat) status isn't private to this user, or None if it
+    is. """
+    if not stat.S_ISDIR(directory_stat.st_mode):
+        return "it is not a directory"
+    if directory_stat.st_uid != os.getuid():
+        return f"it belongs to user {directory_stat.st_uid}"
+    if directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return "its group or other users can write to it"
+    return None
+
+
+def get_cache_directory(cache_name: str) -> Path:
+    """ Returns (and creates) the directory for the named cache, or None if there is no
+    safe cache root (see get_cache_root). """
+    cache_root = get_cache_root()
+    if cache_root is None:
+        return None
+
+    cache_directory = cache_root / cache_name
+    cache_directory.mkdir(mode=0o700, exist_ok=True)
+    return cache_directory
+
+
+def hash_files(root_directory: Path, files: list) -> str:
+    """ Returns a sha256 hex digest over the relative path and content of every file. Files
+    are hashed in sorted order so the digest does not depend on directory listing order. """
+    digest = hashlib.sha256()
+    for file_path in sorted(files):
+        digest.update(str(Path(file_path).relative_to(root_directory)).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(Path(file_path).read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_file_stats(root_directory: Path, files: list) -> str:
+    """ Returns a sha256 hex digest over the root directory and the relative path, size and
+    modification time of every file. Cheap to compute, and changes whenever a file is
+    written (short of a same-size rewrite within the filesystem's timestamp resolution). """
+    digest = hashlib.sha256()
+    digest.update(str(Path(root_directory).resolve()).encode("utf-8"))
+    for file_path in sorted(files):
+        file_stat = Path(file_path).stat()
+        digest.update(b"\0")
+        digest.update(str(Path(file_path).relative_to(root_directory)).encode("utf-8"))
+        digest.update(f"\0{file_stat.st_size}\0{file_stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def atomic_write_bytes(file_path: Path, contents: bytes):
+    """ Writes to a temporary file next to the target and renames it into place, so that
+    concurrent readers never see a partially written file. """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    (handle, temp_path) = tempfile.mkstemp(dir=str(file_path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(contents)
+        os.replace(temp_path, str(file_path))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def locked(lock_path: Path):
+    """ Serializes updates to a cache between steps running concurrently on one host. """
+    with open(str(lock_path), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
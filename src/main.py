@@ -9,12 +9,10 @@ import sys
 from io import StringIO
 import datetime
 import uuid
+from collections import namedtuple
 import marshmallow
 from marshmallow.class_registry import RegistryError
 import base64
-import git
-from git import GitCommandError
-import tempfile
 from mlspeclib import MLObject, MLSchema
 from mlspeclib.experimental.metastore import Metastore
 
@@ -29,7 +27,35 @@ from utils.utils import (  # noqa
     setupLogger,
     KnownException,
 )  # noqa
-from step_execution import StepExecution  # noqa
+from schema_registry import load_schema_index, lazy_loading_scope  # noqa
+from schema_git_cache import fetch_schemas_from_git  # noqa
+from io_executor import get_io_executor  # noqa
+from step_info_batch import StepInfoWriter, StepInfoBatch  # noqa
+from execution_loader import run_execution_file  # noqa
+from execution_budget import ExecutionBudget, ExecutionFailed  # noqa
+from execution_profiler import ExecutionProfiler  # noqa
+from tracing import TracedMetastore, get_tracer, reset_tracer  # noqa
+from step_output import (  # noqa
+    open_output_sink,
+    write_base64_yaml,
+    DEFAULT_OUTPUT_ENCODING,
+)
+from parameter_loader import (  # noqa
+    load_parameters_file,
+    load_yaml,
+    decode_base64_parameters,
+)
+from object_cache import ObjectCache  # noqa
+from workflow_cache import WorkflowCache  # noqa
+from validator_codegen import validate_object, create_object_from_string  # noqa
+from raw_log_store import (  # noqa
+    ChunkedLogWriter,
+    open_blob_store,
+    capture_log,
+    delete_expired_logs,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_RETENTION_DAYS,
+)
 
 REQUIRED = [
     "INPUT_WORKFLOW_NODE_ID",
@@ -41,6 +67,21 @@ REQUIRED = [
 
 CONTRACT_TYPES = ["input", "execution", "output", "log"]
 
+# What process_step returns: the step's results and the IDs of the nodes it attached.
+StepResult = namedtuple(
+    "StepResult",
+    [
+        "results_ml_object",
+        "input_node_id",
+        "execution_node_id",
+        "output_node_id",
+        "log_node_id",
+    ],
+)
+
+# Metastore connections by credentials, once keep_metastore_connections() is called.
+_metastore_connections = None
+
 
 def main():
     turn_debug_on = os.environ.get("INPUT_ACTIONS_STEP_DEBUG", False)
@@ -71,64 +112,307 @@ def main():
 
 
 def sub_main():
-    rootLogger = setupLogger().get_root_logger()
+    """ Runs the step with every phase traced. If INPUT_TRACE_FILE is set, the spans are
+    written there as a Chrome trace, whether or not the step succeeds. Lazy schema loading
+    (see load_schemas) ends with the run. If INPUT_SYNC_TO_METASTORE_CREDENTIALS is set, what
+    the run recorded in the local SQLite metastore is then synced to that metastore, whether
+    or not the step succeeds. """
+    trace_file = os.environ.get("INPUT_TRACE_FILE", "")
+    # Without a trace file only the per-phase totals are kept, not every span.
+    tracer = reset_tracer(keep_spans=trace_file != "")
+    try:
+        with tracer.span("sub_main"), lazy_loading_scope():
+            try:
+                if os.environ.get("INPUT_BATCH_MANIFEST", "") != "":
+                    run_batch_manifest()
+                elif os.environ.get("INPUT_STEP_NAMES", "") != "":
+                    run_workflow_steps()
+                else:
+                    run_step()
+            finally:
+                sync_metastore()
+    finally:
+        if trace_file != "":
+            tracer.write_chrome_trace(trace_file)
+
+
+def sync_metastore():
+    """ Replays the nodes the SQLite metastore (INPUT_METASTORE_CREDENTIALS with 'backend:
+    sqlite') hasn't synced yet to the metastore in INPUT_SYNC_TO_METASTORE_CREDENTIALS (see
+    SQLiteMetastore.sync_to). Does nothing if that isn't set. """
+    sync_credentials = os.environ.get("INPUT_SYNC_TO_METASTORE_CREDENTIALS", "")
+    if sync_credentials == "":
+        return
+
+    local_metastore = connect_to_metastore(
+        os.environ.get("INPUT_METASTORE_CREDENTIALS")
+    )
+    from sqlite_metastore import SQLiteMetastore  # noqa
 
-    # Loading input values
-    msg = "::debug::Loading input values"
-    print_left_message("Loading variables from environment...")
-    rootLogger.debug(msg)
+    if not isinstance(local_metastore, SQLiteMetastore):
+        raise KnownException(
+            "INPUT_SYNC_TO_METASTORE_CREDENTIALS is set, but INPUT_METASTORE_CREDENTIALS is not a 'backend: sqlite' metastore, so there is nothing to sync."
+        )
 
-    parameters = convert_environment_variables_to_dict()
+    print_left_message("Syncing the local metastore ...")
+    with get_tracer().span("sync_metastore"):
+        synced_count = local_metastore.sync_to(connect_to_metastore(sync_credentials))
+    print("{:>15}".format(f"{synced_count} nodes"))  # Finished syncing
 
-    print("{:>15}".format("ok"))  # Finished loading from environment
 
-    parameters.INPUT_SCHEMAS_DIRECTORY = os.environ.get("INPUT_SCHEMAS_DIRECTORY")
+def run_step():
+    tracer = get_tracer()
+
+    (parameters, concurrent_io) = load_step_parameters()
+    (schema_index, ms) = start_up(parameters, concurrent_io)
+
+    step_result = process_step(os.environ, parameters, schema_index, ms)
+
+    print("Printing output ... \n \n")
+    with open_output_sink() as output_sink, tracer.span("write_outputs"):
+        write_step_outputs(output_sink, step_result, "", get_output_encoding())
+    print("\n\n... finished printing output")  # Finished printing output
+
+
+def run_workflow_steps():
+    """ Runs the steps listed in INPUT_STEP_NAMES (see step_scheduler.py), sharing one startup,
+    one workflow object and one metastore connection between them. Outputs are named
+    '<step>_<output>'. Raises a KnownException naming the failed steps, after the outputs of
+    the others have been written. """
+    from step_scheduler import (  # noqa
+        select_steps,
+        build_step_graph,
+        get_step_environ,
+        has_own_input_parameters,
+        run_steps,
+    )
+
+    rootLogger = setupLogger().get_root_logger()
+    tracer = get_tracer()
+
+    (parameters, concurrent_io) = load_step_parameters(
+        required=[var for var in REQUIRED if var != "INPUT_STEP_NAME"]
+    )
+    (schema_index, ms) = start_up(parameters, concurrent_io)
+
+    # Steps run on several threads, so fill mlspeclib's own schemas before they race to do
+    # it in set_type.
+    MLSchema.populate_registry()
 
-    if "INPUT_SCHEMAS_GIT_URL" in os.environ and os.environ.get != "":
-        parameters.INPUT_SCHEMAS_GIT_URL = os.environ.get("INPUT_SCHEMAS_GIT_URL")
-        print_left_message(
-            f"Downloading schemas from {parameters.INPUT_SCHEMAS_GIT_URL}..."
+    workflow_node_id = parameters.INPUT_WORKFLOW_NODE_ID
+    print_left_message(f"Loading workflow object ID: '{workflow_node_id}' ...")
+    workflow_object = tracer.wrap("load_workflow_object", load_workflow_object)(
+        workflow_node_id, ms
+    )
+    if workflow_object is None:
+        raise KnownException(
+            f"The workflow object '{workflow_node_id}' did not validate, so no steps were run."
         )
-        try:
-            git.Git(parameters.INPUT_SCHEMAS_DIRECTORY).clone(
-                parameters.INPUT_SCHEMAS_GIT_URL, str(uuid.uuid4()), depth=1
+    print("{:>15}".format("ok"))  # Finished loading workload abject
+
+    step_names = select_steps(workflow_object, split_list_variable("INPUT_STEP_NAMES"))
+    step_graph = build_step_graph(workflow_object, step_names)
+    rootLogger.debug(f"::debug::Step dependencies: {step_graph}")
+
+    def run_workflow_step(step_name: str, previous_results: dict) -> StepResult:
+        step_environ = get_step_environ(os.environ, step_name)
+
+        # A step chained to a single previous step takes its results as input, unless the
+        # step was given its own input parameters.
+        input_parameters = None
+        if len(previous_results) == 1 and not has_own_input_parameters(
+            os.environ, step_name
+        ):
+            previous_result = list(previous_results.values())[0]
+            input_parameters = (
+                previous_result.results_ml_object.dict_without_internal_variables()
             )
-            # TODO: Authenticate with GH Token?
-            print("{:>15}".format("ok"))  # Finished loading from GIT URL
-        except GitCommandError as gce:
-            raise KnownException(
-                f"Trying to read from the git repo ({parameters.INPUT_SCHEMAS_GIT_URL}) and write to the directory ({parameters.INPUT_SCHEMAS_DIRECTORY}). Full error follows: {str(gce)}"
+
+        # The step's log object summarizes the step's own spans (see tracing.py).
+        step_tracer = tracer.child()
+        with step_tracer.activate(), step_tracer.span(f"step.{step_name}"):
+            return process_step(
+                step_environ,
+                convert_environment_variables_to_dict(step_environ),
+                schema_index,
+                ms,
+                workflow_object=workflow_object,
+                input_parameters=input_parameters,
             )
 
-    print_left_message("Appending schemas to registry...")
-    MLSchema.append_schema_to_registry(Path(parameters.INPUT_SCHEMAS_DIRECTORY))
-    print("{:>15}".format("ok"))  # Finished loading registry
+    max_parallel_steps = os.environ.get("INPUT_MAX_PARALLEL_STEPS", "")
+    (step_results, step_failures) = run_steps(
+        step_graph,
+        run_workflow_step,
+        int(max_parallel_steps) if max_parallel_steps != "" else None,
+    )
 
-    parameters.previous_step_name = os.environ.get("INPUT_PREVIOUS_STEP_NAME", "")
-    parameters.next_step_name = os.environ.get("INPUT_NEXT_STEP_NAME", "")
-    rootLogger.debug("::debug:: Finished main")
+    print("Printing output ... \n \n")
+    with open_output_sink() as output_sink, tracer.span("write_outputs"):
+        for step_name in step_names:
+            if step_name in step_results:
+                write_step_outputs(
+                    output_sink,
+                    step_results[step_name],
+                    f"{step_name}_",
+                    get_output_encoding(),
+                )
+    print("\n\n... finished printing output")  # Finished printing output
 
-    # Load metastore credentials
+    if len(step_failures) > 0:
+        raise KnownException(
+            "Failed steps: "
+            + "; ".join(
+                f"{step_name}: {str(step_failures[step_name])}"
+                for step_name in step_names
+                if step_name in step_failures
+            )
+        )
 
-    rootLogger.debug("::debug:: Loading credentials")
-    print_left_message("Loading and validating metastore credentials...")
-    metastore_cred_string_blob = os.environ.get("INPUT_METASTORE_CREDENTIALS")
 
-    metastore_credentials_packed = YAML.safe_load(metastore_cred_string_blob)
-    metastore_credentials_string = base64.urlsafe_b64decode(
-        metastore_credentials_packed
-    ).decode("utf-8")
-    metastore_credentials = YAML.safe_load(metastore_credentials_string)
+def run_batch_manifest():
+    """ Runs every job in the INPUT_BATCH_MANIFEST manifest (see batch_manifest.py), sharing
+    one startup and one metastore connection between them. Raises a KnownException once the
+    whole batch has run if any job failed. """
+    from batch_manifest import (  # noqa
+        load_manifest,
+        get_results_path,
+        run_batch,
+        ResultStream,
+    )
 
-    report_found_params(
-        ["url", "key", "database_name", "container_name"], metastore_credentials
+    tracer = get_tracer()
+
+    # The workflow node and the step are given per job.
+    (parameters, concurrent_io) = load_step_parameters(
+        required=[
+            var
+            for var in REQUIRED
+            if var not in ["INPUT_WORKFLOW_NODE_ID", "INPUT_STEP_NAME"]
+        ]
     )
-    print("{:>15}".format("ok"))  # Finished loading and validating metastore
-    rootLogger.debug("::debug::Starting metastore connection")
+    (schema_index, ms) = start_up(parameters, concurrent_io)
+
+    # Jobs run on several threads, so fill mlspeclib's own schemas before they race to do
+    # it in set_type.
+    MLSchema.populate_registry()
+
+    manifest_path = os.environ.get("INPUT_BATCH_MANIFEST")
+    print_left_message(f"Loading batch manifest '{manifest_path}' ...")
+    jobs = load_manifest(manifest_path)
+    print("{:>15}".format(f"{len(jobs)} jobs"))  # Finished loading the manifest
+
+    def run_batch_job(job_environ: dict) -> StepResult:
+        job_tracer = tracer.child()
+        with job_tracer.activate(), job_tracer.span("batch_job"):
+            return process_step(
+                job_environ,
+                convert_environment_variables_to_dict(job_environ),
+                schema_index,
+                ms,
+            )
+
+    results_path = get_results_path(
+        manifest_path, os.environ.get("INPUT_BATCH_RESULTS_FILE", "")
+    )
+    batch_concurrency = os.environ.get("INPUT_BATCH_CONCURRENCY", "")
+    with ResultStream(results_path) as result_stream:
+        records = run_batch(
+            jobs,
+            os.environ,
+            run_batch_job,
+            result_stream,
+            int(batch_concurrency) if batch_concurrency != "" else None,
+        )
+
+    failed_count = len([record for record in records if record["status"] == "failed"])
+
+    print("Printing output ... \n \n")
+    with open_output_sink() as output_sink:
+        output_sink.write_output("batch_results_file", str(results_path))
+        output_sink.write_output("batch_succeeded", len(records) - failed_count)
+        output_sink.write_output("batch_failed", failed_count)
+    print("\n\n... finished printing output")  # Finished printing output
+
+    if failed_count > 0:
+        raise KnownException(
+            f"{failed_count} of {len(records)} jobs in the batch failed. Their errors are in {str(results_path)}."
+        )
+
+
+def load_step_parameters(required: list = REQUIRED) -> (Box, bool):
+    """ Reads the step's settings from the environment. Returns them and whether concurrent
+    I/O is turned on. """
+    rootLogger = setupLogger().get_root_logger()
+
+    # Loading input values
+    msg = "::debug::Loading input values"
+    print_left_message("Loading variables from environment...")
+    rootLogger.debug(msg)
+
+    with get_tracer().span("convert_environment_variables_to_dict"):
+        parameters = convert_environment_variables_to_dict(required=required)
+
+    print("{:>15}".format("ok"))  # Finished loading from environment
+
+    parameters.INPUT_SCHEMAS_DIRECTORY = os.environ.get("INPUT_SCHEMAS_DIRECTORY")
+    parameters.INPUT_SCHEMAS_GIT_URL = os.environ.get("INPUT_SCHEMAS_GIT_URL", "")
+    parameters.INPUT_SCHEMAS_GIT_REF = os.environ.get("INPUT_SCHEMAS_GIT_REF", "HEAD")
 
-    print_left_message("Starting connection to metastore...")
-    ms = load_metastore_connection(metastore_credentials_packed)
-    print("{:>15}".format("ok"))  # Finished connecting to metastore
+    # Independent metastore calls are overlapped when INPUT_CONCURRENT_IO is set. Joins
+    # (.result()) are placed where a later phase actually needs the value.
+    concurrent_io = is_true(os.environ.get("INPUT_CONCURRENT_IO", ""))
+
+    return (parameters, concurrent_io)
+
+
+def start_up(parameters: Box, concurrent_io: bool) -> (object, Metastore):
+    """ Loads the schemas and connects to the metastore. Returns the schema index and the
+    (traced) metastore connection, which can be shared by every step run in this process. """
+    rootLogger = setupLogger().get_root_logger()
+    tracer = get_tracer()
+
+    # Startup runs as two independent phases - schemas (git, then registry) and the
+    # metastore (credentials, then connection) - joined before the first metastore read.
+    # Progress is printed as each phase is joined, in the same order as always.
+    with get_io_executor(concurrent_io, max_workers=2) as startup_executor:
+        schemas_future = startup_executor.submit(
+            tracer.wrap("startup.load_schemas", load_schemas), parameters
+        )
+        metastore_future = startup_executor.submit(
+            tracer.wrap("startup.connect_to_metastore", connect_to_metastore),
+            os.environ.get("INPUT_METASTORE_CREDENTIALS"),
+        )
+
+        if parameters.INPUT_SCHEMAS_GIT_URL != "":
+            print_left_message(
+                f"Downloading schemas from {parameters.INPUT_SCHEMAS_GIT_URL}..."
+            )
+        (schema_index, fetched, snapshot_hit) = schemas_future.result()
+        if parameters.INPUT_SCHEMAS_GIT_URL != "":
+            print(
+                "{:>15}".format("ok (fetched)" if fetched else "ok (cached)")
+            )  # Finished loading from GIT URL
+
+        print_left_message("Appending schemas to registry...")
+        print(
+            "{:>15}".format("ok (hit)" if snapshot_hit else "ok (miss)")
+        )  # Finished loading registry, reporting whether the snapshot was reused
+
+        parameters.previous_step_name = os.environ.get("INPUT_PREVIOUS_STEP_NAME", "")
+        parameters.next_step_name = os.environ.get("INPUT_NEXT_STEP_NAME", "")
+        rootLogger.debug("::debug:: Finished main")
+
+        rootLogger.debug("::debug:: Loading credentials")
+        print_left_message("Loading and validating metastore credentials...")
+        # Every metastore call from here on is traced as 'metastore.<method>', in the tracer
+        # current where it is made.
+        ms = TracedMetastore(metastore_future.result())
+        print("{:>15}".format("ok"))  # Finished loading and validating metastore
+        rootLogger.debug("::debug::Starting metastore connection")
+
+        print_left_message("Starting connection to metastore...")
+        print("{:>15}".format("ok"))  # Finished connecting to metastore
 
     workflow_node_id = os.environ.get("INPUT_WORKFLOW_NODE_ID")
     if workflow_node_id == "":
@@ -136,191 +420,334 @@ def sub_main():
             "INPUT_WORKFLOW_NODE_ID - No workflow node id was provided."
         )
 
-    print_left_message(f"Loading workflow object ID: '{workflow_node_id}' ...")
-    workflow_object = load_workflow_object(workflow_node_id, ms)
-    print("{:>15}".format("ok"))  # Finished loading workload abject
-
-    rootLogger.debug("::debug::Loading input parameters")
-    print_left_message("Loading input parameters ...")
-    input_parameters = load_parameters("INPUT", ms)
-    print("{:>15}".format("ok"))  # Finished loading input parameters from metastore
-
-    rootLogger.debug("::debug::Loading execution parameters file")
-    print_left_message("Loading execution parameters ...")
-    execution_parameters = load_parameters("EXECUTION", ms)
-    print(
-        "{:>15}".format("ok")
-    )  # Finished loading execution  parameters from metastore
+    if concurrent_io:
+        # Fill mlspeclib's own schemas before worker threads race to do it in set_type.
+        MLSchema.populate_registry()
+
+    return (schema_index, ms)
+
+
+def process_step(
+    environ,
+    parameters: Box,
+    schema_index,
+    ms: Metastore,
+    workflow_object: MLObject = None,
+    input_parameters=None,
+) -> StepResult:
+    """ Loads, validates, executes and records one step, reading its settings from environ.
+    The workflow object and the input parameters are loaded here unless they are passed in.
+    If INPUT_RAW_LOG_STORE is set, everything the step prints or logs is kept there as its raw
+    log (see raw_log_store.py), and logs older than INPUT_RAW_LOG_RETENTION_DAYS are removed.
+    Returns the results object and the IDs of the input, execution, output and log nodes. """
+    rootLogger = setupLogger().get_root_logger()
+    tracer = get_tracer()
 
+    workflow_node_id = parameters.INPUT_WORKFLOW_NODE_ID
     step_name = parameters.INPUT_STEP_NAME
-    print_left_message(f"Loading contract for '{step_name}.input' ...")
-    input_object = load_contract_object(
-        parameters=input_parameters,
-        workflow_object=workflow_object,
-        step_name=step_name,
-        contract_type="input",
-    )
-    print(
-        "{:>15}".format("ok")
-    )  # Finished loading execution  parameters from metastore
-
-    print(f"Attaching step info to input for '{step_name}.input' ... ")
-    input_node_id = ms.attach_step_info(
-        input_object,
-        workflow_object.schema_version,
-        workflow_node_id,
-        step_name,
-        "input",
-    )
-    print(f"     Input Node ID: {input_node_id}")  # Finished attaching step ID to input
+    concurrent_io = is_true(environ.get("INPUT_CONCURRENT_IO", ""))
+
+    raw_log = None
+    raw_log_store_url = environ.get("INPUT_RAW_LOG_STORE", "")
+    if raw_log_store_url != "":
+        raw_log_store = open_blob_store(raw_log_store_url)
+        raw_log_retention_days = environ.get("INPUT_RAW_LOG_RETENTION_DAYS", "")
+        with tracer.span("delete_expired_raw_logs"):
+            delete_expired_logs(
+                raw_log_store,
+                float(raw_log_retention_days)
+                if raw_log_retention_days != ""
+                else DEFAULT_RETENTION_DAYS,
+            )
+        raw_log_chunk_size = environ.get("INPUT_RAW_LOG_CHUNK_SIZE", "")
+        raw_log = ChunkedLogWriter(
+            raw_log_store,
+            int(raw_log_chunk_size) if raw_log_chunk_size != "" else DEFAULT_CHUNK_SIZE,
+        )
 
-    rootLogger.debug(f"Successfully saved: {input_object}")
+    with capture_log(raw_log), get_io_executor(concurrent_io) as io_executor:
+        if workflow_object is None:
+            workflow_future = io_executor.submit(
+                tracer.wrap("load_workflow_object", load_workflow_object),
+                workflow_node_id,
+                ms,
+                environ,
+            )
+        if input_parameters is None:
+            input_parameters_future = io_executor.submit(
+                tracer.wrap("load_parameters.input", load_parameters),
+                "INPUT",
+                ms,
+                environ,
+            )
+        execution_parameters_future = io_executor.submit(
+            tracer.wrap("load_parameters.execution", load_parameters),
+            "EXECUTION",
+            ms,
+            environ,
+        )
 
-    # TODO don't hard code any of these
-    exec_dict = execution_parameters
-    exec_dict["run_id"] = parameters.GITHUB_RUN_ID
-    exec_dict["run_date"] = datetime.datetime.now()
-    exec_dict["step_id"] = str(uuid.uuid4())
+        if workflow_object is None:
+            print_left_message(f"Loading workflow object ID: '{workflow_node_id}' ...")
+            workflow_object = workflow_future.result()
+            print("{:>15}".format("ok"))  # Finished loading workload abject
+
+        print_left_message(f"Appending schemas for step '{step_name}'...")
+        if workflow_object is not None:
+            with tracer.span("register_step_schemas"):
+                schema_index.register_step_schemas(workflow_object, step_name)
+        print("{:>15}".format("ok"))  # Finished loading the step's schemas
+
+        rootLogger.debug("::debug::Loading input parameters")
+        print_left_message("Loading input parameters ...")
+        if input_parameters is None:
+            input_parameters = input_parameters_future.result()
+        print("{:>15}".format("ok"))  # Finished loading input parameters from metastore
+
+        rootLogger.debug("::debug::Loading execution parameters file")
+        print_left_message("Loading execution parameters ...")
+        execution_parameters = execution_parameters_future.result()
+        print(
+            "{:>15}".format("ok")
+        )  # Finished loading execution  parameters from metastore
+
+        print_left_message(f"Loading contract for '{step_name}.input' ...")
+        input_object = tracer.wrap("load_contract_object.input", load_contract_object)(
+            parameters=input_parameters,
+            workflow_object=workflow_object,
+            step_name=step_name,
+            contract_type="input",
+        )
+        print(
+            "{:>15}".format("ok")
+        )  # Finished loading execution  parameters from metastore
+
+        # With INPUT_BATCH_METASTORE_WRITES the contract objects are collected and written
+        # together in as few traversals as possible when the writer is flushed.
+        if is_true(environ.get("INPUT_BATCH_METASTORE_WRITES", "")):
+            step_info_writer_type = StepInfoBatch
+        else:
+            step_info_writer_type = StepInfoWriter
+        step_info_writer = step_info_writer_type(
+            ms, io_executor, workflow_object.schema_version, workflow_node_id, step_name
+        )
 
-    print_left_message(f"Loading contract for '{step_name}.execution' ...")
-    execution_object = load_contract_object(
-        parameters=exec_dict,
-        workflow_object=workflow_object,
-        step_name=step_name,
-        contract_type="execution",
-    )
-    print(
-        "{:>15}".format("ok")
-    )  # Finished loading execution  parameters from metastore
-
-    rootLogger.debug(f"Successfully loaded and validated execution: {execution_object}")
-
-    print(f"Attaching step info to input for '{step_name}.execution' ... ")
-    execution_node_id = ms.attach_step_info(
-        execution_object,
-        workflow_object.schema_version,
-        workflow_node_id,
-        step_name,
-        "execution",
-    )
-    rootLogger.debug(f"Successfully saved: {execution_object}")
-    print(
-        f"      Execution Node ID: {execution_node_id}"
-    )  # Finished attaching step ID to input
-
-    # Branching between use step_execution.py or execution file.
-    execution_file = os.environ.get("INPUT_EXECUTION_FILE")
-
-    print_left_message("Executing step ... ")
-    print("{:>15}".format("ok"))  # Starting executing step
-    results_ml_object = execute_step(
-        execution_file,
-        workflow_object,
-        input_object,
-        execution_object,
-        step_name,
-        parameters.GITHUB_RUN_ID,
-    )
-    print_left_message("Finished executing step ... ")
-    print("{:>15}".format("ok"))  # Starting executing step
-
-    # TODO: Need to add next and previous steps to attach_step_info
-    print(f"Attaching step info to output for '{step_name}.output' ... ")
-    output_node_id = ms.attach_step_info(
-        results_ml_object,
-        workflow_object.schema_version,
-        workflow_node_id,
-        step_name,
-        "output",
-    )
-    print(
-        f"      Output Node ID: {output_node_id}"
-    )  # Finished attaching step ID to output
+        try:
+            print(f"Attaching step info to input for '{step_name}.input' ... ")
+            input_node_future = step_info_writer.attach(input_object, "input")
+
+            # TODO don't hard code any of these
+            exec_dict = execution_parameters
+            exec_dict["run_id"] = parameters.GITHUB_RUN_ID
+            exec_dict["run_date"] = datetime.datetime.now()
+            exec_dict["step_id"] = str(uuid.uuid4())
+
+            print_left_message(f"Loading contract for '{step_name}.execution' ...")
+            execution_object = tracer.wrap(
+                "load_contract_object.execution", load_contract_object
+            )(
+                parameters=exec_dict,
+                workflow_object=workflow_object,
+                step_name=step_name,
+                contract_type="execution",
+            )
+            print(
+                "{:>15}".format("ok")
+            )  # Finished loading execution  parameters from metastore
 
-    dict_conversion = results_ml_object.dict_without_internal_variables()
+            rootLogger.debug(
+                f"Successfully loaded and validated execution: {execution_object}"
+            )
 
-    string_io_handle = StringIO()
-    YAML.SafeDumper.add_representer(uuid.UUID, repr_uuid)
-    YAML.safe_dump(dict_conversion, string_io_handle)
-    yaml_conversion = string_io_handle.getvalue()
+            print(f"Attaching step info to input for '{step_name}.execution' ... ")
+            execution_node_future = step_info_writer.attach(
+                execution_object, "execution"
+            )
+
+            # Branching between use step_execution.py or execution file.
+            execution_file = environ.get("INPUT_EXECUTION_FILE")
+            execution_budget = ExecutionBudget.from_environ(environ)
+            execution_profiler = ExecutionProfiler.from_environ(environ)
+
+            print_left_message("Executing step ... ")
+            print("{:>15}".format("ok"))  # Starting executing step
+            results_ml_object = tracer.wrap("execute_step", execute_step)(
+                execution_file,
+                workflow_object,
+                input_object,
+                execution_object,
+                step_name,
+                parameters.GITHUB_RUN_ID,
+                execution_budget,
+                execution_profiler,
+                environ,
+            )
+        except Exception as e:
+            if isinstance(e, ExecutionFailed):
+                # The step was stopped or its child died, but its log and what it used are
+                # still recorded.
+                if raw_log is not None:
+                    raw_log.close()
+                step_info_writer.attach(
+                    build_log_object(
+                        parameters,
+                        step_name,
+                        raw_log,
+                        execution_budget.describe(),
+                        execution_profiler.summary(),
+                    ),
+                    "log",
+                )
+            # Still record whatever was attached before the step failed.
+            step_info_writer.flush()
+            raise
+        print_left_message("Finished executing step ... ")
+        print("{:>15}".format("ok"))  # Starting executing step
+
+        # TODO: Need to add next and previous steps to attach_step_info
+        print(f"Attaching step info to output for '{step_name}.output' ... ")
+        output_node_future = step_info_writer.attach(results_ml_object, "output")
+
+        # The raw log covers the step up to here, including the execution file's output.
+        if raw_log is not None:
+            with tracer.span("close_raw_log"):
+                raw_log.close()
+
+        log_object = build_log_object(
+            parameters,
+            step_name,
+            raw_log,
+            execution_budget.describe() if execution_budget.isolated else None,
+            execution_profiler.summary(),
+        )
 
-    encode_to_utf8_bytes = yaml_conversion.encode("utf-8")
-    base64_encode = base64.urlsafe_b64encode(encode_to_utf8_bytes)
-    final_encode_to_utf8 = str(base64_encode, "utf-8")
+        # errors = log_object.validate()
+
+        # The log write doesn't depend on the output write.
+        log_node_future = step_info_writer.attach(log_object, "log")
+
+        with tracer.span("flush_step_info"):
+            step_info_writer.flush()
+
+        # The input and execution writes only had to finish by now, not before the step ran.
+        input_node_id = input_node_future.result()
+        print(
+            f"     Input Node ID: {input_node_id}"
+        )  # Finished attaching step ID to input
+        rootLogger.debug(f"Successfully saved: {input_object}")
+
+        execution_node_id = execution_node_future.result()
+        print(
+            f"      Execution Node ID: {execution_node_id}"
+        )  # Finished attaching step ID to execution
+        rootLogger.debug(f"Successfully saved: {execution_object}")
+
+        output_node_id = output_node_future.result()
+        print(
+            f"      Output Node ID: {output_node_id}"
+        )  # Finished attaching step ID to output
+        log_node_id = log_node_future.result()
+
+    return StepResult(
+        results_ml_object=results_ml_object,
+        input_node_id=input_node_id,
+        execution_node_id=execution_node_id,
+        output_node_id=output_node_id,
+        log_node_id=log_node_id,
+    )
 
-    # Recording raw log info
-    # logBuffer.flush()
-    # log_contents = logBuffer.getvalue()
 
+def build_log_object(
+    parameters: Box,
+    step_name: str,
+    raw_log: ChunkedLogWriter = None,
+    execution_budget: dict = None,
+    execution_profile: dict = None,
+) -> MLObject:
+    """ Builds the step's log object, referencing its (closed) raw log if there is one. """
     log_object = MLObject()
     log_object.set_type(schema_version="0.1.0", schema_type="log")
     log_object.run_id = parameters.GITHUB_RUN_ID
     log_object.step_name = step_name
     log_object.run_date = datetime.datetime.now()
-    log_object.raw_log = (
-        "NO RAW LOGS YET (NEED TO FIGURE OUT WHERE I CAN PUSH A LARGE OBJECT)"
+    log_object.raw_log = raw_log.reference if raw_log is not None else ""
+    # Time spent in each phase of the step so far, so slow runs can be diagnosed from the
+    # metastore.
+    log_object.log_property_bag = {"trace": get_tracer().summarize()}
+    if raw_log is not None:
+        log_object.log_property_bag["raw_log"] = raw_log.describe()
+    if execution_budget is not None:
+        log_object.log_property_bag["execution_budget"] = execution_budget
+    if execution_profile is not None:
+        log_object.log_property_bag["execution_profile"] = execution_profile
+    return log_object
+
+
+def write_step_outputs(
+    output_sink,
+    step_result: StepResult,
+    output_prefix: str = "",
+    output_encoding: str = DEFAULT_OUTPUT_ENCODING,
+):
+    """ Writes the step's outputs to output_sink, with each output name prefixed by
+    output_prefix, and output_base64_encoded encoded with output_encoding. The results
+    object is converted to a dict once, for both output_raw and output_base64_encoded. """
+    results_dict = step_result.results_ml_object.dict_without_internal_variables()
+    output_sink.write_output(output_prefix + "output_raw", results_dict)
+    output_sink.write_encoded_output(
+        output_prefix + "output_base64_encoded", results_dict, output_encoding
     )
-    # log_object.raw_log = log_contents
-    log_object.log_property_bag = {}
-
-    # errors = log_object.validate()
-
-    log_node_id = ms.attach_step_info(
-        log_object, workflow_object.schema_version, workflow_node_id, step_name, "log"
+    output_sink.write_output(output_prefix + "input_node_id", step_result.input_node_id)
+    output_sink.write_output(
+        output_prefix + "execution_node_id", step_result.execution_node_id
     )
-
-    rootLogger.debug(
-        f"::set-output name=output_raw::{results_ml_object.dict_without_internal_variables()}"
+    output_sink.write_output(
+        output_prefix + "output_node_id", step_result.output_node_id
     )
+    output_sink.write_output(output_prefix + "log_node_id", step_result.log_node_id)
 
-    print("Printing output ... \n \n")
-    logger = setupLogger()
-    output_message = ""
-    output_message += f"{logger.print_and_log('output_raw', results_ml_object.dict_without_internal_variables())}\n"
-    output_message += (
-        f"{logger.print_and_log('output_base64_encoded', final_encode_to_utf8)}\n"
-    )
-    output_message += f"{logger.print_and_log('input_node_id', input_node_id)}\n"
-    output_message += (
-        f"{logger.print_and_log('execution_node_id', execution_node_id)}\n"
-    )
-    output_message += f"{logger.print_and_log('output_node_id', output_node_id)}\n"
-    output_message += f"{logger.print_and_log('log_node_id', log_node_id)}\n"
 
-    rootLogger.debug(f"Complete output: \n {output_message}")
-    print("\n\n... finished printing output")  # Finished printing output
+def get_output_encoding() -> str:
+    output_encoding = os.environ.get("INPUT_OUTPUT_ENCODING", "").strip().lower()
+    return output_encoding if output_encoding != "" else DEFAULT_OUTPUT_ENCODING
 
-    print_left_message("Generating /output_message.txt ...")
-    if is_docker():
-        Path("/output_message.txt").write_text(output_message)
-    else:
-        fp = tempfile.TemporaryFile()
-        fp.write(output_message.encode("utf-8"))
-    print("{:>15}".format("ok"))  # Finished printing output
 
-
-def is_docker():
-    cgroup_path = "/proc/self/cgroup"
-    return (
-        os.path.exists("/.dockerenv")
-        or os.path.isfile(cgroup_path)
-        and any("docker" in line for line in open(cgroup_path))
+def encode_results_object(results_ml_object: MLObject) -> str:
+    """ Encodes the results object for the output_base64_encoded output (yaml, then
+    base64). """
+    string_io_handle = StringIO()
+    write_base64_yaml(
+        results_ml_object.dict_without_internal_variables(), string_io_handle.write
     )
+    return string_io_handle.getvalue()
 
 
 def print_left_message(msg):
     print(msg.ljust(120), end="")
 
 
-def repr_uuid(dumper, uuid_obj):
-    return YAML.ScalarNode("tag:yaml.org,2002:str", str(uuid_obj))
+def is_true(value) -> bool:
+    """ Interprets an action input as a boolean ('true', 'yes', '1', 'on'). """
+    return str(value).strip().lower() in ["true", "yes", "1", "on"]
+
+
+def split_list_variable(variable_name: str) -> list:
+    """ Reads a comma separated environment variable into a list, dropping empty entries. """
+    return [
+        value.strip()
+        for value in os.environ.get(variable_name, "").split(",")
+        if value.strip() != ""
+    ]
 
 
-def convert_environment_variables_to_dict():
+def convert_environment_variables_to_dict(environ=None, required: list = REQUIRED):
+    if environ is None:
+        environ = os.environ
+
     return_dict = Box()
 
-    for var in REQUIRED:
-        return_dict[var] = os.environ.get(var, "")
+    for var in required:
+        return_dict[var] = environ.get(var, "")
         if return_dict[var] == "":
             raise KnownException(f"No value provided for {var}.")
 
@@ -345,14 +772,117 @@ def verify_parameters_folder_and_file_exist(
     return True
 
 
+def load_schemas(parameters: Box) -> (object, bool, bool):
+    """ Startup phase: fetches schemas from git (if INPUT_SCHEMAS_GIT_URL is set) and loads
+    the schema registry. Returns the schema index, whether git had to fetch, and whether the
+    registry snapshot was reused. """
+    fetched = False
+    if parameters.INPUT_SCHEMAS_GIT_URL != "":
+        from git import GitCommandError
+
+        try:
+            # TODO: Authenticate with GH Token?
+            (_, fetched) = get_tracer().wrap(
+                "schemas.fetch_from_git", fetch_schemas_from_git
+            )(
+                parameters.INPUT_SCHEMAS_GIT_URL,
+                parameters.INPUT_SCHEMAS_DIRECTORY,
+                ref=parameters.INPUT_SCHEMAS_GIT_REF,
+                schema_paths=split_list_variable("INPUT_SCHEMAS_GIT_PATHS"),
+            )
+        except GitCommandError as gce:
+            raise KnownException(
+                f"Trying to read from the git repo ({parameters.INPUT_SCHEMAS_GIT_URL}) and write to the directory ({parameters.INPUT_SCHEMAS_DIRECTORY}). Full error follows: {str(gce)}"
+            )
+
+    with get_tracer().span("schemas.load_schema_index"):
+        (schema_index, snapshot_hit) = load_schema_index(
+            Path(parameters.INPUT_SCHEMAS_DIRECTORY)
+        )
+    if is_true(os.environ.get("INPUT_SCHEMAS_LOAD_ALL", "")):
+        with get_tracer().span("schemas.register_all"):
+            schema_index.register_all()
+    else:
+        # Schemas are registered as the registry is asked for them, starting with the
+        # workflow (and the step schemas it references) once it is loaded.
+        schema_index.enable_lazy_loading()
+
+    return (schema_index, fetched, snapshot_hit)
+
+
+def keep_metastore_connections():
+    """ Keeps each metastore connection for reuse by later steps with the same credentials.
+    Used by the step daemon, which runs many steps in one process. """
+    global _metastore_connections
+    if _metastore_connections is None:
+        _metastore_connections = {}
+
+
+def connect_to_metastore(metastore_cred_string_blob: str) -> Metastore:
+    """ Startup phase: returns the metastore connection for the credentials, reusing a kept
+    connection if there is one. """
+    if _metastore_connections is None:
+        return open_metastore_connection(metastore_cred_string_blob)
+
+    if metastore_cred_string_blob not in _metastore_connections:
+        _metastore_connections[metastore_cred_string_blob] = open_metastore_connection(
+            metastore_cred_string_blob
+        )
+    return _metastore_connections[metastore_cred_string_blob]
+
+
+def open_metastore_connection(metastore_cred_string_blob: str) -> Metastore:
+    """ Decodes and validates the metastore credentials, then opens the metastore
+    connection. """
+    metastore_credentials_packed = YAML.safe_load(metastore_cred_string_blob)
+    metastore_credentials_string = base64.urlsafe_b64decode(
+        metastore_credentials_packed
+    ).decode("utf-8")
+    metastore_credentials = YAML.safe_load(metastore_credentials_string)
+
+    # 'backend: sqlite' records to a local database (at 'path', if given) instead of the
+    # remote gremlin metastore.
+    if (
+        isinstance(metastore_credentials, dict)
+        and metastore_credentials.get("backend", "gremlin") == "sqlite"
+    ):
+        return load_sqlite_metastore_connection(metastore_credentials.get("path"))
+
+    report_found_params(
+        ["url", "key", "database_name", "container_name"], metastore_credentials
+    )
+
+    return load_metastore_connection(metastore_credentials_packed)
+
+
 def load_metastore_connection(credentials_packed: str):
     return Metastore(credentials_packed=credentials_packed)
 
 
+def load_sqlite_metastore_connection(database_path: str = None):
+    from sqlite_metastore import SQLiteMetastore  # noqa
+
+    return SQLiteMetastore(database_path)
+
+
 def load_workflow_object(
-    workflow_node_id: str, metastore_connection: Metastore
+    workflow_node_id: str, metastore_connection: Metastore, environ=None
 ) -> MLObject:
+    """ Loads the workflow object, from the workflow cache if it still has the node's
+    workflow_version (see workflow_cache.py). Returns None if the workflow has errors. """
     rootLogger = setupLogger().get_root_logger()
+
+    if environ is None:
+        environ = os.environ
+
+    workflow_cache = WorkflowCache.from_environ(environ)
+    workflow_object = workflow_cache.get(workflow_node_id, metastore_connection)
+    if workflow_object is not None:
+        rootLogger.debug(
+            f"::debug::Workflow '{workflow_node_id}' loaded from the cache"
+        )
+        return workflow_object
+
     (workflow_object, errors) = metastore_connection.get_workflow_object(
         workflow_node_id
     )
@@ -370,38 +900,58 @@ def load_workflow_object(
     if errors is not None and len(errors) > 0:
         return None
     else:
+        workflow_cache.put(workflow_node_id, workflow_object)
         return workflow_object
 
 
-def load_parameters(contract_type: str, metastore_connection: Metastore):
+def load_parameters(contract_type: str, metastore_connection: Metastore, environ=None):
     """ Loads parameters for 'INPUT' or 'EXECUTION' from one of metastore, file path, base64 encoded string or raw parameters. If more than one are set, the first available in this list overrides. If none are set, raises a KnownException."""
     if contract_type not in ["INPUT", "EXECUTION"]:
         raise KnownException(f"{contract_type} is not either 'INPUT' or 'EXECUTION'")
 
-    parameters_raw = os.environ.get(f"INPUT_{contract_type}_PARAMETERS_RAW", "")
-    parameters_base64 = os.environ.get(f"INPUT_{contract_type}_PARAMETERS_BASE64", "")
-    parameters_node_id = os.environ.get(f"INPUT_{contract_type}_PARAMETERS_NODE_ID", "")
-    parameters_file_path = os.environ.get(
+    if environ is None:
+        environ = os.environ
+
+    parameters_raw = environ.get(f"INPUT_{contract_type}_PARAMETERS_RAW", "")
+    parameters_base64 = environ.get(f"INPUT_{contract_type}_PARAMETERS_BASE64", "")
+    parameters_node_id = environ.get(f"INPUT_{contract_type}_PARAMETERS_NODE_ID", "")
+    parameters_file_path = environ.get(
         f"INPUT_{contract_type}_PARAMETERS_FILE_PATH", ""
     )
 
     if parameters_node_id != "":
-        contract_object = metastore_connection.get_object(parameters_node_id)
-        return contract_object.dict_without_internal_variables()
+        # Contract nodes never change, so they are kept on disk by node ID (see
+        # object_cache.py), for each metastore.
+        object_cache = ObjectCache.from_environ(environ)
+        metastore_namespace = environ.get("INPUT_METASTORE_CREDENTIALS", "")
+        parameters = object_cache.get(metastore_namespace, parameters_node_id)
+        if parameters is not None:
+            return parameters
+
+        found_object = metastore_connection.get_object(parameters_node_id)
+        # mlspeclib's gremlin Metastore returns None, not (None, errors), for a missing node.
+        contract_object = None if found_object is None else found_object[0]
+        if contract_object is None:
+            raise KnownException(
+                f"No object found in the metastore for INPUT_{contract_type}_PARAMETERS_NODE_ID '{parameters_node_id}'."
+            )
+        parameters = contract_object.dict_without_internal_variables()
+        object_cache.put(metastore_namespace, parameters_node_id, parameters)
+        return parameters
     elif parameters_file_path != "":
         file_path = Path(parameters_file_path)
         if file_path.exists():
-            file_contents = file_path.read_text()
-            return YAML.safe_load(file_contents)
+            # YAML, JSON or msgpack, memory mapped (see parameter_loader.py).
+            return load_parameters_file(file_path)
         else:
             raise KnownException(
                 f"'{str(file_path)}' was provided as an input for the '{contract_type}' parameter of this step, but that file does not exist."
             )
     elif parameters_base64 != "":
-        base64_decode = base64.urlsafe_b64decode(parameters_base64)
-        return YAML.safe_load(base64_decode)
+        # YAML, or the msgpack encoding of INPUT_OUTPUT_ENCODING=msgpack.
+        return decode_base64_parameters(parameters_base64)
     elif parameters_raw != "":
-        return YAML.safe_load(parameters_raw)
+        return load_yaml(parameters_raw)
     else:
         raise KnownException(
             f"No values were set for '{contract_type}'. Was expecting one of INPUT_{contract_type}_PARAMETERS_RAW, INPUT_{contract_type}_PARAMETERS_FILE_PATH, INPUT_{contract_type}_PARAMETERS_BASE64,  INPUT_{contract_type}_PARAMETERS_NODE_ID to be available in the environment variables."
@@ -410,10 +960,12 @@ def load_parameters(contract_type: str, metastore_connection: Metastore):
 
 # TODO Break down into verifying contract_type, verify workflow object, and then verify just the MLObject
 def load_contract_object(
-    parameters: dict, workflow_object: MLObject, step_name: str, contract_type: str
+    parameters, workflow_object: MLObject, step_name: str, contract_type: str
 ):
-    """ Creates an MLObject based on an input string, and validates it against the workflow object
-    and step_name provided.
+    """ Creates an MLObject based on an input dict, string or MLObject, and validates it against
+    the workflow object and step_name provided. Dicts and MLObjects are validated in memory,
+    without a round trip through a yaml string. Schemas with a generated validator are checked
+    with it (see validator_codegen.py).
 
     Will fail if the .validate() fails on the object or the schema mismatches what is seen in the
     workflow.
@@ -425,17 +977,20 @@ def load_contract_object(
             f"{contract_type} not in the expected list of contract types: {CONTRACT_TYPES}."
         )
 
-    if isinstance(parameters, dict):
-        parameters_string = YAML.safe_dump(parameters)
-    elif isinstance(parameters, str):
-        parameters_string = parameters
+    if isinstance(parameters, MLObject):
+        # Already built (e.g. the results of a step), so only needs validating.
+        contract_object = parameters
+        errors = validate_object(parameters)
+    elif isinstance(parameters, (dict, str)):
+        # create_object_from_string takes a dict as is, and only parses strings. Outcomes
+        # aren't cached: building the object costs far more than validating it, and hashing
+        # the parameters to look an outcome up costs about as much as validating them.
+        (contract_object, errors) = create_object_from_string(parameters)
     else:
         raise KnownException(
-            f"load_contract_object was called with neither a string nor a dict. Value: {parameters}"
+            f"load_contract_object was called with neither a string, a dict nor an MLObject. Value: {parameters}"
         )
 
-    (contract_object, errors) = MLObject.create_object_from_string(parameters_string)
-
     if errors is not None and len(errors) > 0:
         rootLogger.debug(f"{contract_type} object loading errors: {errors}")
         raise KnownException(
@@ -475,15 +1030,15 @@ def load_contract_object(
     return contract_object
 
 
-def execute_step(
+def run_execution(
     execution_file: str,
     workflow_object: MLObject,
     input_object: MLObject,
     execution_object: MLObject,
     step_name,
-    run_id,
-):
-
+) -> MLObject:
+    """ Runs INPUT_EXECUTION_FILE, or StepExecution if there is none, and returns the results
+    object it produced. """
     rootLogger = setupLogger().get_root_logger()
 
     results_ml_object = MLObject()
@@ -496,6 +1051,8 @@ def execute_step(
 
         print("{:>15}".format("ok"))  # Finished loading from environment
 
+        from step_execution import StepExecution  # noqa
+
         step_execution_object = StepExecution(input_object, execution_object)
         results_ml_object = step_execution_object.execute(
             result_object_schema_type=workflow_object.steps[
@@ -520,17 +1077,60 @@ def execute_step(
                 f"'{execution_file}' was provided as the file, but it does not appear to exist at {str(execution_file_path.resolve())} -- exiting."
             )
 
-        # The below are used in the execution file
-        result_ml_object_schema_type = workflow_object.steps[  # noqa
-            step_name
-        ].output.schema_type
-        result_ml_object_schema_version = workflow_object.steps[  # noqa
-            step_name
-        ].output.schema_version
-        exec(execution_file_path.read_text(), globals(), locals())
+        # Runs as a module of its own, reusing the code compiled for this content if it ran
+        # earlier in this process.
+        results_ml_object = run_execution_file(
+            execution_file_path,
+            input_object,
+            execution_object,
+            results_ml_object,
+            workflow_object.steps[step_name].output.schema_type,
+            workflow_object.steps[step_name].output.schema_version,
+        )
 
         print("{:>15}".format("ok"))  # Finished executing step
 
+    return results_ml_object
+
+
+def execute_step(
+    execution_file: str,
+    workflow_object: MLObject,
+    input_object: MLObject,
+    execution_object: MLObject,
+    step_name,
+    run_id,
+    execution_budget: ExecutionBudget = None,
+    execution_profiler: ExecutionProfiler = None,
+    environ=None,
+):
+    """ Runs the step's execution, in a child process within execution_budget if it has
+    limits (see execution_budget.py), while execution_profiler samples the machine (see
+    execution_profiler.py). The child gets the step's environ (os.environ if not given). Then
+    fills in its execution profile, and stamps and validates the results object. """
+    if execution_profiler is None:
+        execution_profiler = ExecutionProfiler()
+
+    with execution_profiler:
+        if execution_budget is not None and execution_budget.isolated:
+            results_ml_object = execution_budget.run(
+                run_execution,
+                execution_file,
+                workflow_object,
+                input_object,
+                execution_object,
+                step_name,
+                environ=environ,
+            )
+        else:
+            results_ml_object = run_execution(
+                execution_file,
+                workflow_object,
+                input_object,
+                execution_object,
+                step_name,
+            )
+
     if (results_ml_object is None) or (len(results_ml_object) == 0):
         raise KnownException(
             "No value was assigned to the variable 'results_ml_object' -- exiting."
@@ -540,13 +1140,15 @@ def execute_step(
             "The variable 'results_ml_object' was not of type MLObject -- exiting."
         )
 
+    execution_profiler.fill_execution_profile(results_ml_object)
+
     results_ml_object.run_id = run_id
     results_ml_object.step_id = str(uuid.uuid4())
     results_ml_object.run_date = datetime.datetime.now().isoformat()
 
     # Using the below to validate the object, even though we already have it created.
     load_contract_object(
-        parameters=results_ml_object.dict_without_internal_variables(),
+        parameters=results_ml_object,
         workflow_object=workflow_object,
         step_name=step_name,
         contract_type="output",
@@ -0,0 +1,180 @@
+""" Keeps objects read from the metastore by node ID (INPUT_*_PARAMETERS_NODE_ID) on local disk,
+so runs that reuse the same contract node don't fetch it again. Contract nodes are never
+changed once written, so an entry never has to be revalidated; a hit doesn't touch the
+metastore at all.
+
+Entries are msgpack encoded dicts, one file per node, named by a hash of the metastore
+credentials and the node ID (so node IDs from different metastores can't collide). They hold
+plain data only, so reading one can't run code; UUIDs, datetimes and dates are kept as msgpack
+extension types, and tuples come back as lists. The cache is shared by every runner on the
+host: entries are written with atomic renames, so reads don't need a lock, while writes and
+eviction hold a flock. A hit refreshes the entry's mtime, and once the files add up to more
+than INPUT_OBJECT_CACHE_SIZE_MB the least recently used are removed. 0 turns the cache
+off. """
+import os
+import uuid
+import hashlib
+import datetime
+from pathlib import Path
+
+import msgpack
+
+from utils.utils import setupLogger, KnownException  # noqa
+from local_cache import get_cache_directory, atomic_write_bytes, locked  # noqa
+
+DEFAULT_SIZE_LIMIT_MB = 256
+ENTRY_SUFFIX = ".msgpack"
+LOCK_FILE_NAME = ".lock"
+
+# msgpack extension type codes for the values plain msgpack has no type for.
+UUID_EXT_TYPE = 1
+DATETIME_EXT_TYPE = 2
+DATE_EXT_TYPE = 3
+
+
+class ObjectCache:
+    """ LRU cache on disk of immutable metastore objects, at most size_limit_bytes in all. """
+
+    def __init__(self, cache_directory: Path = None, size_limit_bytes: int = None):
+        if size_limit_bytes is None:
+            size_limit_bytes = DEFAULT_SIZE_LIMIT_MB * 1024 * 1024
+        self.size_limit_bytes = size_limit_bytes
+        self.enabled = size_limit_bytes > 0
+        self.cache_directory = None
+        if self.enabled and cache_directory is None:
+            cache_directory = get_cache_directory("objects")
+            # No safe cache directory turns the cache off.
+            self.enabled = cache_directory is not None
+        if self.enabled:
+            self.cache_directory = Path(cache_directory)
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_environ(cls, environ) -> "ObjectCache":
+        size_limit_mb = environ.get("INPUT_OBJECT_CACHE_SIZE_MB", "")
+        if size_limit_mb == "":
+            return cls()
+        try:
+            size_limit_bytes = int(float(size_limit_mb) * 1024 * 1024)
+        except ValueError:
+            raise KnownException(
+                f"INPUT_OBJECT_CACHE_SIZE_MB - '{size_limit_mb}' is not a number."
+            )
+        return cls(size_limit_bytes=size_limit_bytes)
+
+    def get_entry_path(self, namespace: str, node_id: str, version: str = "") -> Path:
+        entry_key = hashlib.sha256(
+            f"{namespace}\0{node_id}\0{version}".encode("utf-8")
+        ).hexdigest()
+        return self.cache_directory / (entry_key + ENTRY_SUFFIX)
+
+    def get(self, namespace: str, node_id: str, version: str = ""):
+        """ Returns the cached object for node_id (at version, for nodes that have versions)
+        in the metastore namespace, or None. Each call returns a new copy, which the caller is
+        free to change. """
+        if not self.enabled:
+            return None
+
+        entry_path = self.get_entry_path(namespace, node_id, version)
+        try:
+            contents = entry_path.read_bytes()
+            # Marks the entry as recently used.
+            os.utime(str(entry_path), None)
+        except FileNotFoundError:
+            # Never cached, or evicted by another runner.
+            return None
+
+        try:
+            return unpack_entry(contents)
+        except Exception as e:
+            rootLogger = setupLogger().get_root_logger()
+            rootLogger.debug(
+                f"::debug::Removing unreadable cache entry {entry_path}: {e}"
+            )
+            self.remove(entry_path)
+            return None
+
+    def put(self, namespace: str, node_id: str, value, version: str = ""):
+        """ Caches value for node_id, then evicts the least recently used entries until the
+        cache fits in its size limit. Values larger than the whole cache aren't kept. """
+        if not self.enabled:
+            return
+
+        try:
+            contents = pack_entry(value)
+        except (TypeError, ValueError, OverflowError) as e:
+            rootLogger = setupLogger().get_root_logger()
+            rootLogger.debug(f"::debug::Not caching {node_id}: {e}")
+            return
+        if len(contents) > self.size_limit_bytes:
+            return
+
+        with locked(self.cache_directory / LOCK_FILE_NAME):
+            atomic_write_bytes(
+                self.get_entry_path(namespace, node_id, version), contents
+            )
+            self.evict()
+
+    def evict(self):
+        """ Removes the least recently used entries while the cache is over its size limit.
+        Called with the lock held. """
+        entries = []
+        for entry_path in self.cache_directory.glob("*" + ENTRY_SUFFIX):
+            try:
+                entry_stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry_path))
+
+        total_size = sum(entry_size for (_, entry_size, _) in entries)
+        for (_, entry_size, entry_path) in sorted(entries):
+            if total_size <= self.size_limit_bytes:
+                break
+            self.remove(entry_path)
+            total_size -= entry_size
+
+    def size(self) -> int:
+        """ Total size in bytes of the cached entries. """
+        if not self.enabled:
+            return 0
+        return sum(
+            entry_path.stat().st_size
+            for entry_path in self.cache_directory.glob("*" + ENTRY_SUFFIX)
+        )
+
+    def remove(self, entry_path: Path):
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def pack_entry(value) -> bytes:
+    return msgpack.packb(value, default=pack_ext_type, use_bin_type=True)
+
+
+def unpack_entry(contents: bytes):
+    return msgpack.unpackb(
+        contents, ext_hook=unpack_ext_type, raw=False, strict_map_key=False
+    )
+
+
+def pack_ext_type(value):
+    """ UUIDs, datetimes and dates, as msgpack extension types. """
+    if isinstance(value, uuid.UUID):
+        return msgpack.ExtType(UUID_EXT_TYPE, value.bytes)
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(DATETIME_EXT_TYPE, value.isoformat().encode("utf-8"))
+    if isinstance(value, datetime.date):
+        return msgpack.ExtType(DATE_EXT_TYPE, value.isoformat().encode("utf-8"))
+    raise TypeError(f"Can't cache {type(value).__name__} values: {value}")
+
+
+def unpack_ext_type(code: int, data: bytes):
+    if code == UUID_EXT_TYPE:
+        return uuid.UUID(bytes=data)
+    if code == DATETIME_EXT_TYPE:
+        return datetime.datetime.fromisoformat(data.decode("utf-8"))
+    if code == DATE_EXT_TYPE:
+        return datetime.date.fromisoformat(data.decode("utf-8"))
+    raise ValueError(f"Unknown msgpack extension type {code}.")
@@ -0,0 +1,120 @@
+""" Loads step parameters from files and strings. A parameters file
+(INPUT_*_PARAMETERS_FILE_PATH) may be YAML, JSON, msgpack, or a saved output_base64_encoded
+value in either encoding (base64 YAML, or the 'mpz1:' msgpack encoding). The format is taken
+from the file's extension, or else from its first bytes; a file that starts with nothing but
+base64 is decoded as a saved output, and read as YAML if it doesn't decode. The file is memory mapped rather than read into a string. YAML is parsed from
+the map as a stream, JSON and msgpack by their C parsers, and YAML with libyaml's
+CSafeLoader where PyYAML was built with it. Each parse is traced as 'parse_parameters', with
+the file's format and size. """
+import re
+import json
+import mmap
+import base64
+import zlib
+from pathlib import Path
+
+import yaml as YAML
+import msgpack
+
+from utils.utils import KnownException  # noqa
+from tracing import get_tracer  # noqa
+from step_output import MSGPACK_PREFIX  # noqa
+
+# libyaml's loader is many times faster, and builds the same objects.
+YAML_LOADER = getattr(YAML, "CSafeLoader", YAML.SafeLoader)
+
+FORMATS_BY_SUFFIX = {
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".json": "json",
+    ".msgpack": "msgpack",
+    ".mpk": "msgpack",
+}
+
+# Bytes read to detect the format of a file without a known extension.
+HEAD_SIZE = 64
+
+# The start of a base64 YAML output_base64_encoded (urlsafe alphabet, no line breaks).
+BASE64_HEAD = re.compile(rb"[A-Za-z0-9_\-]+=*\s*")
+
+
+def load_yaml(stream):
+    """ YAML.safe_load, with libyaml where available. stream is a string, bytes or a file. """
+    return YAML.load(stream, Loader=YAML_LOADER)
+
+
+def decode_base64_parameters(parameters_base64: str):
+    """ Decodes an output_base64_encoded value (or anything else base64 encoded YAML) back
+    to what was encoded. """
+    parameters_base64 = parameters_base64.strip()
+    if parameters_base64.startswith(MSGPACK_PREFIX):
+        packed = zlib.decompress(
+            base64.urlsafe_b64decode(parameters_base64[len(MSGPACK_PREFIX) :])
+        )
+        return msgpack.unpackb(packed, raw=False)
+    return load_yaml(base64.urlsafe_b64decode(parameters_base64))
+
+
+def detect_format(file_path: Path, head: bytes) -> str:
+    """ The format of the file: 'yaml', 'json', 'msgpack' or 'base64' (a saved
+    output_base64_encoded). """
+    if file_path.suffix.lower() in FORMATS_BY_SUFFIX:
+        return FORMATS_BY_SUFFIX[file_path.suffix.lower()]
+    if head.startswith(MSGPACK_PREFIX.encode("utf-8")) or BASE64_HEAD.fullmatch(head):
+        return "base64"
+    # A msgpack map starts with a byte that can't start UTF-8 text (fixmap), or map16/32.
+    if len(head) > 0 and (0x80 <= head[0] <= 0x8F or head[0] in [0xDE, 0xDF]):
+        return "msgpack"
+    if head.lstrip()[:1] in [b"{", b"["]:
+        # Could also be YAML flow style; parse_parameters falls back to YAML if so.
+        return "json"
+    return "yaml"
+
+
+def load_parameters_file(file_path: Path):
+    """ Returns the parameters in the file, in whichever format it is. """
+    file_path = Path(file_path)
+    size = file_path.stat().st_size
+    if size == 0:
+        # As YAML.safe_load("") would.
+        return None
+
+    with open(file_path, "rb") as parameters_file, mmap.mmap(
+        parameters_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
+        parameters_format = detect_format(file_path, mapped_file[:HEAD_SIZE])
+        with get_tracer().span(
+            "parse_parameters",
+            path=str(file_path),
+            format=parameters_format,
+            size_bytes=size,
+        ):
+            return parse_parameters(mapped_file, parameters_format, file_path)
+
+
+def parse_parameters(mapped_file: mmap.mmap, parameters_format: str, file_path: Path):
+    try:
+        if parameters_format == "msgpack":
+            # Unpacked straight from the map, without a copy.
+            return msgpack.unpackb(mapped_file, raw=False)
+        if parameters_format == "base64":
+            try:
+                return decode_base64_parameters(str(mapped_file[:], "ascii"))
+            except (ValueError, YAML.YAMLError):
+                if mapped_file[: len(MSGPACK_PREFIX)] == MSGPACK_PREFIX.encode("utf-8"):
+                    raise
+                # Only looked like base64 (e.g. YAML that is a single word).
+                mapped_file.seek(0)
+        if parameters_format == "json":
+            try:
+                return json.loads(mapped_file[:])
+            except ValueError:
+                if file_path.suffix.lower() == ".json":
+                    raise
+                mapped_file.seek(0)
+        # libyaml reads the map in chunks as it parses.
+        return load_yaml(mapped_file)
+    except (ValueError, YAML.YAMLError, msgpack.UnpackException, zlib.error) as e:
+        raise KnownException(
+            f"'{str(file_path)}' could not be parsed as {parameters_format}: {str(e)}"
+        )
@@ -0,0 +1,270 @@
+""" Stores a step's raw log (everything it printed, including the execution file's stdout and
+stderr, and its log records) as zlib compressed chunks in a blob store, so the log node only
+has to hold a reference. The log is written as it is produced, so at most one chunk
+(INPUT_RAW_LOG_CHUNK_SIZE bytes) is held in memory however long it gets, and a byte range can
+be read back by fetching only the chunks that cover it. Only what goes through sys.stdout,
+sys.stderr and logging is captured: output a subprocess writes straight to the file
+descriptors is not.
+
+Blob stores are picked by the scheme of INPUT_RAW_LOG_STORE, and no log is kept unless it is
+set (a directory inside the container would be gone with it). 'file://<directory>' is built
+in; others can be added with register_blob_store(). A log is kept as
+'<log id>/<chunk number>.zz' and '<log id>/manifest.json', and referenced as
+'<store url>/<log id>'. """
+import sys
+import json
+import time
+import zlib
+import uuid
+import shutil
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from utils.utils import KnownException  # noqa
+from local_cache import atomic_write_bytes  # noqa
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MANIFEST_KEY = "manifest.json"
+DEFAULT_RETENTION_DAYS = 30
+
+
+class LocalBlobStore:
+    """ Blob store on the local filesystem, for 'file://<directory>' urls. """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.root = Path(self.url[len("file://") :])
+
+    def put(self, key: str, contents: bytes):
+        atomic_write_bytes(self.root / key, contents)
+
+    def get(self, key: str) -> bytes:
+        blob_path = self.root / key
+        if not blob_path.exists():
+            raise KnownException(f"No blob '{key}' was found in {self.url}.")
+        return blob_path.read_bytes()
+
+    def delete_older_than(self, max_age_seconds: float) -> int:
+        """ Removes the logs last written more than max_age_seconds ago, including ones that
+        never got a manifest, and returns how many were removed. """
+        if not self.root.is_dir():
+            return 0
+
+        oldest_kept = time.time() - max_age_seconds
+        deleted_count = 0
+        for log_path in self.root.iterdir():
+            manifest_path = log_path / MANIFEST_KEY
+            try:
+                if not log_path.is_dir() or log_path.is_symlink():
+                    continue
+                written_path = manifest_path if manifest_path.exists() else log_path
+                if written_path.stat().st_mtime >= oldest_kept:
+                    continue
+                shutil.rmtree(log_path)
+            except OSError:
+                continue  # Removed by another run, or not ours to remove.
+            deleted_count += 1
+        return deleted_count
+
+
+# Blob store types by url scheme.
+BLOB_STORES = {"file": LocalBlobStore}
+
+
+def register_blob_store(scheme: str, blob_store_type):
+    """ Adds a blob store type, constructed with the store's url, for urls of scheme. A type
+    that can expire old logs itself has delete_older_than(max_age_seconds), like
+    LocalBlobStore; other stores are left to their own retention rules. """
+    BLOB_STORES[scheme] = blob_store_type
+
+
+def open_blob_store(url: str):
+    """ Opens the blob store at url. """
+    scheme = url.split("://", 1)[0] if "://" in url else ""
+    if scheme not in BLOB_STORES:
+        raise KnownException(
+            f"INPUT_RAW_LOG_STORE - '{url}' is not a url of a known blob store. Known schemes: {sorted(BLOB_STORES.keys())}."
+        )
+    return BLOB_STORES[scheme](url)
+
+
+def delete_expired_logs(blob_store, retention_days: float) -> int:
+    """ Removes the logs in blob_store older than retention_days, if the store can (see
+    register_blob_store), and returns how many were removed. 0 days keeps every log. """
+    if retention_days <= 0 or not hasattr(blob_store, "delete_older_than"):
+        return 0
+    return blob_store.delete_older_than(retention_days * 24 * 60 * 60)
+
+
+class ChunkedLogWriter:
+    """ File-like sink for a step's log. Text is buffered until a full chunk is available,
+    which is then compressed and put in the blob store. close() writes the last chunk and the
+    manifest, and returns the reference to the log. """
+
+    def __init__(self, blob_store, chunk_size: int = DEFAULT_CHUNK_SIZE, log_id=None):
+        self.blob_store = blob_store
+        self.chunk_size = chunk_size
+        self.log_id = log_id if log_id is not None else uuid.uuid4().hex
+        self.size = 0
+        self.chunks = []
+        self.closed = False
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    @property
+    def reference(self) -> str:
+        return f"{self.blob_store.url}/{self.log_id}"
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8", "replace")
+        with self._lock:
+            if self.closed:
+                return len(text)
+            self._buffer.extend(data)
+            while len(self._buffer) >= self.chunk_size:
+                self._put_chunk(bytes(self._buffer[: self.chunk_size]))
+                del self._buffer[: self.chunk_size]
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def close(self) -> str:
+        with self._lock:
+            if not self.closed:
+                if len(self._buffer) > 0:
+                    self._put_chunk(bytes(self._buffer))
+                    self._buffer = bytearray()
+                self.closed = True
+                manifest = {
+                    "chunk_size": self.chunk_size,
+                    "size": self.size,
+                    "compression": "zlib",
+                    "chunks": self.chunks,
+                }
+                self.blob_store.put(
+                    f"{self.log_id}/{MANIFEST_KEY}",
+                    json.dumps(manifest).encode("utf-8"),
+                )
+        return self.reference
+
+    def describe(self) -> dict:
+        """ Summary for the log object's log_property_bag. """
+        return {
+            "reference": self.reference,
+            "size": self.size,
+            "chunk_count": len(self.chunks),
+            "compressed_size": sum(chunk["compressed_size"] for chunk in self.chunks),
+        }
+
+    def _put_chunk(self, data: bytes):
+        compressed = zlib.compress(data)
+        key = f"{self.log_id}/{len(self.chunks):08d}.zz"
+        self.blob_store.put(key, compressed)
+        self.chunks.append(
+            {
+                "key": key,
+                "offset": self.size,
+                "size": len(data),
+                "compressed_size": len(compressed),
+            }
+        )
+        self.size += len(data)
+
+
+def read_log_range(reference: str, start: int = 0, length: int = None) -> bytes:
+    """ Returns bytes [start, start + length) of the log at reference (the whole log from
+    start if length is None), fetching only the chunks that overlap the range. """
+    (store_url, log_id) = reference.rstrip("/").rsplit("/", 1)
+    blob_store = open_blob_store(store_url)
+    manifest = json.loads(blob_store.get(f"{log_id}/{MANIFEST_KEY}").decode("utf-8"))
+
+    end = manifest["size"] if length is None else min(start + length, manifest["size"])
+    if start >= end:
+        return b""
+
+    data = bytearray()
+    # Every chunk but the last is exactly chunk_size long.
+    first_chunk = start // manifest["chunk_size"]
+    last_chunk = (end - 1) // manifest["chunk_size"]
+    for chunk in manifest["chunks"][first_chunk : last_chunk + 1]:
+        chunk_data = zlib.decompress(blob_store.get(chunk["key"]))
+        data.extend(
+            chunk_data[max(start - chunk["offset"], 0) : max(end - chunk["offset"], 0)]
+        )
+    return bytes(data)
+
+
+class CapturedStream:
+    """ Stands in for sys.stdout or sys.stderr while logs are captured. Writes go to the
+    original stream and to the log writer of the thread that wrote them, if it has one, so
+    steps running on different threads keep separate logs. """
+
+    def __init__(self, stream, log_writers: threading.local):
+        self.stream = stream
+        self._log_writers = log_writers
+
+    def write(self, text: str) -> int:
+        log_writer = getattr(self._log_writers, "log_writer", None)
+        if log_writer is not None:
+            log_writer.write(text)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class CapturedLogHandler(logging.Handler):
+    """ Copies log records to the log writer of the thread that logged them. """
+
+    def __init__(self, log_writers: threading.local):
+        super().__init__()
+        self._log_writers = log_writers
+        self.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+
+    def emit(self, record):
+        log_writer = getattr(self._log_writers, "log_writer", None)
+        if log_writer is not None:
+            log_writer.write(self.format(record) + "\n")
+
+
+_log_writers = threading.local()
+_capture_lock = threading.Lock()
+_capture_count = 0
+_saved_streams = None
+_log_handler = CapturedLogHandler(_log_writers)
+
+
+@contextmanager
+def capture_log(log_writer: ChunkedLogWriter = None):
+    """ Sends everything the current thread prints or logs to log_writer as well, and closes
+    log_writer at the end. sys.stdout and sys.stderr are replaced while any thread is
+    capturing. Nothing is captured if log_writer is None. """
+    global _capture_count, _saved_streams
+
+    if log_writer is None:
+        yield None
+        return
+
+    with _capture_lock:
+        if _capture_count == 0:
+            _saved_streams = (sys.stdout, sys.stderr)
+            sys.stdout = CapturedStream(sys.stdout, _log_writers)
+            sys.stderr = CapturedStream(sys.stderr, _log_writers)
+            logging.getLogger().addHandler(_log_handler)
+        _capture_count += 1
+
+    _log_writers.log_writer = log_writer
+    try:
+        yield log_writer
+    finally:
+        _log_writers.log_writer = None
+        log_writer.close()
+        with _capture_lock:
+            _capture_count -= 1
+            if _capture_count == 0:
+                (sys.stdout, sys.stderr) = _saved_streams
+                _saved_streams = None
+                logging.getLogger().removeHandler(_log_handler)
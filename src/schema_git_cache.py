@@ -0,0 +1,150 @@
+""" Keeps a local mirror of INPUT_SCHEMAS_GIT_URL per (url, ref) so that repeated steps only
+fetch when the remote ref has moved, and always check out into the same directory. Checkouts
+for other (url, ref)s left in the schemas directory by earlier runs are removed, so their
+schemas aren't loaded along with the current ones. """
+import shutil
+import tempfile
+import hashlib
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from utils.utils import setupLogger, KnownException  # noqa
+from local_cache import get_cache_directory, locked  # noqa
+
+if TYPE_CHECKING:
+    import git
+
+MIRROR_REF = "refs/mlspec/schemas"
+CHECKOUT_MARKER = ".mlspec_git_commit"
+DEFAULT_SCHEMA_PATHS = ["*.yaml"]
+
+
+def fetch_schemas_from_git(
+    git_url: str, schemas_directory, ref: str = "HEAD", schema_paths: list = None
+) -> (Path, bool):
+    """ Checks out the schema files of git_url@ref into a stable directory under
+    schemas_directory. Returns the checkout path and whether the remote had to be fetched
+    (False means the cached mirror and checkout were already at the remote commit). """
+    if schema_paths is None or len(schema_paths) == 0:
+        schema_paths = DEFAULT_SCHEMA_PATHS
+
+    cache_key = get_mirror_key(git_url, ref)
+    checkout_path = Path(schemas_directory) / f"git-{cache_key}"
+
+    cache_directory = get_cache_directory("git")
+    if cache_directory is None:
+        # No safe cache directory: the mirror only lives for this checkout.
+        with tempfile.TemporaryDirectory() as mirror_directory:
+            fetched = update_checkout(
+                git_url,
+                ref,
+                Path(mirror_directory) / cache_key,
+                checkout_path,
+                schema_paths,
+            )
+    else:
+        fetched = update_checkout(
+            git_url, ref, cache_directory / cache_key, checkout_path, schema_paths
+        )
+
+    prune_checkouts(checkout_path)
+    return (checkout_path, fetched)
+
+
+def prune_checkouts(checkout_path: Path):
+    """ Removes the other checkouts (git-* directories with a checkout marker) next to
+    checkout_path. """
+    rootLogger = setupLogger().get_root_logger()
+
+    for other_path in checkout_path.parent.glob("git-*"):
+        if other_path == checkout_path or not (other_path / CHECKOUT_MARKER).exists():
+            continue
+        rootLogger.debug(f"::debug::Removing stale schema checkout {other_path}")
+        shutil.rmtree(str(other_path), ignore_errors=True)
+
+
+def update_checkout(
+    git_url: str, ref: str, mirror_path: Path, checkout_path: Path, schema_paths: list
+) -> bool:
+    """ Brings the mirror at mirror_path and checkout_path to the remote commit of
+    git_url@ref. Returns whether the remote had to be fetched. """
+    rootLogger = setupLogger().get_root_logger()
+
+    with locked(mirror_path.with_suffix(".lock")):
+        mirror = open_mirror(mirror_path)
+        remote_commit = get_remote_commit(mirror, git_url, ref)
+
+        fetched = False
+        if get_mirror_commit(mirror) != remote_commit:
+            rootLogger.debug(f"::debug::Fetching {git_url}@{ref} ({remote_commit})")
+            mirror.fetch("--depth=1", git_url, f"+{ref}:{MIRROR_REF}")
+            fetched = True
+
+        if read_checkout_marker(checkout_path) != remote_commit:
+            rootLogger.debug(
+                f"::debug::Checking out {remote_commit} to {checkout_path}"
+            )
+            shutil.rmtree(str(checkout_path), ignore_errors=True)
+            checkout_path.mkdir(parents=True)
+            mirror.execute(
+                [
+                    "git",
+                    f"--git-dir={mirror_path}",
+                    f"--work-tree={checkout_path}",
+                    "checkout",
+                    "--force",
+                    MIRROR_REF,
+                    "--",
+                ]
+                + list(schema_paths)
+            )
+            (checkout_path / CHECKOUT_MARKER).write_text(remote_commit)
+
+    return fetched
+
+
+def get_mirror_key(git_url: str, ref: str) -> str:
+    return hashlib.sha256(f"{git_url}\0{ref}".encode("utf-8")).hexdigest()[:16]
+
+
+def open_mirror(mirror_path: Path) -> "git.Git":
+    # gitpython is imported on first use, so steps without INPUT_SCHEMAS_GIT_URL never load it.
+    import git
+
+    mirror_path.mkdir(parents=True, exist_ok=True)
+    mirror = git.Git(str(mirror_path))
+    if not (mirror_path / "HEAD").exists():
+        mirror.init("--bare")
+    return mirror
+
+
+def get_remote_commit(mirror: "git.Git", git_url: str, ref: str) -> str:
+    """ Asks the remote which commit ref points at, without fetching any objects. ref is
+    resolved the way git fetch resolves it: as a full ref name, then under refs/, then as a
+    tag, then as a branch. """
+    remote_commits = {}
+    for line in mirror.ls_remote(git_url, ref).splitlines():
+        (commit, remote_ref) = line.split("\t", 1)
+        remote_commits[remote_ref] = commit
+
+    for remote_ref in [ref, f"refs/{ref}", f"refs/tags/{ref}", f"refs/heads/{ref}"]:
+        if remote_ref in remote_commits:
+            return remote_commits[remote_ref]
+
+    raise KnownException(f"The ref '{ref}' was not found in the git repo ({git_url}).")
+
+
+def get_mirror_commit(mirror: "git.Git"):
+    from git import GitCommandError
+
+    try:
+        return mirror.rev_parse("--verify", "--quiet", MIRROR_REF)
+    except GitCommandError:
+        return None
+
+
+def read_checkout_marker(checkout_path: Path):
+    marker_path = checkout_path / CHECKOUT_MARKER
+    if not marker_path.exists():
+        return None
+    return marker_path.read_text().strip()
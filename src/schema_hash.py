@@ -0,0 +1,120 @@
+""" Hashes registered marshmallow schemas, so work that depends on a schema (such as a
+generated validator) can tell when the schema has changed. The hash
+covers every field's type, settings and validators, through nested schemas and the base
+schemas a schema extends, along with the marshmallow version. It is the same in every process
+that registers the same schema. """
+import types
+import hashlib
+
+import marshmallow
+from marshmallow import fields
+
+# Field attributes that don't change what validation does ('_schema' is Nested's instance of
+# its schema, made on first use; the schema itself is described from the class).
+IGNORED_FIELD_ATTRIBUTES = [
+    "parent",
+    "root",
+    "name",
+    "_creation_index",
+    "validate",
+    "_schema",
+]
+
+# Schema hashes by schema class; a schema that is registered again is a new class.
+_schema_hashes = {}
+
+
+def get_schema_hash(schema_class) -> str:
+    """ sha256 hex digest of everything about schema_class that validation depends on. """
+    if schema_class not in _schema_hashes:
+        digest = hashlib.sha256()
+        digest.update(f"marshmallow {marshmallow.__version__}\0".encode("utf-8"))
+        describe_schema(schema_class, digest, [])
+        _schema_hashes[schema_class] = digest.hexdigest()
+    return _schema_hashes[schema_class]
+
+
+def describe_schema(schema_class, digest, seen: list):
+    if schema_class in seen:
+        # A schema nested in itself.
+        digest.update(f"<recursive {seen.index(schema_class)}>".encode("utf-8"))
+        return
+    seen = seen + [schema_class]
+
+    digest.update(b"schema(")
+    for base_class in schema_class.__mro__:
+        digest.update(f"{base_class.__module__}.{base_class.__qualname__},".encode())
+    digest.update(f"unknown={schema_class.opts.unknown},".encode("utf-8"))
+    digest.update(f"datetimeformat={schema_class.opts.datetimeformat},".encode())
+    for (hook_key, hook_names) in sorted(
+        getattr(schema_class, "_hooks", {}).items(), key=lambda item: repr(item[0])
+    ):
+        if len(hook_names) == 0:
+            # _hooks is a defaultdict, so looking hooks up while validating adds empty ones.
+            continue
+        digest.update(f"hook {hook_key!r}: ".encode("utf-8"))
+        for hook_name in hook_names:
+            describe_value(getattr(schema_class, hook_name), digest, seen)
+    for (field_name, field) in sorted(schema_class._declared_fields.items()):
+        digest.update(f"field {field_name}=".encode("utf-8"))
+        describe_value(field, digest, seen)
+    digest.update(b")")
+
+
+def describe_value(value, digest, seen: list):
+    """ Adds a description of a field, validator or setting to digest. Nothing that differs
+    between processes (like memory addresses) is included. """
+    if isinstance(value, fields.Field):
+        digest.update(f"{type(value).__module__}.{type(value).__qualname__}(".encode())
+        for (attribute_name, attribute_value) in sorted(vars(value).items()):
+            if attribute_name not in IGNORED_FIELD_ATTRIBUTES:
+                digest.update(f"{attribute_name}=".encode("utf-8"))
+                describe_value(attribute_value, digest, seen)
+        if isinstance(value, fields.Nested):
+            # The nested schema may be given by name, so it is resolved through the registry.
+            describe_schema(type(value.schema), digest, seen)
+        digest.update(b")")
+    elif isinstance(value, type) and issubclass(value, marshmallow.Schema):
+        describe_schema(value, digest, seen)
+    elif isinstance(value, marshmallow.Schema):
+        describe_schema(type(value), digest, seen)
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            describe_value(item, digest, seen)
+        digest.update(b"]")
+    elif isinstance(value, dict):
+        digest.update(b"{")
+        for (item_key, item_value) in sorted(
+            value.items(), key=lambda item: repr(item[0])
+        ):
+            digest.update(f"{item_key!r}:".encode("utf-8"))
+            describe_value(item_value, digest, seen)
+        digest.update(b"}")
+    elif isinstance(value, (set, frozenset)):
+        # Sets are ordered by their items' hashes, which change between processes.
+        digest.update(repr(sorted(repr(item) for item in value)).encode("utf-8"))
+    elif isinstance(value, (types.FunctionType, types.MethodType)):
+        # Validators written as functions (and the lambdas of 'constraint' fields) are told
+        # apart by their code and constants.
+        function = getattr(value, "__func__", value)
+        digest.update(f"{function.__module__}.{function.__qualname__}".encode("utf-8"))
+        describe_code(function.__code__, digest)
+    elif " at 0x" in repr(value):
+        digest.update(f"{type(value).__module__}.{type(value).__qualname__}".encode())
+    else:
+        digest.update(repr(value).encode("utf-8"))
+    digest.update(b",")
+
+
+def describe_code(code: types.CodeType, digest):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode("utf-8"))
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            describe_code(constant, digest)
+        elif isinstance(constant, frozenset):
+            # Sets are ordered by their items' hashes, which change between processes.
+            digest.update(repr(sorted(repr(item) for item in constant)).encode("utf-8"))
+        else:
+            digest.update(repr(constant).encode("utf-8"))
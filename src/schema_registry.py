@@ -0,0 +1,359 @@
+""" Loads a directory of schemas into the mlspeclib registry. The directory is parsed once
+into an index of (mlspec_schema_type, mlspec_schema_version) -> schema, which is snapshotted
+to disk keyed by a content hash of the directory. Later runs against the same schemas skip
+parsing the yaml, and can register only the schemas a step actually uses. The content hash
+is itself recorded against the files' paths, sizes and modification times, so the yaml is
+only read again when one of those changes. """
+import pickle
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+import marshmallow
+from marshmallow.class_registry import RegistryError
+from yaml.scanner import ScannerError
+from mlspeclib import MLSchema
+from mlspeclib.helpers import (
+    convert_yaml_to_dict,
+    contains_minimum_fields_for_schema,
+    build_schema_name_for_schema,
+    return_schema_name,
+)
+
+from utils.utils import setupLogger  # noqa
+from local_cache import (  # noqa
+    get_cache_directory,
+    hash_files,
+    hash_file_stats,
+    atomic_write_bytes,
+)
+
+# Bump when the layout of the pickled snapshot changes so old snapshots are ignored.
+SNAPSHOT_FORMAT_VERSION = "2"
+
+STEP_CONTRACT_TYPES = ["input", "execution", "output", "log"]
+
+# Indexes already built in this process, keyed by snapshot path (or content hash, if caching
+# is off).
+_loaded_indexes = {}
+
+# Indexes consulted when the class registry is asked for a schema it doesn't have yet.
+_lazy_indexes = []
+_registry_get_class = marshmallow.class_registry.get_class
+
+# Held while registering, so concurrent lookups can't register the same schema twice (which
+# would make the name ambiguous in marshmallow's registry).
+_registry_lock = threading.RLock()
+
+# mlspeclib's own populate_registry, as called and as set on MLSchema (a staticmethod).
+_populate_registry = MLSchema.populate_registry
+_populate_registry_attribute = MLSchema.__dict__["populate_registry"]
+_registry_populated = False
+
+# Number of lazy_loading_scope blocks open, as only the outermost one patches and restores.
+_scope_depth = 0
+
+
+class SchemaIndex:
+    """ Maps (mlspec_schema_type, mlspec_schema_version) to the file and parsed definition
+    of each schema in a directory, and registers schemas (with their mlspec_base_type
+    ancestors) on demand. """
+
+    def __init__(self, entries: dict):
+        self.entries = entries
+        self.schema_names = {
+            return_schema_name(key[1], key[0]): key for key in self.entries
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get_file(self, schema_type: str, schema_version: str) -> str:
+        return self.entries[(schema_type, str(schema_version))]["file"]
+
+    def register_all(self):
+        """ Registers every schema in the index, ordered the way mlspeclib orders a
+        directory (schemas without a base first, then derived schemas, then 'last'). """
+        no_base_keys = []
+        keys_with_base = []
+        last_keys = []
+        for key, entry in self.entries.items():
+            if entry["last"]:
+                last_keys.append(key)
+            elif entry["base_type"] is not None:
+                keys_with_base.append(key)
+            else:
+                no_base_keys.append(key)
+
+        return self.register_closure(no_base_keys + keys_with_base + last_keys)
+
+    def enable_lazy_loading(self):
+        """ Registers schemas from this index the first time the class registry is asked
+        for them, instead of all up front. mlspeclib resolves schemas by name throughout
+        (e.g. validating a workflow checks every schema its steps reference), so the
+        lookup is the one place that sees every schema a run actually needs.
+
+        This replaces marshmallow.class_registry.get_class until disable_lazy_loading is
+        called, so enable it inside lazy_loading_scope. """
+        with _registry_lock:
+            if self not in _lazy_indexes:
+                _lazy_indexes.append(self)
+            marshmallow.class_registry.get_class = get_class_or_register
+
+    def register_schema_name(self, schema_name: str) -> int:
+        """ Registers the schema the registry knows as schema_name (e.g. '0_0_1_base'). """
+        if schema_name not in self.schema_names:
+            return 0
+        return self.register_closure([self.schema_names[schema_name]])
+
+    def register_step_schemas(self, workflow_object, step_name: str):
+        """ Registers the input, execution, output and log schemas named by the step in the
+        workflow object, plus their ancestors. Contract types the step doesn't declare are
+        skipped - load_contract_object reports those. """
+        keys = []
+        if step_name in workflow_object["steps"]:
+            step = workflow_object["steps"][step_name]
+            for contract_type in STEP_CONTRACT_TYPES:
+                if contract_type in step and isinstance(step[contract_type], dict):
+                    keys.append(
+                        (
+                            step[contract_type]["schema_type"],
+                            str(step[contract_type]["schema_version"]),
+                        )
+                    )
+        return self.register_closure(keys)
+
+    def register_closure(self, keys: list) -> int:
+        """ Registers each schema in keys after its ancestors. Schemas that are not in this
+        index (e.g. ones shipped with mlspeclib) are left to the registry. Returns the
+        number of schemas that were newly registered. """
+        registered_count = 0
+        with _registry_lock:
+            for key in self.get_closure(keys):
+                if register_schema(self.entries[key]["definition"]):
+                    registered_count += 1
+        return registered_count
+
+    def get_closure(self, keys: list) -> list:
+        ordered_keys = []
+        for key in keys:
+            ancestry = []
+            while key in self.entries and key not in ancestry:
+                ancestry.insert(0, key)
+                base_type = self.entries[key]["base_type"]
+                if base_type is None:
+                    break
+                # mlspeclib looks up a base schema at the same mlspec_schema_version.
+                key = (base_type, key[1])
+
+            for ancestor_key in ancestry:
+                if ancestor_key not in ordered_keys:
+                    ordered_keys.append(ancestor_key)
+        return ordered_keys
+
+
+def populate_registry_once():
+    """ Stands in for MLSchema.populate_registry inside lazy_loading_scope. mlspeclib calls it
+    from every set_type (so for every MLObject it builds). It reads and parses every schema
+    shipped with mlspeclib each time, but only registers the ones that are missing, so after
+    the first call in a process it has nothing left to do. """
+    global _registry_populated
+    if _registry_populated:
+        return
+    with _registry_lock:
+        if not _registry_populated:
+            _populate_registry()
+            _registry_populated = True
+
+
+def get_class_or_register(classname, all=False):
+    """ Stands in for marshmallow.class_registry.get_class once lazy loading is enabled. """
+    try:
+        return _registry_get_class(classname, all)
+    except RegistryError:
+        for schema_index in _lazy_indexes:
+            if schema_index.register_schema_name(classname) > 0:
+                return _registry_get_class(classname, all)
+        raise
+
+
+def get_loaded_indexes() -> list:
+    """ Every index loaded in this process, most recently loaded first. """
+    return list(reversed(list(_loaded_indexes.values())))
+
+
+def disable_lazy_loading():
+    """ Forgets the indexes enabled for lazy loading and puts back marshmallow's own
+    get_class. Schemas already registered stay registered. """
+    with _registry_lock:
+        _lazy_indexes.clear()
+        marshmallow.class_registry.get_class = _registry_get_class
+
+
+@contextmanager
+def lazy_loading_scope():
+    """ Replaces MLSchema.populate_registry with populate_registry_once for the block. When
+    the block exits, mlspeclib's own populate_registry is put back and lazy loading enabled
+    inside it is disabled. Only the outermost of nested blocks does either. """
+    global _scope_depth
+
+    with _registry_lock:
+        if _scope_depth == 0:
+            MLSchema.populate_registry = staticmethod(populate_registry_once)
+        _scope_depth += 1
+    try:
+        yield
+    finally:
+        with _registry_lock:
+            _scope_depth -= 1
+            if _scope_depth == 0:
+                MLSchema.populate_registry = _populate_registry_attribute
+                disable_lazy_loading()
+
+
+def load_schemas_into_registry(schemas_directory) -> bool:
+    """ Registers every schema under schemas_directory. Returns True if the parsed schemas
+    came from a snapshot (hit) and False if the yaml had to be parsed (miss). """
+    (schema_index, snapshot_hit) = load_schema_index(schemas_directory)
+    schema_index.register_all()
+    return snapshot_hit
+
+
+def load_schema_index(schemas_directory) -> (SchemaIndex, bool):
+    """ Returns the index for schemas_directory and whether it came from a snapshot. The
+    index is built at most once per directory content, and reused in-process after that. """
+    rootLogger = setupLogger().get_root_logger()
+    schemas_directory = Path(schemas_directory)
+
+    schema_files = find_schema_files(schemas_directory)
+    content_hash = get_content_hash(schemas_directory, schema_files)
+    snapshot_path = get_snapshot_path_for_hash(content_hash)
+    index_key = snapshot_path if snapshot_path is not None else content_hash
+
+    if index_key in _loaded_indexes:
+        return (_loaded_indexes[index_key], True)
+
+    entries = read_snapshot(snapshot_path)
+    snapshot_hit = entries is not None
+
+    if snapshot_hit:
+        rootLogger.debug(f"::debug::Schema registry snapshot hit: {snapshot_path}")
+    else:
+        rootLogger.debug(f"::debug::Schema registry snapshot miss: {snapshot_path}")
+        entries = build_index_entries(schemas_directory, schema_files)
+        if entries is None:
+            # Some files could not be parsed - let mlspeclib report them the way it always
+            # has, and register nothing (as mlspeclib does).
+            MLSchema.append_schema_to_registry(schemas_directory)
+            return (SchemaIndex({}), False)
+        if snapshot_path is not None:
+            atomic_write_bytes(snapshot_path, pickle.dumps(entries))
+
+    schema_index = SchemaIndex(entries)
+    _loaded_indexes[index_key] = schema_index
+    return (schema_index, snapshot_hit)
+
+
+def find_schema_files(schemas_directory: Path) -> list:
+    schema_files = sorted(schemas_directory.glob("**/*.yaml"))
+    if len(schema_files) == 0:
+        raise FileNotFoundError(
+            f"No files ending in '.yaml' were found in the path '{schemas_directory}'"
+        )
+    return schema_files
+
+
+def get_snapshot_path(schemas_directory: Path, schema_files: list) -> Path:
+    return get_snapshot_path_for_hash(get_content_hash(schemas_directory, schema_files))
+
+
+def get_snapshot_path_for_hash(content_hash: str) -> Path:
+    """ The snapshot for schemas with this content hash, or None if caching is off. """
+    cache_directory = get_cache_directory("registry")
+    if cache_directory is None:
+        return None
+    return cache_directory / f"{SNAPSHOT_FORMAT_VERSION}-{content_hash}.pickle"
+
+
+def get_content_hash(schemas_directory: Path, schema_files: list) -> str:
+    """ Returns hash_files for the schema files. The hash is recorded under a hash of the
+    files' paths, sizes and modification times, and read back from there while none of
+    those change, instead of reading every file again. """
+    cache_directory = get_cache_directory("registry")
+    if cache_directory is None:
+        return hash_files(schemas_directory, schema_files)
+
+    stats_hash = hash_file_stats(schemas_directory, schema_files)
+    stats_path = cache_directory / f"{SNAPSHOT_FORMAT_VERSION}-{stats_hash}.stats"
+    if stats_path.exists():
+        content_hash = stats_path.read_text("utf-8").strip()
+        if len(content_hash) == 64:
+            return content_hash
+
+    content_hash = hash_files(schemas_directory, schema_files)
+    atomic_write_bytes(stats_path, content_hash.encode("utf-8"))
+    return content_hash
+
+
+def read_snapshot(snapshot_path: Path):
+    """ Returns the index entries, or None if there is no usable snapshot. """
+    if snapshot_path is None or not snapshot_path.exists():
+        return None
+    try:
+        return pickle.loads(snapshot_path.read_bytes())
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        # A corrupt snapshot is treated as a miss and overwritten.
+        return None
+
+
+def build_index_entries(schemas_directory: Path, schema_files: list):
+    """ Parses the schema files into index entries. Returns None if any file is not a
+    valid schema. """
+    entries = {}
+
+    for schema_file in schema_files:
+        try:
+            schema_dict = convert_yaml_to_dict(schema_file.read_text("utf-8"))
+        except ScannerError:
+            return None
+
+        if not isinstance(schema_dict, dict) or not contains_minimum_fields_for_schema(
+            schema_dict
+        ):
+            return None
+
+        base_type = None
+        if (
+            "mlspec_base_type" in schema_dict
+            and schema_dict["mlspec_base_type"]["meta"] is not None
+        ):
+            base_type = schema_dict["mlspec_base_type"]["meta"]
+
+        key = (
+            schema_dict["mlspec_schema_type"]["meta"],
+            str(schema_dict["mlspec_schema_version"]["meta"]),
+        )
+        entries[key] = {
+            "file": str(schema_file.relative_to(schemas_directory)),
+            "base_type": base_type,
+            "last": "last" in schema_dict["mlspec_schema_type"],
+            "definition": schema_dict,
+        }
+
+    return entries
+
+
+def register_schema(schema_dict: dict) -> bool:
+    schema_name = build_schema_name_for_schema(
+        mlspec_schema_type=schema_dict["mlspec_schema_type"],
+        mlspec_schema_version=schema_dict["mlspec_schema_version"],
+    )
+    try:
+        _registry_get_class(schema_name)
+        return False
+    except RegistryError:
+        MLSchema.create_schema(schema_dict)
+        return True
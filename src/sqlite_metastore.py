@@ -0,0 +1,275 @@
+""" A metastore backed by a local SQLite database, for runners that sit next to their storage.
+It stores the same nodes as the gremlin metastore (workflows and the input, execution, output
+and log objects attached to a step) in indexed tables, so lineage is recorded at disk speed.
+Nodes are marked unsynced when written, and sync_to() later replays them to a remote
+metastore. Selected with 'backend: sqlite' in INPUT_METASTORE_CREDENTIALS. """
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from mlspeclib import MLObject
+from mlspeclib.helpers import convert_dict_to_yaml
+from mlspeclib.experimental.gremlin_helpers import build_vertex_id
+
+from utils.utils import setupLogger, KnownException  # noqa
+from local_cache import get_cache_directory  # noqa
+
+STEP_CONTENT_TYPES = ["input", "execution", "output", "log"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    node_type TEXT NOT NULL,
+    step_name TEXT NOT NULL,
+    workflow_node_id TEXT NOT NULL,
+    workflow_partition_id TEXT NOT NULL,
+    workflow_version TEXT NOT NULL,
+    run_id TEXT,
+    run_date TEXT,
+    raw_content TEXT NOT NULL,
+    synced INTEGER NOT NULL DEFAULT 0,
+    remote_id TEXT
+);
+CREATE INDEX IF NOT EXISTS nodes_by_step
+    ON nodes (workflow_node_id, step_name, node_type, run_date);
+CREATE INDEX IF NOT EXISTS nodes_unsynced ON nodes (synced) WHERE synced = 0;
+"""
+
+
+class SQLiteMetastore:
+    """ Drop-in replacement for mlspeclib's Metastore for the calls this action makes:
+    get_workflow_object, get_object, attach_step_info and create_workflow_node, and
+    get_workflow_version for revalidating cached workflows. """
+
+    _connection = None
+    _lock = None
+    _workflow_partition_id = None
+    path = None
+
+    def __init__(self, path=None, workflow_partition_id=None):
+        if path is None:
+            cache_directory = get_cache_directory("metastore")
+            if cache_directory is None:
+                raise KnownException(
+                    "There is no private cache directory for the metastore database; set INPUT_CACHE_DIRECTORY to a directory only this user can write to, or give the metastore a 'path'."
+                )
+            path = cache_directory / "metastore.db"
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Metastore calls are made from the I/O executor's threads, so the one connection is
+        # shared and every use of it holds _lock.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+        self._workflow_partition_id = workflow_partition_id
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_workflow_object(self, workflow_node_id):
+        return self.get_object(workflow_node_id)
+
+    def get_object(self, node_id):
+        """ Returns (MLObject, errors) like the gremlin metastore, or (None, None) if there is
+        no node with node_id. """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT raw_content FROM nodes WHERE id = ?", (node_id,)
+            ).fetchone()
+
+        if row is None:
+            return (None, None)
+        return MLObject.create_object_from_string(row[0])
+
+    def get_workflow_version(self, workflow_node_id):
+        """ Returns the workflow_version of the workflow node, or None if there is no such
+        node, without reading the workflow itself. """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT workflow_version FROM nodes WHERE id = ?", (workflow_node_id,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def create_workflow_node(
+        self, workflow_object: MLObject, workflow_partition_id=None
+    ) -> str:
+        """ Saves a workflow object and returns its node id, built the same way as the gremlin
+        metastore builds it. """
+        if workflow_partition_id is None:
+            workflow_partition_id = self.get_workflow_partition_id()
+        else:
+            self._workflow_partition_id = workflow_partition_id
+
+        workflow_node_id = build_vertex_id(
+            step_name="workflow",
+            step_type="workflow",
+            workflow_version=workflow_object.workflow_version,
+            workflow_partition_id=workflow_partition_id,
+        )
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO nodes (id, node_type, step_name, workflow_node_id, workflow_partition_id, workflow_version, raw_content) VALUES (?, 'workflow', 'workflow', ?, ?, ?, ?)",
+                (
+                    workflow_node_id,
+                    workflow_node_id,
+                    workflow_partition_id,
+                    str(workflow_object.workflow_version),
+                    convert_dict_to_yaml(
+                        workflow_object.dict_without_internal_variables()
+                    ),
+                ),
+            )
+        return workflow_node_id
+
+    def attach_step_info(
+        self,
+        mlobject: MLObject,
+        workflow_version,
+        workflow_node_id,
+        step_name: str,
+        content_type: str,
+    ) -> str:
+        """ Saves an MLObject as the input, execution, output or log of step_name and
+        returns its node id. """
+        return self.attach_step_info_batch(
+            [(mlobject, content_type)], workflow_version, workflow_node_id, step_name
+        )[0]
+
+    def attach_step_info_batch(
+        self, items: list, workflow_version, workflow_node_id, step_name: str
+    ) -> list:
+        """ Saves (mlobject, content_type) items in one transaction and returns their node
+        ids in order. """
+        rows = []
+        for (mlobject, content_type) in items:
+            if content_type not in STEP_CONTENT_TYPES:
+                raise ValueError(
+                    f"Error when saving '{mlobject.get_schema_name()}', the step_type must be from {STEP_CONTENT_TYPES}."
+                )
+            # Same (positional) arguments as GremlinHelpers.attach_step_info, so node IDs
+            # have the same shape on either backend.
+            node_id = build_vertex_id(
+                step_name,
+                content_type,
+                mlobject.run_id,
+                mlobject.run_date,
+                workflow_version,
+                self.get_workflow_partition_id(),
+            )
+            rows.append(
+                (
+                    node_id,
+                    content_type,
+                    step_name,
+                    workflow_node_id,
+                    self.get_workflow_partition_id(),
+                    str(workflow_version),
+                    str(mlobject.run_id),
+                    str(mlobject.run_date),
+                    convert_dict_to_yaml(mlobject.dict_without_internal_variables()),
+                )
+            )
+
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO nodes (id, node_type, step_name, workflow_node_id, workflow_partition_id, workflow_version, run_id, run_date, raw_content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return [row[0] for row in rows]
+
+    def get_all_runs(self, workflow_node_id, step_name, descending_order=True) -> dict:
+        """ Returns the nodes attached to step_name, keyed by node id and ordered by
+        run_date. """
+        order = "DESC" if descending_order else "ASC"
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT id, node_type, run_id, run_date FROM nodes WHERE workflow_node_id = ? AND step_name = ? AND node_type != 'workflow' ORDER BY run_date {order}",
+                (workflow_node_id, step_name),
+            )
+            rows = cursor.fetchall()
+
+        result_dict = OrderedDict()
+        for (node_id, step_type, run_id, run_date) in rows:
+            result_dict[node_id] = {
+                "id": node_id,
+                "step_type": step_type,
+                "run_id": run_id,
+                "run_date": run_date,
+            }
+        return result_dict
+
+    def sync_to(self, remote_metastore) -> int:
+        """ Replays nodes that haven't been synced yet to remote_metastore (e.g. the gremlin
+        Metastore), in the order they were written, and returns how many were synced.
+        Workflows are recreated with their steps, and step objects are attached to the
+        remote copy of their workflow. The remote node id is recorded for each node. """
+        rootLogger = setupLogger().get_root_logger()
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, node_type, step_name, workflow_node_id, workflow_partition_id, workflow_version, raw_content FROM nodes WHERE synced = 0 ORDER BY rowid"
+            ).fetchall()
+
+        synced_count = 0
+        for (
+            node_id,
+            node_type,
+            step_name,
+            workflow_node_id,
+            workflow_partition_id,
+            workflow_version,
+            raw_content,
+        ) in rows:
+            (mlobject, errors) = MLObject.create_object_from_string(raw_content)
+            if node_type == "workflow":
+                remote_id = remote_metastore.create_workflow_node(
+                    mlobject, workflow_partition_id
+                )
+                remote_metastore.create_workflow_steps(remote_id, mlobject)
+            else:
+                remote_workflow_node_id = self.get_remote_id(workflow_node_id)
+                if remote_workflow_node_id is None:
+                    # The workflow only lives in the remote metastore.
+                    remote_workflow_node_id = workflow_node_id
+                remote_id = remote_metastore.attach_step_info(
+                    mlobject,
+                    workflow_version,
+                    remote_workflow_node_id,
+                    step_name,
+                    node_type,
+                )
+
+            with self._lock:
+                self._connection.execute(
+                    "UPDATE nodes SET synced = 1, remote_id = ? WHERE id = ?",
+                    (remote_id, node_id),
+                )
+            rootLogger.debug(f"Synced '{node_id}' to '{remote_id}'")
+            synced_count += 1
+
+        return synced_count
+
+    def get_remote_id(self, node_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT remote_id FROM nodes WHERE id = ? AND synced = 1", (node_id,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def get_workflow_partition_id(self) -> str:
+        if self._workflow_partition_id is None:
+            # One partition per connection, as GremlinHelpers does.
+            self._workflow_partition_id = str(uuid.uuid4())
+        return self._workflow_partition_id
@@ -0,0 +1,190 @@
+""" Runs steps in a long-lived process, so a host running many consecutive steps pays for
+importing mlspeclib, marshmallow, gitpython and gremlinpython, building the schema registry and
+connecting to the metastore once instead of once per step. Start it with:
+
+    python3 /src/step_daemon.py --socket /tmp/mlspeclib-action.sock
+
+and point INPUT_DAEMON_SOCKET at the socket; entrypoint.sh then hands each step to the daemon
+through step_client.py. A job is the client's environment and working directory, and runs
+main() exactly as a fresh process would, with its output streamed back. Jobs run one at a time,
+since a step reads its configuration from os.environ.
+
+The socket is only accessible to the daemon's user, and the daemon also checks that each
+client runs as that user (or root), since a job runs arbitrary code as the daemon's user.
+
+Schemas stay registered between jobs. A schema whose content changes without a new
+mlspec_schema_version needs a daemon restart to be picked up. """
+import os
+import sys
+import json
+import socket
+import struct
+import logging
+import argparse
+import traceback
+import socketserver
+from pathlib import Path
+from contextlib import redirect_stdout, redirect_stderr
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import main as step_main  # noqa E402
+from schema_registry import populate_registry_once  # noqa E402
+
+DEFAULT_SOCKET_PATH = "/tmp/mlspeclib-action.sock"
+
+
+class JobStream:
+    """ File-like object that sends everything written to it to the client, as
+    {"output": text} lines. """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text: str) -> int:
+        if len(text) > 0:
+            send_message(self.wfile, {"output": text})
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+
+class StepJobHandler(socketserver.StreamRequestHandler):
+    """ Reads one job ({"environ": {...}, "cwd": "..."}) and replies with output lines
+    followed by {"exit_code": n}. """
+
+    def handle(self):
+        job = json.loads(self.rfile.readline().decode("utf-8"))
+        exit_code = run_job(job["environ"], job["cwd"], JobStream(self.wfile))
+        send_message(self.wfile, {"exit_code": exit_code})
+
+
+class StepDaemonServer(socketserver.UnixStreamServer):
+    """ Serves one job at a time (socketserver's default), as each job replaces os.environ. """
+
+    allow_reuse_address = True
+
+    def server_bind(self):
+        # Private to this user before listen(), so no one else can connect in between.
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+
+    def verify_request(self, request, client_address) -> bool:
+        peer_uid = get_peer_uid(request)
+        if peer_uid is None or peer_uid in [os.getuid(), 0]:
+            return True
+        print(f"Step daemon refused a job from user {peer_uid}")
+        return False
+
+
+def get_peer_uid(connection: socket.socket) -> int:
+    """ The user ID of the process at the other end of a unix socket, or None where
+    SO_PEERCRED isn't available (it is Linux only). """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    (_, uid, _) = struct.unpack("3i", credentials)
+    return uid
+
+
+def send_message(wfile, message: dict):
+    wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+    wfile.flush()
+
+
+def run_job(environ: dict, cwd: str, stream: JobStream) -> int:
+    """ Runs main() with environ as the environment and cwd as the working directory, writing
+    its output (stdout, stderr and logging) to stream. Returns the exit code. """
+    saved_environ = dict(os.environ)
+    saved_cwd = os.getcwd()
+    retargeted_handlers = retarget_log_handlers(stream)
+
+    os.environ.clear()
+    os.environ.update(environ)
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(stream), redirect_stderr(stream):
+            try:
+                step_main.main()
+                return 0
+            except SystemExit as se:
+                # The same exit code the interpreter would give for this SystemExit.
+                if se.code is None or isinstance(se.code, int):
+                    return se.code or 0
+                print(se.code, file=stream)
+                return 1
+            except Exception:
+                traceback.print_exc(file=stream)
+                return 1
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        os.chdir(saved_cwd)
+        for (handler, original_stream) in retargeted_handlers:
+            set_handler_stream(handler, original_stream)
+
+
+def retarget_log_handlers(stream) -> list:
+    """ Points the root logger's console handlers at stream for the length of a job, so
+    '::debug::' and error lines reach the client. Returns (handler, original stream) pairs
+    for restoring them. """
+    console_streams = [sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__]
+    retargeted_handlers = []
+    for handler in logging.getLogger().handlers:
+        if (
+            isinstance(handler, logging.StreamHandler)
+            and handler.stream in console_streams
+        ):
+            retargeted_handlers.append((handler, handler.stream))
+            set_handler_stream(handler, stream)
+    return retargeted_handlers
+
+
+def set_handler_stream(handler: logging.StreamHandler, stream):
+    # StreamHandler.setStream is not available on python 3.6 (the action's image).
+    handler.acquire()
+    try:
+        handler.flush()
+        handler.stream = stream
+    finally:
+        handler.release()
+
+
+def warm_up():
+    """ Does the per-process work a step would otherwise do first. """
+    # Marks the registry populated, so the steps' own calls (see lazy_loading_scope) skip it.
+    populate_registry_once()
+    step_main.keep_metastore_connections()
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH):
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        socket_path.unlink()
+
+    warm_up()
+    with StepDaemonServer(str(socket_path), StepJobHandler) as server:
+        print(f"Step daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            socket_path.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("INPUT_DAEMON_SOCKET", "") or DEFAULT_SOCKET_PATH,
+    )
+    arguments = parser.parse_args()
+    serve(arguments.socket)
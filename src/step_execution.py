@@ -1,5 +1,4 @@
 import os
-import json
 import yaml as YAML
 
 import logging
@@ -12,7 +11,6 @@ import datetime
 import uuid
 
 from mlspeclib import MLObject, MLSchema
-from mlspeclib.experimental.metastore import Metastore
 
 from utils.utils import ( # noqa
     report_found_params,
@@ -0,0 +1,210 @@
+""" Writers for the contract objects (input, execution, output, log) that a step attaches to
+its workflow node. StepInfoWriter makes one attach_step_info call per object. StepInfoBatch
+collects the objects and writes them, with their edges to the step, in as few traversals as
+possible (one for a normal step). Both hand back futures for the node IDs, so sub_main
+collects the IDs the same way whichever writer is in use. """
+from concurrent.futures import Future
+
+from mlspeclib import MLObject
+from mlspeclib.helpers import encode_raw_object_for_db
+from mlspeclib.experimental.metastore import Metastore
+from mlspeclib.experimental.gremlin_helpers import (
+    build_vertex_id,
+    convert_to_property_strings,
+    sQuery,
+)
+
+from tracing import TracedMetastore
+from utils.utils import setupLogger, KnownException  # noqa
+
+# Keep each traversal comfortably under the request size limits of hosted gremlin services.
+MAX_TRAVERSAL_LENGTH = 200000
+
+
+class StepInfoWriter:
+    """ Attaches each contract object with its own attach_step_info call, on io_executor. """
+
+    def __init__(
+        self,
+        metastore_connection,
+        io_executor,
+        workflow_version,
+        workflow_node_id,
+        step_name,
+    ):
+        self.metastore_connection = metastore_connection
+        self.io_executor = io_executor
+        self.workflow_version = workflow_version
+        self.workflow_node_id = workflow_node_id
+        self.step_name = step_name
+
+    def attach(self, mlobject: MLObject, content_type: str) -> Future:
+        return self.io_executor.submit(
+            self.metastore_connection.attach_step_info,
+            mlobject,
+            self.workflow_version,
+            self.workflow_node_id,
+            self.step_name,
+            content_type,
+        )
+
+    def flush(self):
+        pass
+
+
+class StepInfoBatch(StepInfoWriter):
+    """ Collects contract objects until flush(), then writes them all at once. Futures
+    returned by attach() complete when the batch is flushed. """
+
+    def __init__(
+        self,
+        metastore_connection,
+        io_executor,
+        workflow_version,
+        workflow_node_id,
+        step_name,
+    ):
+        super().__init__(
+            metastore_connection,
+            io_executor,
+            workflow_version,
+            workflow_node_id,
+            step_name,
+        )
+        self.pending = []
+
+    def attach(self, mlobject: MLObject, content_type: str) -> Future:
+        future = Future()
+        self.pending.append((mlobject, content_type, future))
+        return future
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        (pending, self.pending) = (self.pending, [])
+        try:
+            node_ids = self.write([(item[0], item[1]) for item in pending])
+        except Exception as e:
+            for (_, _, future) in pending:
+                future.set_exception(e)
+            return
+
+        for ((_, _, future), node_id) in zip(pending, node_ids):
+            future.set_result(node_id)
+
+    def write(self, items: list) -> list:
+        """ Writes (mlobject, content_type) items and returns their node IDs in order. Uses
+        the metastore's own batch call if it has one, a combined gremlin traversal for the
+        gremlin metastore, and one attach_step_info per item otherwise. """
+        if hasattr(self.metastore_connection, "attach_step_info_batch"):
+            return self.metastore_connection.attach_step_info_batch(
+                items, self.workflow_version, self.workflow_node_id, self.step_name
+            )
+
+        if get_gremlin_metastore(self.metastore_connection) is not None:
+            return self.write_gremlin_traversals(items)
+
+        return [
+            self.metastore_connection.attach_step_info(
+                mlobject,
+                self.workflow_version,
+                self.workflow_node_id,
+                self.step_name,
+                content_type,
+            )
+            for (mlobject, content_type) in items
+        ]
+
+    def write_gremlin_traversals(self, items: list) -> list:
+        rootLogger = setupLogger().get_root_logger()
+        node_ids = []
+        traversal_fragments = []
+
+        for (mlobject, content_type) in items:
+            (node_id, fragment) = self.build_gremlin_fragment(
+                mlobject, content_type, len(traversal_fragments)
+            )
+            node_ids.append(node_id)
+
+            if (
+                len(traversal_fragments) > 0
+                and sum(len(f) for f in traversal_fragments) + len(fragment)
+                > MAX_TRAVERSAL_LENGTH
+            ):
+                self.submit_gremlin_traversal(traversal_fragments)
+                traversal_fragments = []
+                (node_id, fragment) = self.build_gremlin_fragment(
+                    mlobject, content_type, 0
+                )
+
+            traversal_fragments.append(fragment)
+
+        self.submit_gremlin_traversal(traversal_fragments)
+        rootLogger.debug(f"Batched step info for {self.step_name}: {node_ids}")
+        return node_ids
+
+    def build_gremlin_fragment(
+        self, mlobject: MLObject, content_type: str, position: int
+    ):
+        """ Builds the part of a traversal that adds one contract vertex and its 'results'
+        and 'root' edges to the step vertex labelled 's', matching what
+        GremlinHelpers.attach_step_info does in three separate queries. """
+        if content_type not in ["input", "execution", "output", "log"]:
+            raise ValueError(
+                f"Error when saving '{mlobject.get_schema_name()}', the step_type must be from ['input', 'execution', 'output', 'log']."
+            )
+
+        gremlin_helpers = get_gremlin_metastore(self.metastore_connection)._gc
+        partition_id = gremlin_helpers._workflow_partition_id
+
+        # Same (positional) arguments as GremlinHelpers.attach_step_info, so node IDs match.
+        node_id = build_vertex_id(
+            self.step_name,
+            content_type,
+            mlobject.run_id,
+            mlobject.run_date,
+            self.workflow_version,
+            partition_id,
+        )
+        property_string = convert_to_property_strings(
+            mlobject.dict_without_internal_variables()
+        )
+        raw_content = encode_raw_object_for_db(mlobject)
+
+        vertex_label = f"c{position}"
+        add_vertex = f""".addV('id', '{node_id}'){property_string}.property('raw_content', '{raw_content}').property('workflow_node_id', '{self.workflow_node_id}').property('workflow_partition_id', '{partition_id}').as('{vertex_label}')"""
+        add_edges = f".select('s').addE('results').to('{vertex_label}').select('s').addE('root').from('{vertex_label}')"
+        return (node_id, add_vertex + add_edges)
+
+    def submit_gremlin_traversal(self, fragments: list):
+        """ Looks up the step vertex once, then runs every fragment from that single
+        traverser. The lookup must find exactly one vertex: none would silently drop the
+        writes, several would repeat them. The traversal ends by counting the vertices it
+        added, which must be one per fragment. """
+        find_step = sQuery(
+            "g.V('id', '%s').out().hasId('%s').fold().filter(count(local).is(1)).unfold().as('s')",
+            [self.workflow_node_id, self.step_name],
+        )
+        count_vertices = (
+            ".union("
+            + ", ".join(f"select('c{position}')" for position in range(len(fragments)))
+            + ").count()"
+        )
+        results = self.metastore_connection.execute_query(
+            find_step + "".join(fragments) + count_vertices
+        )
+        if results != [len(fragments)]:
+            raise KnownException(
+                f"Expected to add {len(fragments)} step info vertices for step '{self.step_name}' of workflow '{self.workflow_node_id}', but the traversal returned {results}. The step must have exactly one vertex under the workflow."
+            )
+
+
+def get_gremlin_metastore(metastore_connection):
+    """ The mlspeclib gremlin Metastore behind metastore_connection, or None if it isn't
+    one. """
+    if isinstance(metastore_connection, TracedMetastore):
+        metastore_connection = metastore_connection.get_metastore_connection()
+    if isinstance(metastore_connection, Metastore):
+        return metastore_connection
+    return None
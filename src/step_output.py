@@ -0,0 +1,225 @@
+""" Writes the step's outputs ('::set-output name=<name>::<value>' lines) to stdout and to
+/output_message.txt as each one is produced, rather than building the whole message first.
+output_base64_encoded is encoded while the YAML is dumped: the results dict is walked and
+emitted as it goes (see dump_yaml), and the emitter's writes are encoded to UTF-8 and base64
+in blocks and go straight to the sink. A large results object is then never held as YAML
+nodes, YAML text, UTF-8 bytes and base64 text at the same time.
+
+INPUT_OUTPUT_ENCODING=msgpack encodes output_base64_encoded as msgpack, compressed with zlib,
+then base64, behind the prefix 'mpz1:'. It is a fraction of the size of the YAML and much
+quicker to produce and to parse. decode_base64_parameters() (in parameter_loader.py) reads
+either encoding, so a step's INPUT_*_PARAMETERS_BASE64 can be given a previous step's output
+whichever was used.
+UUIDs and datetimes are sent as strings (isoformat for datetimes) in msgpack. """
+import os
+import sys
+import uuid
+import zlib
+import base64
+import datetime
+import tempfile
+from pathlib import Path
+
+import yaml as YAML
+import msgpack
+
+from utils.utils import setupLogger, KnownException  # noqa
+
+OUTPUT_MESSAGE_PATH = Path("/output_message.txt")
+
+# Bytes encoded at a time; a multiple of 3, so only the last block can need padding.
+BASE64_BLOCK_SIZE = 3 * 16 * 1024
+
+DEFAULT_OUTPUT_ENCODING = "yaml"
+# Marks (and versions) output_base64_encoded as zlib compressed msgpack.
+MSGPACK_PREFIX = "mpz1:"
+
+
+class OutputSink:
+    """ Sends outputs to stdout and to the output message file as they are written. """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.logger = setupLogger().get_root_logger()
+
+    def write(self, text: str):
+        sys.stdout.write(text)
+        self.output_file.write(text.encode("utf-8"))
+
+    def write_output(self, name: str, value):
+        output_line = f"::set-output name={name}::{value}\n"
+        self.write(output_line)
+        self.logger.debug(f"Wrote output '{name}' ({len(output_line)} characters)")
+
+    def write_encoded_output(
+        self, name: str, data, output_encoding: str = DEFAULT_OUTPUT_ENCODING
+    ):
+        """ Writes data as the output name, encoded with output_encoding ('yaml' or
+        'msgpack') then base64, as it is encoded. """
+        if output_encoding not in OUTPUT_ENCODERS:
+            raise KnownException(
+                f"INPUT_OUTPUT_ENCODING - '{output_encoding}' is not one of {sorted(OUTPUT_ENCODERS.keys())}."
+            )
+        self.write(f"::set-output name={name}::")
+        size = OUTPUT_ENCODERS[output_encoding](data, self.write)
+        self.write("\n")
+        self.logger.debug(f"Wrote output '{name}' ({size} characters, streamed)")
+
+    def close(self):
+        self.output_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+def open_output_sink() -> OutputSink:
+    """ Outputs go to /output_message.txt in the action's container, and only to stdout
+    elsewhere. """
+    if is_docker():
+        return OutputSink(open(OUTPUT_MESSAGE_PATH, "wb"))
+    return OutputSink(tempfile.TemporaryFile())
+
+
+class Base64Writer:
+    """ Text stream that encodes what is written to it as UTF-8, then urlsafe base64, and
+    passes the encoded text to write() a block at a time. close() writes the rest. """
+
+    def __init__(self, write):
+        self._write = write
+        self._pending = bytearray()
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        self.write_bytes(text.encode("utf-8"))
+        return len(text)
+
+    def write_bytes(self, data: bytes):
+        self._pending.extend(data)
+        if len(self._pending) >= BASE64_BLOCK_SIZE:
+            block_end = len(self._pending) - len(self._pending) % 3
+            self._write_block(bytes(self._pending[:block_end]))
+            del self._pending[:block_end]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if len(self._pending) > 0:
+            self._write_block(bytes(self._pending))
+            self._pending = bytearray()
+
+    def _write_block(self, data: bytes):
+        encoded = str(base64.urlsafe_b64encode(data), "utf-8")
+        self.size += len(encoded)
+        self._write(encoded)
+
+
+def write_base64_yaml(data, write) -> int:
+    """ Dumps data as YAML, base64 encoded, to write(). Returns the length written. """
+    base64_writer = Base64Writer(write)
+    dump_yaml(data, base64_writer)
+    base64_writer.close()
+    return base64_writer.size
+
+
+def write_base64_msgpack(data, write) -> int:
+    """ Writes data as msgpack, zlib compressed and base64 encoded, to write(), after
+    MSGPACK_PREFIX. Returns the length written. """
+    write(MSGPACK_PREFIX)
+    base64_writer = Base64Writer(write)
+    packed = msgpack.packb(data, default=pack_default, use_bin_type=True)
+    compressor = zlib.compressobj()
+    packed_view = memoryview(packed)
+    for block_start in range(0, len(packed), BASE64_BLOCK_SIZE):
+        base64_writer.write_bytes(
+            compressor.compress(
+                packed_view[block_start : block_start + BASE64_BLOCK_SIZE]
+            )
+        )
+    base64_writer.write_bytes(compressor.flush())
+    base64_writer.close()
+    return len(MSGPACK_PREFIX) + base64_writer.size
+
+
+def pack_default(value):
+    """ Types msgpack has no encoding for, sent as strings. """
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Can't encode {type(value).__name__} values as msgpack: {value}")
+
+
+# Writers for the values of INPUT_OUTPUT_ENCODING.
+OUTPUT_ENCODERS = {"yaml": write_base64_yaml, "msgpack": write_base64_msgpack}
+
+
+def dump_yaml(data, stream):
+    """ Writes the same YAML as YAML.safe_dump(data, stream), without first building a node
+    for every value in data: dicts and lists are walked and sent to the emitter as events,
+    and only the values in them are represented, one at a time. Repeated dicts or lists are
+    written out again rather than as aliases. """
+    YAML.SafeDumper.add_representer(uuid.UUID, repr_uuid)
+    dumper = YAML.SafeDumper(stream)
+    try:
+        dumper.emit(YAML.StreamStartEvent())
+        dumper.emit(YAML.DocumentStartEvent(explicit=False))
+        emit_value(dumper, data)
+        dumper.emit(YAML.DocumentEndEvent(explicit=False))
+        dumper.emit(YAML.StreamEndEvent())
+    finally:
+        dumper.dispose()
+
+
+def emit_value(dumper: YAML.SafeDumper, value):
+    if isinstance(value, dict):
+        dumper.emit(
+            YAML.MappingStartEvent(
+                None, YAML.resolver.BaseResolver.DEFAULT_MAPPING_TAG, True, False
+            )
+        )
+        items = list(value.items())
+        try:
+            items = sorted(items)
+        except TypeError:
+            pass  # Keys that can't be compared keep their order, as in safe_dump.
+        for (item_key, item_value) in items:
+            emit_value(dumper, item_key)
+            emit_value(dumper, item_value)
+        dumper.emit(YAML.MappingEndEvent())
+    elif isinstance(value, list):
+        dumper.emit(
+            YAML.SequenceStartEvent(
+                None, YAML.resolver.BaseResolver.DEFAULT_SEQUENCE_TAG, True, False
+            )
+        )
+        for item in value:
+            emit_value(dumper, item)
+        dumper.emit(YAML.SequenceEndEvent())
+    else:
+        # Scalars (and anything else the dumper knows) go through its representer and
+        # serializer, so their tags and styles are what safe_dump would write.
+        node = dumper.represent_data(value)
+        dumper.represented_objects = {}
+        dumper.object_keeper = []
+        dumper.alias_key = None
+        dumper.serialized_nodes = {}
+        dumper.anchors = {}
+        dumper.anchor_node(node)
+        dumper.serialize_node(node, None, None)
+
+
+def is_docker():
+    cgroup_path = "/proc/self/cgroup"
+    return (
+        os.path.exists("/.dockerenv")
+        or os.path.isfile(cgroup_path)
+        and any("docker" in line for line in open(cgroup_path))
+    )
+
+
+def repr_uuid(dumper, uuid_obj):
+    return YAML.ScalarNode("tag:yaml.org,2002:str", str(uuid_obj))
@@ -0,0 +1,153 @@
+""" Runs several steps of one workflow in a single invocation. INPUT_STEP_NAMES lists the steps
+(comma separated, or '*' for every step in the workflow); a step depends on its 'previous' step
+when both are being run, and is started as soon as everything it depends on has finished.
+Independent steps run at the same time on a thread pool of INPUT_MAX_PARALLEL_STEPS workers,
+sharing the schema registry, the workflow object and the metastore connection.
+
+A step whose previous step ran in the same invocation takes that step's results as its input
+parameters. Any other setting can be given for one step only as INPUT_<STEP>__<SETTING>, e.g.
+INPUT_TRAIN__EXECUTION_FILE or INPUT_TRAIN__INPUT_PARAMETERS_FILE_PATH, which takes precedence
+over INPUT_<SETTING> (and, for input parameters, over the previous step's results). """
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.utils import setupLogger, KnownException  # noqa
+
+ALL_STEPS = "*"
+DEFAULT_MAX_PARALLEL_STEPS = 4
+INPUT_PARAMETER_VARIABLES = [
+    "INPUT_INPUT_PARAMETERS_RAW",
+    "INPUT_INPUT_PARAMETERS_BASE64",
+    "INPUT_INPUT_PARAMETERS_NODE_ID",
+    "INPUT_INPUT_PARAMETERS_FILE_PATH",
+]
+
+
+def select_steps(workflow_object, step_names: list) -> list:
+    """ Returns the steps to run, in workflow order. ['*'] selects every step. """
+    workflow_steps = list(workflow_object["steps"].keys())
+    if step_names == [ALL_STEPS]:
+        return workflow_steps
+
+    unknown_steps = [step for step in step_names if step not in workflow_steps]
+    if len(unknown_steps) > 0:
+        raise KnownException(
+            f"INPUT_STEP_NAMES - The workflow object does not contain the step(s): {unknown_steps}."
+        )
+    return [step for step in workflow_steps if step in step_names]
+
+
+def get_previous_steps(workflow_object, step_name: str) -> list:
+    previous_steps = workflow_object["steps"][step_name].get("previous", None)
+    if previous_steps is None or previous_steps == "":
+        return []
+    if isinstance(previous_steps, str):
+        return [previous_steps]
+    return list(previous_steps)
+
+
+def build_step_graph(workflow_object, step_names: list) -> dict:
+    """ Returns {step: [steps it depends on]} for step_names. Only dependencies on steps that
+    are also being run are kept; a 'previous' step outside the set is assumed to have run
+    already. Raises a KnownException if the steps depend on each other in a cycle. """
+    step_graph = {
+        step_name: [
+            previous_step
+            for previous_step in get_previous_steps(workflow_object, step_name)
+            if previous_step in step_names
+        ]
+        for step_name in step_names
+    }
+
+    # Kahn's algorithm, only to prove every step can eventually start.
+    remaining = {step: set(dependencies) for (step, dependencies) in step_graph.items()}
+    while len(remaining) > 0:
+        ready = [step for (step, dependencies) in remaining.items() if not dependencies]
+        if len(ready) == 0:
+            raise KnownException(
+                f"The steps {sorted(remaining.keys())} depend on each other in a cycle (through 'previous')."
+            )
+        for step in ready:
+            del remaining[step]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+
+    return step_graph
+
+
+def get_step_variable_prefix(step_name: str) -> str:
+    return "INPUT_" + re.sub(r"[^A-Za-z0-9]", "_", step_name).upper() + "__"
+
+
+def get_step_environ(environ, step_name: str) -> dict:
+    """ Returns the environment for one step: environ, with INPUT_STEP_NAME set to the step and
+    every INPUT_<STEP>__<SETTING> applied as INPUT_<SETTING>. """
+    prefix = get_step_variable_prefix(step_name)
+    step_environ = dict(environ)
+    for (name, value) in environ.items():
+        if name.startswith(prefix):
+            step_environ["INPUT_" + name[len(prefix) :]] = value
+    step_environ["INPUT_STEP_NAME"] = step_name
+    return step_environ
+
+
+def has_own_input_parameters(environ, step_name: str) -> bool:
+    prefix = get_step_variable_prefix(step_name)
+    return any(
+        environ.get(prefix + name[len("INPUT_") :], "") != ""
+        for name in INPUT_PARAMETER_VARIABLES
+    )
+
+
+def run_steps(
+    step_graph: dict, run_step_function, max_parallel_steps: int = None
+) -> (dict, dict):
+    """ Runs every step in step_graph once the steps it depends on have succeeded, as
+    run_step_function(step_name, {previous step: its result}). Steps whose dependencies failed
+    are not run. Returns ({step: result}, {step: exception}) for the steps that finished and
+    failed. """
+    rootLogger = setupLogger().get_root_logger()
+    if max_parallel_steps is None:
+        max_parallel_steps = DEFAULT_MAX_PARALLEL_STEPS
+
+    results = {}
+    failures = {}
+    waiting = dict(step_graph)
+    running = {}
+
+    with ThreadPoolExecutor(
+        max_workers=max_parallel_steps, thread_name_prefix="workflow-step"
+    ) as step_executor:
+        while len(waiting) > 0 or len(running) > 0:
+            for (step_name, dependencies) in list(waiting.items()):
+                if any(dependency in failures for dependency in dependencies):
+                    del waiting[step_name]
+                    failures[step_name] = KnownException(
+                        f"Step '{step_name}' was not run because a step it depends on failed."
+                    )
+                elif all(dependency in results for dependency in dependencies):
+                    del waiting[step_name]
+                    rootLogger.debug(f"::debug::Starting step '{step_name}'")
+                    previous_results = {
+                        dependency: results[dependency] for dependency in dependencies
+                    }
+                    running[
+                        step_executor.submit(
+                            run_step_function, step_name, previous_results
+                        )
+                    ] = step_name
+
+            if len(running) == 0:
+                break
+
+            (done, _) = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                step_name = running.pop(future)
+                try:
+                    results[step_name] = future.result()
+                    rootLogger.debug(f"::debug::Finished step '{step_name}'")
+                except Exception as e:
+                    rootLogger.critical(f"Step '{step_name}' failed: {str(e)}")
+                    failures[step_name] = e
+
+    return (results, failures)
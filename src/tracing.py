@@ -0,0 +1,187 @@
+""" Span tracing for a step run. Each phase of sub_main runs inside a span that records its
+start, end and duration, and metastore calls are traced through a proxy around the
+connection. Spans can be exported as a Chrome trace (loadable in chrome://tracing or
+Perfetto) and summarized per phase for the log object's log_property_bag.
+
+Each step of a DAG or batch gets a child of the run's tracer (Tracer.child), made current on
+its thread with activate(), so get_tracer() inside the step, and on the threads it hands work
+to through wrap(), records into it; its summary then only covers that step. Spans are passed
+on to the parent, which only keeps them (rather than just the per-phase totals) when it was
+created with keep_spans, as the run's tracer is when a Chrome trace was asked for. """
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from utils.utils import setupLogger  # noqa
+
+
+class Span:
+    """ One timed phase. Times are perf_counter seconds; thread_id is the thread it ran on. """
+
+    def __init__(self, name: str, start: float, end: float, thread_id: int, args: dict):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.thread_id = thread_id
+        self.args = args
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Tracer:
+    """ Collects spans from any thread: their per-phase totals, and with keep_spans the spans
+    themselves. Spans are passed on to parent, if there is one. """
+
+    def __init__(self, parent: "Tracer" = None, keep_spans: bool = True):
+        self.parent = parent
+        self.keep_spans = keep_spans
+        self.spans = []
+        self.phases = {}
+        self._lock = threading.Lock()
+        # Chrome traces want absolute microseconds, so keep the wall clock of the origin too.
+        self._origin = time.perf_counter()
+        self._origin_epoch = time.time()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(Span(name, start, end, threading.get_ident(), args))
+            setupLogger().get_root_logger().debug(
+                f"::debug::{name} took {(end - start) * 1000:.1f}ms"
+            )
+
+    def record(self, span: Span):
+        with self._lock:
+            if self.keep_spans:
+                self.spans.append(span)
+            phase = self.phases.setdefault(
+                span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            phase["count"] += 1
+            phase["total_ms"] += span.duration * 1000
+            phase["max_ms"] = max(phase["max_ms"], span.duration * 1000)
+        if self.parent is not None:
+            self.parent.record(span)
+
+    def child(self) -> "Tracer":
+        """ A tracer for one step, which passes its spans on to this one. """
+        return Tracer(parent=self, keep_spans=False)
+
+    @contextmanager
+    def activate(self):
+        """ Makes this the tracer get_tracer() returns on the current thread. """
+        previous_tracer = getattr(_active_tracers, "tracer", None)
+        _active_tracers.tracer = self
+        try:
+            yield self
+        finally:
+            _active_tracers.tracer = previous_tracer
+
+    def wrap(self, name: str, function):
+        """ Returns function wrapped in a span, e.g. for submitting to an executor. This
+        tracer is current while it runs, whichever thread runs it. """
+
+        @wraps(function)
+        def traced_function(*args, **kwargs):
+            with self.activate(), self.span(name):
+                return function(*args, **kwargs)
+
+        return traced_function
+
+    def to_chrome_trace(self) -> dict:
+        """ Returns the spans as complete ('X') events in the Chrome trace event format. """
+        process_id = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+
+        thread_ids = []
+        trace_events = []
+        for span in sorted(spans, key=lambda span: span.start):
+            if span.thread_id not in thread_ids:
+                thread_ids.append(span.thread_id)
+            trace_events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": round(
+                        (self._origin_epoch + span.start - self._origin) * 1e6, 3
+                    ),
+                    "dur": round(span.duration * 1e6, 3),
+                    "pid": process_id,
+                    # Small, stable thread numbers read better than idents in the viewer.
+                    "tid": thread_ids.index(span.thread_id),
+                    "args": {key: str(value) for key, value in span.args.items()},
+                }
+            )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, trace_path):
+        trace_path = Path(trace_path)
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        trace_path.write_text(json.dumps(self.to_chrome_trace()))
+
+    def summarize(self) -> dict:
+        """ Returns {span name: {count, total_ms, max_ms}} plus the elapsed time since the
+        tracer was created, for recording in the log object. """
+        with self._lock:
+            phases = {
+                name: {
+                    "count": phase["count"],
+                    "total_ms": round(phase["total_ms"], 3),
+                    "max_ms": round(phase["max_ms"], 3),
+                }
+                for (name, phase) in self.phases.items()
+            }
+
+        return {
+            "elapsed_ms": round((time.perf_counter() - self._origin) * 1000, 3),
+            "phases": phases,
+        }
+
+
+class TracedMetastore:
+    """ Forwards everything to the wrapped metastore connection, timing each method call in a
+    'metastore.<method>' span. """
+
+    def __init__(self, metastore_connection, tracer: Tracer = None):
+        self._metastore_connection = metastore_connection
+        # None records into whichever tracer is current when a method is called.
+        self._tracer = tracer
+
+    def get_metastore_connection(self):
+        return self._metastore_connection
+
+    def __getattr__(self, name):
+        value = getattr(self._metastore_connection, name)
+        if name.startswith("_") or not callable(value):
+            return value
+        tracer = self._tracer if self._tracer is not None else get_tracer()
+        return tracer.wrap(f"metastore.{name}", value)
+
+
+# The tracer for the current step run, so phases outside sub_main can add spans to it.
+_tracer = Tracer()
+# Tracers made current on a thread by Tracer.activate (a step's, in a DAG or batch).
+_active_tracers = threading.local()
+
+
+def get_tracer() -> Tracer:
+    """ The tracer current on this thread, or the run's tracer. """
+    active_tracer = getattr(_active_tracers, "tracer", None)
+    return active_tracer if active_tracer is not None else _tracer
+
+
+def reset_tracer(keep_spans: bool = True) -> Tracer:
+    global _tracer
+    _tracer = Tracer(keep_spans=keep_spans)
+    return _tracer
@@ -0,0 +1,477 @@
+""" Generates a Python validator module for each contract schema ahead of time, so a step can
+check its contract objects with code written for their schemas. Generate them with:
+
+    python3 validator_codegen.py .parameters/schemas generated_validators
+
+(the Dockerfile does this when the image is built). Validating an MLObject with mlspeclib
+copies the whole object into plain dicts (dict_without_internal_variables) and then walks the
+schema's fields one by one; a generated validator reads the object in place, with the fields,
+what is required and each field's type check unrolled for that schema (nested schemas
+included). Values of the type a field expects are checked inline; anything else goes to the
+field's own deserialize, so both paths accept exactly the same values.
+
+A generated module records the hash of the schema it was made from (see schema_hash.py), and
+is only used while the registered schema still has that hash. Contracts whose schema has no
+(current) module, and contracts that don't validate, go through mlspeclib as before - errors
+are always mlspeclib's own. """
+import sys
+import datetime
+import argparse
+import threading
+import importlib.util
+from pathlib import Path
+
+import marshmallow
+from box import Box, BoxList
+from marshmallow import fields, RAISE, ValidationError
+from marshmallow.validate import Validator
+from marshmallow.utils import missing, is_collection  # noqa
+from mlspeclib import MLObject
+from mlspeclib.helpers import return_schema_name, convert_yaml_to_dict
+from mlspeclib.mlschemafields import MLSchemaFields
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from utils.utils import setupLogger  # noqa E402
+from schema_hash import get_schema_hash  # noqa E402
+from schema_registry import load_schema_index  # noqa E402
+
+GENERATED_VALIDATORS_DIRECTORY = Path(__file__).parent / "generated_validators"
+
+# Bump when the generated code (or the helpers it calls) changes, so old modules are ignored.
+GENERATOR_FORMAT_VERSION = "1"
+
+# Keys MLObject keeps its own state under; validation leaves them out.
+INTERNAL_KEY_PREFIX = "_MLObject"
+
+# The only hook a supported schema may have (mlspeclib's, which passes dicts through).
+SUPPORTED_HOOKS = {("pre_load", False): ["pre_load_data"]}
+
+# Validators by schema class (None if there is no usable module).
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+class UnsupportedSchema(Exception):
+    """ The schema does something a generated validator doesn't reproduce. """
+
+
+def validate_object(ml_object: MLObject) -> dict:
+    """ Same as ml_object.validate(): returns {} if the object validates, or the errors. Uses
+    the schema's generated validator if there is one. """
+    try:
+        schema = ml_object.get_schema()
+    except AttributeError:
+        # No type has been set; mlspeclib reports that.
+        return ml_object.validate()
+    validator = get_validator(type(schema))
+    if (
+        validator is not None
+        and schema.many is False
+        and not schema.partial
+        and schema.unknown == RAISE
+    ):
+        try:
+            if validator.is_valid(ml_object, schema):
+                return {}
+        except Exception:  # noqa
+            # mlspeclib reports (or raises) whatever went wrong.
+            pass
+    return ml_object.validate()
+
+
+def create_object_from_string(file_contents) -> (MLObject, dict):
+    """ Same as MLObject.create_object_from_string: returns (MLObject, {}) if the contents (a
+    dict, or a yaml string) validate, or (None, errors). Uses the schema's generated validator
+    if there is one. """
+    contents_as_dict = convert_yaml_to_dict(file_contents)
+    if not (
+        isinstance(contents_as_dict, dict)
+        and "schema_type" in contents_as_dict
+        and "schema_version" in contents_as_dict
+    ):
+        # mlspeclib reports what is wrong with it.
+        return MLObject.create_object_from_string(file_contents)
+
+    ml_object = MLObject()
+    ml_object.set_type(
+        schema_version=contents_as_dict["schema_version"],
+        schema_type=contents_as_dict["schema_type"],
+    )
+    MLObject.update_tree(ml_object, contents_as_dict)
+    errors = validate_object(ml_object)
+    if len(errors) > 0:
+        return (None, errors)
+    return (ml_object, {})
+
+
+def get_validator(schema_class):
+    """ Returns the generated module for schema_class, or None if there isn't one for the
+    schema as it is registered now. """
+    with _validators_lock:
+        if schema_class in _validators:
+            return _validators[schema_class]
+
+    validator = load_validator(schema_class)
+    with _validators_lock:
+        _validators[schema_class] = validator
+    return validator
+
+
+def load_validator(schema_class):
+    rootLogger = setupLogger().get_root_logger()
+    schema_name = getattr(schema_class, "schema_name", None)
+    if schema_name is None:
+        return None
+    module_path = GENERATED_VALIDATORS_DIRECTORY / f"{schema_name}.py"
+    if not module_path.exists():
+        return None
+
+    spec = importlib.util.spec_from_file_location(
+        f"generated_validators.{get_identifier(schema_name)}", module_path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if getattr(module, "FORMAT_VERSION", None) != GENERATOR_FORMAT_VERSION:
+        rootLogger.debug(f"::debug::Generated validator {module_path} is out of date")
+        return None
+    if getattr(module, "SCHEMA_HASH", None) != get_schema_hash(schema_class):
+        rootLogger.debug(
+            f"::debug::Generated validator {module_path} is for another version of {schema_name}"
+        )
+        return None
+    return module
+
+
+def clear_validators():
+    """ Forgets the loaded modules (e.g. after generating them again). """
+    with _validators_lock:
+        _validators.clear()
+
+
+# Helpers called by the generated modules.
+
+
+def passes(validators: list, value) -> bool:
+    """ Runs a field's validators the way marshmallow does: a function fails by returning
+    False, and any validator by raising ValidationError. """
+    for validator in validators:
+        try:
+            if validator(value) is False and not isinstance(validator, Validator):
+                return False
+        except ValidationError:
+            return False
+    return True
+
+
+def deserializes(field: fields.Field, value, attr: str, data) -> bool:
+    """ Whether field accepts value, checked by the field itself. """
+    try:
+        field.deserialize(get_plain_value(value), attr, data, partial=False)
+    except ValidationError:
+        return False
+    return True
+
+
+def get_plain_value(value):
+    """ Box values as the plain dicts and lists mlspeclib validates (a few validators change
+    the values they are given). """
+    if isinstance(value, Box):
+        return value.to_dict()
+    if isinstance(value, BoxList):
+        return value.to_list()
+    return value
+
+
+# Generation.
+
+
+def generate_validators(schemas_directory, output_directory) -> list:
+    """ Writes a validator module for each schema in schemas_directory to output_directory.
+    Returns the paths written. """
+    rootLogger = setupLogger().get_root_logger()
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    (schema_index, _) = load_schema_index(schemas_directory)
+    schema_index.register_all()
+
+    written_paths = []
+    for (schema_type, schema_version) in sorted(schema_index.entries):
+        schema_name = return_schema_name(schema_version, schema_type)
+        schema_class = marshmallow.class_registry.get_class(schema_name)
+        try:
+            source = generate_validator_source(schema_class)
+        except UnsupportedSchema as error:
+            rootLogger.warning(f"No validator generated for {schema_name}: {error}")
+            continue
+
+        module_path = output_directory / f"{schema_name}.py"
+        module_path.write_text(source, "utf-8")
+        written_paths.append(module_path)
+    return written_paths
+
+
+def generate_validator_source(schema_class) -> str:
+    """ Python source for a module with is_valid(ml_object, schema), True if the object
+    (read in place) validates against schema, an instance of schema_class. """
+    generator = ValidatorGenerator()
+    top_function = generator.add_schema(schema_class, is_top_level=True)
+
+    lines = [
+        f'""" Validator for {schema_class.schema_name}, generated by validator_codegen.py. """',
+        "import uuid",
+        "import math",
+        "import datetime",
+        "from collections.abc import Mapping",
+        "",
+        "from validator_codegen import missing, is_collection, passes, deserializes",
+        "",
+        f"SCHEMA_NAME = {schema_class.schema_name!r}",
+        f"SCHEMA_HASH = {get_schema_hash(schema_class)!r}",
+        f"FORMAT_VERSION = {GENERATOR_FORMAT_VERSION!r}",
+        "",
+    ]
+    lines.extend(generator.constant_lines)
+    lines.extend(
+        [
+            "",
+            "",
+            "def is_valid(data, schema):",
+            f"    return {top_function}(data, schema)",
+        ]
+    )
+    for function_lines in generator.function_lines:
+        lines.extend(["", ""])
+        lines.extend(function_lines)
+    return "\n".join(lines) + "\n"
+
+
+class ValidatorGenerator:
+    """ Writes a check function for a schema and each schema nested in it. """
+
+    def __init__(self):
+        self.function_names = {}
+        self.constant_lines = []
+        self.function_lines = []
+
+    def add_schema(self, schema_class, is_top_level=False) -> str:
+        """ Returns the name of the function that checks data against schema_class. """
+        if (schema_class, is_top_level) in self.function_names:
+            return self.function_names[(schema_class, is_top_level)]
+
+        check_schema_supported(schema_class)
+        function_name = f"check_{get_identifier(schema_class.schema_name)}"
+        if is_top_level:
+            function_name += "_object"
+        self.function_names[(schema_class, is_top_level)] = function_name
+
+        schema = schema_class()
+        field_names_constant = f"FIELD_NAMES_{len(self.constant_lines)}"
+        self.constant_lines.append(
+            f"{field_names_constant} = frozenset({sorted(schema.load_fields)!r})"
+        )
+
+        lines = [f"def {function_name}(data, schema):", "    fields = schema.fields"]
+        if is_top_level:
+            lines.extend(
+                [
+                    f"    for key in data.keys() - {field_names_constant}:",
+                    f"        if not key.startswith({INTERNAL_KEY_PREFIX!r}):",
+                    "            return False",
+                ]
+            )
+        else:
+            lines.extend(
+                [
+                    f"    if not {field_names_constant}.issuperset(data):",
+                    "        return False",
+                ]
+            )
+        for (field_name, field) in sorted(schema.load_fields.items()):
+            lines.append(f"    value = data.get({field_name!r}, missing)")
+            lines.extend(
+                self.get_check_lines(
+                    field, "value", f"fields[{field_name!r}]", repr(field_name), 1
+                )
+            )
+        lines.append("    return True")
+        self.function_lines.append(lines)
+        return function_name
+
+    def get_check_lines(
+        self,
+        field,
+        value_name,
+        field_expression,
+        attr_expression,
+        depth,
+        may_be_missing=True,
+    ) -> list:
+        """ Lines that return False if the value in value_name isn't valid for field. """
+        indent = "    " * depth
+        lines = []
+        if may_be_missing and field.required and field.allow_none is not True:
+            lines.extend(
+                [
+                    f"{indent}if {value_name} is missing or {value_name} is None:",
+                    f"{indent}    return False",
+                ]
+            )
+        else:
+            if may_be_missing:
+                lines.extend(
+                    [
+                        f"{indent}if {value_name} is missing:",
+                        f"{indent}    {'return False' if field.required else 'pass'}",
+                    ]
+                )
+            lines.extend(
+                [
+                    f"{indent}{'elif' if may_be_missing else 'if'} {value_name} is None:",
+                    f"{indent}    {'pass' if field.allow_none is True else 'return False'}",
+                ]
+            )
+
+        fast_path = self.get_fast_path_lines(
+            field, value_name, field_expression, depth + 1
+        )
+        if fast_path is not None:
+            (condition, body_lines) = fast_path
+            if condition is None:
+                # Every value is checked inline.
+                lines.append(f"{indent}else:")
+                lines.extend(body_lines or [f"{indent}    pass"])
+                return lines
+            lines.append(f"{indent}elif {condition}:")
+            lines.extend(body_lines or [f"{indent}    pass"])
+        lines.extend(
+            [
+                f"{indent}elif not deserializes({field_expression}, {value_name}, {attr_expression}, data):",
+                f"{indent}    return False",
+            ]
+        )
+        return lines
+
+    def get_fast_path_lines(self, field, value_name, field_expression, depth):
+        """ (condition, lines) checking values of the type field expects without calling the
+        field, or None if every value goes to the field. The condition holds only for values
+        the field would take as they are (a condition of None holds for all of them). """
+        indent = "    " * depth
+        field_type = type(field)
+        validator_lines = []
+        if len(field.validators) > 0:
+            validator_lines = [
+                f"{indent}if not passes({field_expression}.validators, {value_name}):",
+                f"{indent}    return False",
+            ]
+
+        if field_type is fields.String:
+            return (f"type({value_name}) is str", validator_lines)
+        if field_type is fields.UUID:
+            return (f"type({value_name}) is uuid.UUID", validator_lines)
+        if field_type is fields.Integer and not field.strict:
+            return (f"type({value_name}) is int", validator_lines)
+        if field_type is fields.Float:
+            condition = f"type({value_name}) is float"
+            if field.allow_nan is False:
+                condition += f" and math.isfinite({value_name})"
+            return (condition, validator_lines)
+        if field_type is fields.Boolean:
+            if (
+                True in field.truthy
+                and False not in field.truthy
+                and False in field.falsy
+            ):
+                return (
+                    f"{value_name} is True or {value_name} is False",
+                    validator_lines,
+                )
+            return None
+        if (
+            field_type is MLSchemaFields.DateTime
+            and field.identity_type is datetime.datetime
+        ):
+            return (f"isinstance({value_name}, datetime.datetime)", validator_lines)
+        # Validators of dicts and lists are given plain copies (see deserializes), so those
+        # fields with validators go to the field.
+        if field_type is fields.Raw and len(field.validators) == 0:
+            return (None, [])
+        if (
+            field_type is fields.Dict
+            and field.key_field is None
+            and field.value_field is None
+            and len(field.validators) == 0
+        ):
+            return (f"isinstance({value_name}, Mapping)", [])
+        if field_type is fields.List and len(field.validators) == 0:
+            item_name = f"item_{depth}"
+            return (
+                f"is_collection({value_name})",
+                [f"{indent}for {item_name} in {value_name}:"]
+                + self.get_check_lines(
+                    field.inner,
+                    item_name,
+                    f"{field_expression}.inner",
+                    "None",
+                    depth + 1,
+                    may_be_missing=False,
+                ),
+            )
+        if (
+            field_type is fields.Nested
+            and len(field.validators) == 0
+            and not field.many
+            and field.only is None
+            and len(field.exclude) == 0
+            and field.unknown in (None, RAISE)
+        ):
+            nested_class = type(field.schema)
+            function_name = self.add_schema(nested_class)
+            return (
+                f"isinstance({value_name}, dict)",
+                [
+                    f"{indent}if not {function_name}({value_name}, {field_expression}.schema):",
+                    f"{indent}    return False",
+                ],
+            )
+        return None
+
+
+def check_schema_supported(schema_class):
+    hooks = {
+        hook_key: hook_names
+        for (hook_key, hook_names) in getattr(schema_class, "_hooks", {}).items()
+        if len(hook_names) > 0
+    }
+    if hooks != SUPPORTED_HOOKS:
+        raise UnsupportedSchema(f"hooks {hooks}")
+    if getattr(schema_class, "schema_name", None) is None:
+        raise UnsupportedSchema("no schema_name")
+    if schema_class.opts.unknown != RAISE:
+        raise UnsupportedSchema(f"unknown={schema_class.opts.unknown}")
+    for (field_name, field) in schema_class().load_fields.items():
+        if field.data_key is not None or field.attribute is not None:
+            raise UnsupportedSchema(f"{field_name} is loaded from or to another key")
+
+
+def get_identifier(schema_name: str) -> str:
+    return "".join(
+        character if character.isalnum() else "_" for character in schema_name
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("schemas_directory")
+    parser.add_argument(
+        "output_directory", nargs="?", default=str(GENERATED_VALIDATORS_DIRECTORY)
+    )
+    arguments = parser.parse_args()
+    for module_path in generate_validators(
+        arguments.schemas_directory, arguments.output_directory
+    ):
+        print(module_path)
@@ -0,0 +1,135 @@
+""" Keeps workflow objects between the steps that use them, keyed by workflow node ID and
+workflow_version, so only the first step of a run (or on a runner) fetches and rebuilds the
+workflow. Before a cached workflow is used, the metastore is asked for just the node's
+workflow_version - one property, not the whole node - and the cached copy is used if that
+version is the one it was cached at. A workflow's content doesn't change within a version.
+
+Workflows are kept in this process (for later steps of a DAG or a batch, or in the step daemon)
+and on disk in the object cache (see object_cache.py), for later steps on the same runner.
+Turning off the object cache (INPUT_OBJECT_CACHE_SIZE_MB=0) turns off both. """
+import threading
+from collections import OrderedDict
+
+from mlspeclib import MLObject
+
+from utils.utils import setupLogger  # noqa
+from object_cache import ObjectCache  # noqa
+
+# Workflows kept in this process, most recently used last.
+MEMORY_CACHE_SIZE = 16
+
+_workflow_objects = OrderedDict()
+_workflow_objects_lock = threading.Lock()
+
+
+class WorkflowCache:
+    """ Workflow objects by (metastore, workflow node ID, workflow_version). """
+
+    def __init__(self, namespace: str, object_cache: ObjectCache):
+        self.namespace = namespace
+        self.object_cache = object_cache
+
+    @classmethod
+    def from_environ(cls, environ) -> "WorkflowCache":
+        return cls(
+            environ.get("INPUT_METASTORE_CREDENTIALS", ""),
+            ObjectCache.from_environ(environ),
+        )
+
+    def get(self, workflow_node_id: str, metastore_connection) -> MLObject:
+        """ Returns the cached workflow object if it is still at the node's workflow_version,
+        or None. The object may be shared with other steps, which only read it. """
+        if not self.object_cache.enabled:
+            return None
+
+        workflow_version = get_workflow_version(metastore_connection, workflow_node_id)
+        if workflow_version is None:
+            return None
+
+        memory_key = (self.namespace, workflow_node_id, workflow_version)
+        with _workflow_objects_lock:
+            if memory_key in _workflow_objects:
+                _workflow_objects.move_to_end(memory_key)
+                return _workflow_objects[memory_key]
+
+        entry = self.object_cache.get(
+            self.namespace, workflow_node_id, workflow_version
+        )
+        if entry is None:
+            return None
+
+        # The workflow validated when it was first loaded, so it is rebuilt without
+        # validating it again.
+        workflow_object = MLObject()
+        workflow_object.set_type(
+            schema_type=entry["schema_type"], schema_version=entry["schema_version"]
+        )
+        workflow_object.update(entry["workflow"])
+        remember_workflow_object(memory_key, workflow_object)
+        return workflow_object
+
+    def put(self, workflow_node_id: str, workflow_object: MLObject):
+        """ Caches a workflow object that loaded without errors. Workflows without a
+        workflow_version can't be revalidated, so aren't cached. """
+        if (
+            not self.object_cache.enabled
+            or workflow_object.get("workflow_version") is None
+        ):
+            return
+
+        workflow_version = str(workflow_object.workflow_version)
+        remember_workflow_object(
+            (self.namespace, workflow_node_id, workflow_version), workflow_object
+        )
+        self.object_cache.put(
+            self.namespace,
+            workflow_node_id,
+            {
+                "schema_type": workflow_object.schema_type,
+                "schema_version": workflow_object.schema_version,
+                "workflow": workflow_object.dict_without_internal_variables(),
+            },
+            workflow_version,
+        )
+
+
+def remember_workflow_object(memory_key: tuple, workflow_object: MLObject):
+    with _workflow_objects_lock:
+        _workflow_objects[memory_key] = workflow_object
+        _workflow_objects.move_to_end(memory_key)
+        while len(_workflow_objects) > MEMORY_CACHE_SIZE:
+            _workflow_objects.popitem(last=False)
+
+
+def clear_workflow_objects():
+    """ Forgets the workflows kept in this process. """
+    with _workflow_objects_lock:
+        _workflow_objects.clear()
+
+
+def get_workflow_version(metastore_connection, workflow_node_id: str):
+    """ The workflow_version of the workflow node, as a string, or None if it isn't known.
+    Uses the metastore's get_workflow_version if it has one (see sqlite_metastore.py), and
+    otherwise asks the gremlin metastore for the node's 'version' property alone. """
+    rootLogger = setupLogger().get_root_logger()
+
+    get_version = getattr(metastore_connection, "get_workflow_version", None)
+    if get_version is not None:
+        workflow_version = get_version(workflow_node_id)
+        return None if workflow_version is None else str(workflow_version)
+
+    execute_query = getattr(metastore_connection, "execute_query", None)
+    if execute_query is None:
+        return None
+    escaped_node_id = workflow_node_id.replace("\\", "\\\\").replace("'", "\\'")
+    try:
+        versions = execute_query(f"g.V('{escaped_node_id}').values('version')")
+    except ValueError:
+        # No such node (or no version on it); the full read reports it.
+        return None
+    if len(versions) != 1:
+        rootLogger.debug(
+            f"::debug::Expected one version for workflow '{workflow_node_id}', got {versions}"
+        )
+        return None
+    return str(versions[0])
@@ -0,0 +1,120 @@
+""" Compares validating a step's output through the old yaml round trip with validating the
+MLObject in memory. Run from the repo root:
+
+    python tests/benchmarks/contract_validation.py --sizes 10,1000,10000
+"""
+import sys
+import uuid
+import time
+import argparse
+import datetime
+from pathlib import Path
+
+import yaml as YAML
+from box import Box
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import load_contract_object  # noqa E402
+
+STEP_NAME = "process_data"
+WORKFLOW_OBJECT = Box(
+    {
+        "steps": {
+            STEP_NAME: {
+                "output": {"schema_type": "data_result", "schema_version": "9999.0.1"}
+            }
+        }
+    }
+)
+
+
+def build_output_object(metric_count: int) -> MLObject:
+    """ Builds a data_result whose nested execution_profile.nvidia_metrics holds
+    metric_count series, to stand in for large nested training results. """
+    results_ml_object = MLObject()
+    results_ml_object.set_type(schema_type="data_result", schema_version="9999.0.1")
+    results_ml_object.run_id = str(uuid.uuid4())
+    results_ml_object.step_id = str(uuid.uuid4())
+    results_ml_object.run_date = datetime.datetime.now().isoformat()
+    results_ml_object.data_output_path = "/tmp/data_output.csv"
+    results_ml_object.data_statistics_path = "/tmp/data_stats.csv"
+    results_ml_object.data_schemas_path = "/tmp/data_schemas.yaml"
+    results_ml_object.feature_file_path = "/tmp/feature_file.yaml"
+
+    execution_profile = results_ml_object.execution_profile
+    execution_profile.cpu_utilization = 0.5
+    execution_profile.system_memory_utilization = 0.5
+    execution_profile.disk_io_utilization = 0.5
+    execution_profile.network_traffic_in_bytes = 1024
+    execution_profile.gpu_utilization = 0.5
+    execution_profile.gpu_temperature = 70.0
+    execution_profile.gpu_percent_of_time_accessing_memory = 0.5
+    execution_profile.gpu_memory_allocation = 0.5
+    execution_profile.nvidia_metrics = {
+        f"gpu_{i}": {"utilization": [0.5] * 8, "temperature": [70.0] * 8}
+        for i in range(metric_count)
+    }
+    return results_ml_object
+
+
+def validate_with_yaml_round_trip(results_ml_object: MLObject):
+    """ What execute_step used to do: object -> dict -> yaml -> new object -> validate. """
+    parameters_string = YAML.safe_dump(
+        results_ml_object.dict_without_internal_variables()
+    )
+    (contract_object, errors) = MLObject.create_object_from_string(parameters_string)
+    if errors is not None and len(errors) > 0:
+        raise ValueError(errors)
+    return contract_object
+
+
+def validate_in_memory(results_ml_object: MLObject):
+    return load_contract_object(
+        parameters=results_ml_object,
+        workflow_object=WORKFLOW_OBJECT,
+        step_name=STEP_NAME,
+        contract_type="output",
+    )
+
+
+def best_time(function, argument, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes: list, repeat: int) -> list:
+    MLSchema.append_schema_to_registry(Path("tests") / "schemas_for_test")
+
+    results = []
+    for size in sizes:
+        results_ml_object = build_output_object(size)
+        round_trip_seconds = best_time(
+            validate_with_yaml_round_trip, results_ml_object, repeat
+        )
+        in_memory_seconds = best_time(validate_in_memory, results_ml_object, repeat)
+        results.append((size, round_trip_seconds, in_memory_seconds))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    sizes = [int(size) for size in arguments.sizes.split(",")]
+    print(f"{'metrics':>10}{'yaml round trip':>20}{'in memory':>15}{'speedup':>10}")
+    for (size, round_trip_seconds, in_memory_seconds) in run(sizes, arguments.repeat):
+        print(
+            f"{size:>10}{round_trip_seconds * 1000:>18.2f}ms{in_memory_seconds * 1000:>13.2f}ms"
+            f"{round_trip_seconds / in_memory_seconds:>9.1f}x"
+        )
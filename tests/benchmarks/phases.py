@@ -0,0 +1,567 @@
+""" Times each phase of a step run, and sub_main as a whole, against local stand-ins: a SQLite
+metastore and a file:// git repo of generated schemas. Phases are timed at several schema
+counts, parameter sizes and output sizes. Timings are divided by a calibration loop so that
+baselines recorded on one machine can be compared on another. Run from the repo root:
+
+    python tests/benchmarks/phases.py                 # compare against baselines.json
+    python tests/benchmarks/phases.py --record        # rewrite baselines.json
+
+The test suite compares against baselines.json too, when RUN_BENCHMARKS is set:
+
+    RUN_BENCHMARKS=1 python -m pytest tests/test_benchmarks.py
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import argparse
+import datetime
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+import msgpack
+from box import Box
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import main  # noqa E402
+import schema_registry  # noqa E402
+import workflow_cache  # noqa E402
+import validator_codegen  # noqa E402
+from schema_registry import load_schema_index, load_schemas_into_registry  # noqa E402
+from schema_git_cache import fetch_schemas_from_git  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from tests.benchmarks.contract_validation import build_output_object  # noqa E402
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+
+# A phase fails when its calibrated time is more than THRESHOLD times its baseline...
+DEFAULT_THRESHOLD = 2.0
+# ...and slower than the baseline by more than this, so sub-millisecond noise can't fail it.
+MINIMUM_REGRESSION_SECONDS = 0.005
+
+DEFAULT_SIZES = {
+    "schema_count": [10, 100],
+    "parameter_size": [10, 1000],
+    "output_size": [10, 1000],
+}
+
+TEST_SCHEMAS_DIRECTORY = Path("tests") / "schemas_for_test"
+STEP_NAME = "process_data"
+WORKFLOW_OBJECT = Box(
+    {
+        "steps": {
+            STEP_NAME: {
+                "input": {"schema_type": "data_source", "schema_version": "9999.0.1"},
+                "execution": {
+                    "schema_type": "data_process_run",
+                    "schema_version": "9999.0.1",
+                },
+                "output": {"schema_type": "data_result", "schema_version": "9999.0.1"},
+            }
+        }
+    }
+)
+SCHEMA_TEMPLATE = """\
+mlspec_base_type:
+  meta: base
+mlspec_schema_version:
+  meta: 9999.0.1
+mlspec_schema_type:
+  meta: {schema_type}
+schema_version:
+  type: semver
+  required: True
+schema_type:
+  type: string
+  required: True
+{schema_type}_path:
+  type: path
+  required: True
+"""
+
+
+def best_time(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def calibrate(repeat: int = 5) -> float:
+    """ Times a fixed mix of yaml dumping and hashing, the two things a step run spends most
+    of its own (non-metastore) time on. """
+    calibration_dict = {
+        f"key_{i}": {"value": i, "name": f"name_{i}"} for i in range(2000)
+    }
+    calibration_bytes = b"x" * (4 * 1024 * 1024)
+
+    def calibration_loop():
+        YAML.safe_dump(calibration_dict)
+        hashlib.sha256(calibration_bytes).hexdigest()
+
+    return best_time(calibration_loop, repeat)
+
+
+def write_schema_directory(directory: Path, schema_count: int, prefix: str):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "base.yaml").write_text(
+        (TEST_SCHEMAS_DIRECTORY / "base.yaml").read_text()
+    )
+    for i in range(schema_count):
+        schema_type = f"{prefix}_{i}"
+        (directory / f"{schema_type}.yaml").write_text(
+            SCHEMA_TEMPLATE.format(schema_type=schema_type)
+        )
+
+
+def git(directory: Path, *arguments):
+    subprocess.run(
+        ["git", *arguments],
+        cwd=str(directory),
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={
+            **os.environ,
+            "GIT_AUTHOR_NAME": "benchmark",
+            "GIT_AUTHOR_EMAIL": "benchmark@localhost",
+            "GIT_COMMITTER_NAME": "benchmark",
+            "GIT_COMMITTER_EMAIL": "benchmark@localhost",
+        },
+    )
+
+
+def create_schema_repo(directory: Path, schema_count: int) -> str:
+    """ Creates a git repo with the test schemas plus schema_count generated ones, and
+    returns its file:// url. """
+    write_schema_directory(directory, schema_count, f"git_{schema_count}")
+    for schema_file in TEST_SCHEMAS_DIRECTORY.glob("*.yaml"):
+        (directory / schema_file.name).write_text(schema_file.read_text())
+    git(directory, "init", "-q")
+    git(directory, "add", ".")
+    git(directory, "commit", "-q", "-m", "Schemas")
+    return directory.resolve().as_uri()
+
+
+def build_workflow_object() -> MLObject:
+    workflow_dict = YAML.safe_load(
+        (Path("tests") / ".parameters" / "workflow.yaml").read_text()
+    )
+    # The fixture's package step names schema types the test schemas spell with an 's'.
+    workflow_dict["steps"]["package"]["input"]["schema_type"] = "training_results"
+    workflow_dict["steps"]["package"]["output"]["schema_type"] = "package_results"
+    workflow_dict["workflow_version"] = "1.0.0"
+    workflow_dict["run_id"] = str(uuid.uuid4())
+    workflow_dict["step_id"] = str(uuid.uuid4())
+    workflow_dict["run_date"] = datetime.datetime.now()
+    (workflow_object, errors) = MLObject.create_object_from_string(workflow_dict)
+    if errors is not None and len(errors) > 0:
+        raise ValueError(errors)
+    return workflow_object
+
+
+def build_parameters(parameter_size: int) -> dict:
+    parameters = YAML.safe_load(
+        (Path("tests") / ".parameters" / STEP_NAME / "input" / "input.yaml").read_text()
+    )
+    parameters["source_properties"] = {
+        f"property_{i}": {"value": i, "description": f"Property number {i}"}
+        for i in range(parameter_size)
+    }
+    return parameters
+
+
+def benchmark_environment(repeat: int) -> dict:
+    environment = {variable: "value" for variable in main.REQUIRED}
+    with patch.dict(os.environ, environment):
+        seconds = best_time(main.convert_environment_variables_to_dict, repeat)
+    return {"convert_environment_variables_to_dict": seconds}
+
+
+def benchmark_schema_loading(work_directory: Path, schema_count: int, repeat: int):
+    schemas_directory = work_directory / f"schemas_{schema_count}"
+    write_schema_directory(schemas_directory, schema_count, f"bench_{schema_count}")
+
+    def load_with_empty_cache():
+        with patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": tempfile.mkdtemp(dir=work_directory)}
+        ):
+            schema_registry._loaded_indexes.clear()
+            load_schema_index(schemas_directory)
+
+    def load_from_snapshot():
+        # A new process has no in-memory index, only the snapshot on disk.
+        schema_registry._loaded_indexes.clear()
+        load_schema_index(schemas_directory)
+
+    registration_count = [0]
+
+    def register_new_schemas():
+        # Every repeat registers a directory of schema types the registry hasn't seen.
+        registration_count[0] += 1
+        directory = work_directory / f"register_{schema_count}_{registration_count[0]}"
+        write_schema_directory(
+            directory, schema_count, f"reg_{schema_count}_{registration_count[0]}"
+        )
+        (schema_index, _) = load_schema_index(directory)
+        start = time.perf_counter()
+        schema_index.register_all()
+        return time.perf_counter() - start
+
+    load_schema_index(schemas_directory)
+    return {
+        f"schema_index_miss[schemas={schema_count}]": best_time(
+            load_with_empty_cache, repeat
+        ),
+        f"schema_index_hit[schemas={schema_count}]": best_time(
+            load_from_snapshot, repeat
+        ),
+        f"schema_registration[schemas={schema_count}]": min(
+            register_new_schemas() for _ in range(repeat)
+        ),
+    }
+
+
+def benchmark_git(work_directory: Path, schema_count: int, repeat: int) -> dict:
+    git_url = create_schema_repo(work_directory / f"repo_{schema_count}", schema_count)
+    warm_cache_directory = tempfile.mkdtemp(dir=work_directory)
+    warm_schemas_directory = tempfile.mkdtemp(dir=work_directory)
+
+    def fetch_with_empty_cache():
+        with patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": tempfile.mkdtemp(dir=work_directory)}
+        ):
+            fetch_schemas_from_git(git_url, tempfile.mkdtemp(dir=work_directory))
+
+    def fetch_with_warm_cache():
+        with patch.dict(os.environ, {"INPUT_CACHE_DIRECTORY": warm_cache_directory}):
+            fetch_schemas_from_git(git_url, warm_schemas_directory)
+
+    fetch_with_warm_cache()
+    return {
+        f"git_fetch_miss[schemas={schema_count}]": best_time(
+            fetch_with_empty_cache, repeat
+        ),
+        f"git_fetch_hit[schemas={schema_count}]": best_time(
+            fetch_with_warm_cache, repeat
+        ),
+    }
+
+
+def benchmark_parameters(
+    work_directory: Path, parameter_size: int, repeat: int
+) -> dict:
+    parameters = build_parameters(parameter_size)
+    parameters_path = work_directory / f"parameters_{parameter_size}.yaml"
+    parameters_path.write_text(YAML.safe_dump(parameters))
+    json_path = work_directory / f"parameters_{parameter_size}.json"
+    json_path.write_text(json.dumps(parameters, default=str))
+    msgpack_path = work_directory / f"parameters_{parameter_size}.msgpack"
+    msgpack_path.write_bytes(msgpack.packb(parameters, default=str, use_bin_type=True))
+
+    results = {}
+    for (phase, path) in [
+        (f"load_parameters_file[params={parameter_size}]", parameters_path),
+        (f"load_parameters_file_json[params={parameter_size}]", json_path),
+        (f"load_parameters_file_msgpack[params={parameter_size}]", msgpack_path),
+    ]:
+        with patch.dict(os.environ, {"INPUT_INPUT_PARAMETERS_FILE_PATH": str(path)}):
+            results[phase] = best_time(
+                lambda: main.load_parameters("INPUT", None), repeat
+            )
+    return results
+
+
+def benchmark_parameters_from_metastore(work_directory: Path, repeat: int) -> dict:
+    metastore = SQLiteMetastore(work_directory / "parameters.db")
+    node_id = metastore.attach_step_info(
+        load_step_contract("input"), "1.0.0", "workflow", STEP_NAME, "input"
+    )
+
+    with patch.dict(os.environ, {"INPUT_INPUT_PARAMETERS_NODE_ID": node_id}):
+        seconds = best_time(lambda: main.load_parameters("INPUT", metastore), repeat)
+    metastore.close()
+    return {"load_parameters_node": seconds}
+
+
+def benchmark_workflow_from_metastore(work_directory: Path, repeat: int) -> dict:
+    metastore = SQLiteMetastore(work_directory / "workflow.db")
+    workflow_node_id = metastore.create_workflow_node(build_workflow_object())
+    environ = {"INPUT_METASTORE_CREDENTIALS": "workflow.db"}
+
+    def load_from_disk():
+        workflow_cache.clear_workflow_objects()
+        main.load_workflow_object(workflow_node_id, metastore, environ)
+
+    results = {
+        "load_workflow_object": best_time(
+            lambda: main.load_workflow_object(
+                workflow_node_id,
+                metastore,
+                {**environ, "INPUT_OBJECT_CACHE_SIZE_MB": "0"},
+            ),
+            repeat,
+        ),
+        "load_workflow_object_cached": best_time(
+            lambda: main.load_workflow_object(workflow_node_id, metastore, environ),
+            repeat,
+        ),
+        "load_workflow_object_cached_on_disk": best_time(load_from_disk, repeat),
+    }
+    workflow_cache.clear_workflow_objects()
+    metastore.close()
+    return results
+
+
+def benchmark_contract(output_size: int, repeat: int) -> dict:
+    results_ml_object = build_output_object(output_size)
+
+    def validate():
+        main.load_contract_object(
+            parameters=results_ml_object,
+            workflow_object=WORKFLOW_OBJECT,
+            step_name=STEP_NAME,
+            contract_type="output",
+        )
+
+    return {
+        f"load_contract_object[outputs={output_size}]": best_time(validate, repeat),
+        f"encode_results_object[outputs={output_size}]": best_time(
+            lambda: main.encode_results_object(results_ml_object), repeat
+        ),
+    }
+
+
+def benchmark_contract_generated(
+    work_directory: Path, output_size: int, repeat: int
+) -> dict:
+    """ benchmark_contract's load_contract_object, with validators generated for the test
+    schemas. """
+    validators_directory = work_directory / "generated_validators"
+    validator_codegen.generate_validators(TEST_SCHEMAS_DIRECTORY, validators_directory)
+    results_ml_object = build_output_object(output_size)
+
+    def validate():
+        main.load_contract_object(
+            parameters=results_ml_object,
+            workflow_object=WORKFLOW_OBJECT,
+            step_name=STEP_NAME,
+            contract_type="output",
+        )
+
+    validator_codegen.clear_validators()
+    with patch.object(
+        validator_codegen, "GENERATED_VALIDATORS_DIRECTORY", validators_directory
+    ):
+        seconds = best_time(validate, repeat)
+    validator_codegen.clear_validators()
+    return {f"load_contract_object_generated[outputs={output_size}]": seconds}
+
+
+def benchmark_execution_contract(repeat: int) -> dict:
+    execution_path = (
+        Path("tests") / ".parameters" / STEP_NAME / "execution" / "execution.yaml"
+    )
+    execution_dict = YAML.safe_load(execution_path.read_text())
+
+    def validate():
+        # Stamped with new values on every run, as in process_step.
+        execution_dict["run_id"] = str(uuid.uuid4())
+        execution_dict["run_date"] = datetime.datetime.now()
+        execution_dict["step_id"] = str(uuid.uuid4())
+        main.load_contract_object(
+            parameters=dict(execution_dict),
+            workflow_object=WORKFLOW_OBJECT,
+            step_name=STEP_NAME,
+            contract_type="execution",
+        )
+
+    return {"load_contract_object_dict": best_time(validate, repeat)}
+
+
+def benchmark_execute_step(repeat: int) -> dict:
+    workflow_object = build_workflow_object()
+    input_object = load_step_contract("input")
+    execution_object = load_step_contract("execution")
+
+    def execute():
+        main.execute_step(
+            str(Path("tests") / "sample_process_data_execution.py"),
+            workflow_object,
+            input_object,
+            execution_object,
+            STEP_NAME,
+            str(uuid.uuid4()),
+        )
+
+    return {"execute_step": best_time(execute, repeat)}
+
+
+def load_step_contract(contract_type: str) -> MLObject:
+    contract_path = (
+        Path("tests")
+        / ".parameters"
+        / STEP_NAME
+        / contract_type
+        / f"{contract_type}.yaml"
+    )
+    contract_dict = YAML.safe_load(contract_path.read_text())
+    contract_dict.setdefault("run_id", str(uuid.uuid4()))
+    contract_dict.setdefault("step_id", str(uuid.uuid4()))
+    contract_dict.setdefault("run_date", datetime.datetime.now())
+    (contract_object, errors) = MLObject.create_object_from_string(contract_dict)
+    if errors is not None and len(errors) > 0:
+        raise ValueError(errors)
+    return contract_object
+
+
+def benchmark_sub_main(work_directory: Path, repeat: int) -> dict:
+    """ Times a full step run with the SQLite metastore and schemas from a file:// repo. """
+    database_path = work_directory / "sub_main.db"
+    metastore = SQLiteMetastore(database_path)
+    workflow_node_id = metastore.create_workflow_node(build_workflow_object())
+    metastore.close()
+
+    credentials = {"backend": "sqlite", "path": str(database_path)}
+    environment = {
+        "INPUT_WORKFLOW_NODE_ID": workflow_node_id,
+        "INPUT_STEP_NAME": STEP_NAME,
+        "INPUT_METASTORE_CREDENTIALS": str(
+            base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")),
+            "utf-8",
+        ),
+        "GITHUB_RUN_ID": str(uuid.uuid4()),
+        "GITHUB_WORKSPACE": str(work_directory),
+        "INPUT_SCHEMAS_DIRECTORY": str(work_directory / "sub_main_schemas"),
+        "INPUT_SCHEMAS_GIT_URL": create_schema_repo(
+            work_directory / "sub_main_repo", 0
+        ),
+        "INPUT_INPUT_PARAMETERS_FILE_PATH": str(
+            Path("tests") / ".parameters" / STEP_NAME / "input" / "input.yaml"
+        ),
+        "INPUT_EXECUTION_PARAMETERS_FILE_PATH": str(
+            Path("tests") / ".parameters" / STEP_NAME / "execution" / "execution.yaml"
+        ),
+        "INPUT_EXECUTION_FILE": str(Path("tests") / "sample_process_data_execution.py"),
+        "INPUT_CACHE_DIRECTORY": str(work_directory / "sub_main_cache"),
+    }
+
+    with patch.dict(os.environ, environment):
+        return {"sub_main": best_time(main.sub_main, repeat)}
+
+
+def run_suite(sizes: dict = None, repeat: int = 3) -> dict:
+    """ Runs every phase benchmark and returns {"calibration": seconds, "phases": {name:
+    seconds}}. Output printed by the phases themselves is discarded. """
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+
+    MLSchema.populate_registry()
+    load_schemas_into_registry(TEST_SCHEMAS_DIRECTORY)
+
+    phases = {}
+    with tempfile.TemporaryDirectory() as work_directory_name:
+        work_directory = Path(work_directory_name)
+        with contextlib.redirect_stdout(io.StringIO()), patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": str(work_directory / "cache")}
+        ):
+            phases.update(benchmark_environment(repeat))
+            for schema_count in sizes["schema_count"]:
+                phases.update(
+                    benchmark_schema_loading(work_directory, schema_count, repeat)
+                )
+                phases.update(benchmark_git(work_directory, schema_count, repeat))
+            for parameter_size in sizes["parameter_size"]:
+                phases.update(
+                    benchmark_parameters(work_directory, parameter_size, repeat)
+                )
+            phases.update(benchmark_parameters_from_metastore(work_directory, repeat))
+            phases.update(benchmark_workflow_from_metastore(work_directory, repeat))
+            for output_size in sizes["output_size"]:
+                phases.update(benchmark_contract(output_size, repeat))
+                phases.update(
+                    benchmark_contract_generated(work_directory, output_size, repeat)
+                )
+            phases.update(benchmark_execution_contract(repeat))
+            phases.update(benchmark_execute_step(repeat))
+            phases.update(benchmark_sub_main(work_directory, repeat))
+
+    return {"calibration": calibrate(), "phases": phases}
+
+
+def find_regressions(
+    results: dict,
+    baselines: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    minimum_seconds: float = MINIMUM_REGRESSION_SECONDS,
+) -> list:
+    """ Returns (phase, baseline seconds, seconds) for every phase that regressed, with
+    the baseline scaled to this machine by the ratio of the calibration timings. """
+    scale = results["calibration"] / baselines["calibration"]
+    regressions = []
+    for (phase, seconds) in results["phases"].items():
+        if phase not in baselines["phases"]:
+            continue
+        baseline_seconds = baselines["phases"][phase] * scale
+        if (
+            seconds > baseline_seconds * threshold
+            and seconds - baseline_seconds > minimum_seconds
+        ):
+            regressions.append((phase, baseline_seconds, seconds))
+    return regressions
+
+
+def read_baselines(baselines_path: Path = BASELINES_PATH) -> dict:
+    return json.loads(baselines_path.read_text())
+
+
+def write_baselines(results: dict, baselines_path: Path = BASELINES_PATH):
+    baselines = {
+        "calibration": round(results["calibration"], 6),
+        "phases": {
+            phase: round(seconds, 6) for (phase, seconds) in results["phases"].items()
+        },
+    }
+    baselines_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    arguments = parser.parse_args()
+
+    results = run_suite(repeat=arguments.repeat)
+    if arguments.record:
+        write_baselines(results)
+
+    baselines = read_baselines()
+    scale = results["calibration"] / baselines["calibration"]
+    print(f"{'phase':<50}{'baseline':>12}{'now':>12}")
+    for (phase, seconds) in results["phases"].items():
+        baseline = baselines["phases"].get(phase)
+        baseline_text = "-" if baseline is None else f"{baseline * scale * 1000:.2f}ms"
+        print(f"{phase:<50}{baseline_text:>12}{seconds * 1000:>10.2f}ms")
+
+    regressions = find_regressions(results, baselines, arguments.threshold)
+    for (phase, baseline_seconds, seconds) in regressions:
+        print(
+            f"REGRESSION {phase}: {seconds * 1000:.2f}ms vs {baseline_seconds * 1000:.2f}ms"
+        )
+    sys.exit(1 if len(regressions) > 0 else 0)
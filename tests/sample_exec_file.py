@@ -1,5 +1,4 @@
 from mlspeclib import MLSchema, MLObject
-from random import randint, random
 
 results_ml_object = MLObject()
 
@@ -69,12 +68,5 @@ run = experiment.submit(config=run_config, tags=parameters.get("tags", {}))
 """
 
 
-# Execution metrics
-results_ml_object.execution_profile.system_memory_utilization = random()
-results_ml_object.execution_profile.network_traffic_in_bytes = randint(7e9, 9e10)
-results_ml_object.execution_profile.gpu_temperature = randint(70, 130)
-results_ml_object.execution_profile.disk_io_utilization = random()
-results_ml_object.execution_profile.gpu_percent_of_time_accessing_memory = random()
-results_ml_object.execution_profile.cpu_utilization = random()
-results_ml_object.execution_profile.gpu_utilization = random()
-results_ml_object.execution_profile.gpu_memory_allocation = random()
+# execution_profile is filled in by the step from what it measured while this ran. Any
+# field set here (e.g. GPU metrics, which it can't measure) is kept.
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+
+def execute(input_object, execution_object, results_ml_object):
+    """ Entry point for the process_data step. results_ml_object is already typed for the
+    step's output. """
+    results_ml_object.data_output_path = str(
+        Path("tests/data/data_output.csv").absolute()
+    )
+    results_ml_object.data_statistics_path = str(
+        Path("tests/data/data_stats.csv").absolute()
+    )
+    results_ml_object.data_schemas_path = str(
+        Path("tests/data/data_schemas.yaml").absolute()
+    )
+    results_ml_object.feature_file_path = str(
+        Path("tests/data/feature_file.yaml").absolute()
+    )
+
+    return results_ml_object
@@ -1,5 +1,5 @@
 from mlspeclib import MLSchema, MLObject
-from random import randint, random, randrange
+from random import randrange
 from pathlib import Path
 import uuid
 
@@ -38,14 +38,3 @@ results_ml_object.model_source.servable_model.path = return_dict["model_source"]
 results_ml_object.serving_container_image.container_image_url = return_dict[
     "serving_container_image"
 ]["container_image_url"]
-
-# Execution metrics
-results_ml_object.execution_profile.system_memory_utilization = random()
-results_ml_object.execution_profile.network_traffic_in_bytes = randint(7e9, 9e10)
-results_ml_object.execution_profile.gpu_temperature = randint(70, 130)
-results_ml_object.execution_profile.disk_io_utilization = random()
-results_ml_object.execution_profile.gpu_percent_of_time_accessing_memory = random()
-results_ml_object.execution_profile.cpu_utilization = random()
-results_ml_object.execution_profile.gpu_utilization = random()
-results_ml_object.execution_profile.gpu_memory_allocation = random()
-
@@ -0,0 +1,193 @@
+import io
+import os
+import sys
+import json
+import base64
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+from mlspeclib import MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import sub_main, StepResult  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from batch_manifest import (  # noqa E402
+    load_manifest,
+    get_job_environ,
+    get_results_path,
+    run_batch,
+    ResultStream,
+)
+from utils.utils import KnownException  # noqa E402
+from tests.benchmarks.phases import build_workflow_object  # noqa E402
+
+
+class test_batch_manifest(unittest.TestCase):
+    """Batch manifest test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.directory_path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_yaml_and_ndjson_manifests(self):
+        yaml_path = self.directory_path / "manifest.yaml"
+        yaml_path.write_text(
+            YAML.safe_dump({"jobs": [{"id": "a", "STEP_NAME": "process_data"}]})
+        )
+        self.assertEqual(
+            load_manifest(yaml_path), [{"id": "a", "STEP_NAME": "process_data"}]
+        )
+
+        ndjson_path = self.directory_path / "manifest.ndjson"
+        ndjson_path.write_text('{"STEP_NAME": "train"}\n\n{"STEP_NAME": "package"}\n')
+        self.assertEqual(
+            [job["STEP_NAME"] for job in load_manifest(ndjson_path)],
+            ["train", "package"],
+        )
+
+        ndjson_path.write_text('{"STEP_NAME": "train"}\nnot json\n')
+        with self.assertRaises(KnownException) as context:
+            load_manifest(ndjson_path)
+        self.assertTrue("Line 2" in str(context.exception))
+
+        yaml_path.write_text("just a string")
+        with self.assertRaises(KnownException):
+            load_manifest(yaml_path)
+
+    def test_get_job_environ(self):
+        job_environ = get_job_environ(
+            {"INPUT_STEP_NAME": "process_data", "GITHUB_RUN_ID": "1"},
+            {
+                "id": "a",
+                "STEP_NAME": "train",
+                "GITHUB_RUN_ID": "2",
+                "INPUT_PARAMETERS_RAW": {"schema_type": "data_result"},
+            },
+        )
+        self.assertEqual(job_environ["INPUT_STEP_NAME"], "train")
+        self.assertEqual(job_environ["GITHUB_RUN_ID"], "2")
+        self.assertEqual(
+            YAML.safe_load(job_environ["INPUT_INPUT_PARAMETERS_RAW"]),
+            {"schema_type": "data_result"},
+        )
+        self.assertTrue("INPUT_id" not in job_environ)
+        self.assertEqual(
+            get_results_path(self.directory_path / "runs.yaml"),
+            self.directory_path / "runs.results.ndjson",
+        )
+
+    def test_failed_job_does_not_stop_batch(self):
+        running = []
+        most_running = []
+        lock = threading.Lock()
+
+        def run_job_function(job_environ):
+            with lock:
+                running.append(job_environ["INPUT_STEP_NAME"])
+                most_running.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+            if job_environ["INPUT_STEP_NAME"] == "bad":
+                raise KnownException("bad job")
+            return StepResult(None, "input", "execution", "output", "log")
+
+        jobs = [{"STEP_NAME": "good"}] * 5 + [{"id": "x", "STEP_NAME": "bad"}]
+        results_path = self.directory_path / "results.ndjson"
+        with ResultStream(results_path) as result_stream:
+            records = run_batch(jobs, {}, run_job_function, result_stream, 2)
+
+        self.assertEqual(max(most_running), 2)
+        self.assertEqual(
+            [record["id"] for record in records], ["0", "1", "2", "3", "4", "x"]
+        )
+        self.assertEqual(records[0]["output_node_id"], "output")
+        self.assertEqual(records[5]["status"], "failed")
+        self.assertTrue("bad job" in records[5]["error"])
+
+        streamed = [json.loads(line) for line in results_path.read_text().splitlines()]
+        self.assertEqual(
+            sorted(record["id"] for record in streamed),
+            sorted(r["id"] for r in records),
+        )
+
+    def test_sub_main_runs_manifest(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+        database_path = self.directory_path / "metastore.db"
+        metastore = SQLiteMetastore(database_path)
+        workflow_node_ids = [
+            metastore.create_workflow_node(build_workflow_object()) for _ in range(2)
+        ]
+        metastore.close()
+
+        jobs = [
+            {"id": f"run-{index}", "WORKFLOW_NODE_ID": workflow_node_id}
+            for (index, workflow_node_id) in enumerate(workflow_node_ids)
+        ]
+        jobs.append(
+            {
+                "id": "missing-input",
+                "WORKFLOW_NODE_ID": workflow_node_ids[0],
+                "INPUT_PARAMETERS_FILE_PATH": "does/not/exist.yaml",
+            }
+        )
+        manifest_path = self.directory_path / "manifest.yaml"
+        manifest_path.write_text(YAML.safe_dump(jobs))
+
+        credentials = {"backend": "sqlite", "path": str(database_path)}
+        environ = {
+            "INPUT_BATCH_MANIFEST": str(manifest_path),
+            "INPUT_STEP_NAME": "process_data",
+            "INPUT_METASTORE_CREDENTIALS": str(
+                base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")),
+                "utf-8",
+            ),
+            "GITHUB_RUN_ID": str(uuid.uuid4()),
+            "GITHUB_WORKSPACE": ".",
+            "INPUT_SCHEMAS_DIRECTORY": "tests/schemas_for_test",
+            "INPUT_CACHE_DIRECTORY": self.directory.name,
+            "INPUT_INPUT_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/input/input.yaml",
+            "INPUT_EXECUTION_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/execution/execution.yaml",
+            "INPUT_EXECUTION_FILE": "tests/sample_process_data_execution.py",
+        }
+        with patch.dict(os.environ, environ), patch(
+            "sys.stdout", new_callable=io.StringIO
+        ) as mock_stdout:
+            with self.assertRaises(KnownException) as context:
+                sub_main()
+
+        self.assertTrue("1 of 3 jobs" in str(context.exception))
+        self.assertTrue("name=batch_succeeded::2" in mock_stdout.getvalue())
+
+        records = {
+            record["id"]: record
+            for record in map(
+                json.loads, get_results_path(manifest_path).read_text().splitlines(),
+            )
+        }
+        self.assertEqual(records["missing-input"]["status"], "failed")
+        for job_id in ["run-0", "run-1"]:
+            self.assertEqual(records[job_id]["status"], "succeeded")
+            self.assertTrue(
+                records[job_id]["log_node_id"].startswith("process_data|log|")
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
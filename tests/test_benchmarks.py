@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from tests.benchmarks.phases import (  # noqa E402
+    DEFAULT_THRESHOLD,
+    find_regressions,
+    read_baselines,
+    run_suite,
+)
+
+
+class test_benchmarks(unittest.TestCase):
+    """Phase benchmark regression cases."""
+
+    def test_find_regressions(self):
+        baselines = {"calibration": 1.0, "phases": {"fast": 0.1, "slow": 0.1}}
+        results = {"calibration": 2.0, "phases": {"fast": 0.3, "slow": 0.5, "new": 1}}
+
+        # Baselines are scaled by the calibration ratio, so 'fast' (0.3 vs 0.2) is fine.
+        regressions = find_regressions(results, baselines, threshold=2.0)
+        self.assertEqual([regression[0] for regression in regressions], ["slow"])
+
+    def test_find_regressions_ignores_small_differences(self):
+        baselines = {"calibration": 1.0, "phases": {"tiny": 0.0001}}
+        results = {"calibration": 1.0, "phases": {"tiny": 0.001}}
+        self.assertEqual(find_regressions(results, baselines), [])
+
+    # Timings depend on the machine and its load, so this only runs when asked for.
+    @unittest.skipUnless(
+        os.environ.get("RUN_BENCHMARKS", "") != "", "RUN_BENCHMARKS is not set"
+    )
+    def test_phases_within_baseline(self):
+        threshold = float(os.environ.get("BENCHMARK_THRESHOLD", DEFAULT_THRESHOLD))
+        regressions = find_regressions(run_suite(), read_baselines(), threshold)
+
+        self.assertEqual(
+            regressions,
+            [],
+            "Phases slower than baseline (phase, baseline seconds, seconds): "
+            f"{regressions}",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
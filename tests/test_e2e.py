@@ -17,7 +17,6 @@ from unittest.mock import Mock
 from box import Box
 import base64
 from marshmallow.class_registry import RegistryError
-from random import random, randint, randrange
 import datetime
 import uuid
 
@@ -45,6 +44,7 @@ from utils.utils import (  # noqa E402
 )
 
 from step_execution import StepExecution  # noqa E402
+from execution_profiler import ExecutionProfiler  # noqa E402
 
 
 class test_e2e(unittest.TestCase):
@@ -98,28 +98,18 @@ class test_e2e(unittest.TestCase):
         result_ml_object_schema_type = expected_results_schema_type
         result_ml_object_schema_version = expected_results_schema_version
 
-        exec(
-            (Path("tests") / "sample_process_data_execution.py").read_text(),
-            globals(),
-            locals(),
-        )
+        with ExecutionProfiler() as execution_profiler:
+            exec(
+                (Path("tests") / "sample_process_data_execution.py").read_text(),
+                globals(),
+                locals(),
+            )
 
         results_ml_object.run_date = datetime.datetime.now()
         results_ml_object.step_id = str(uuid.uuid4())
         results_ml_object.run_id = str(uuid.uuid4())
 
-        results_ml_object.execution_profile.system_memory_utilization = random()
-        results_ml_object.execution_profile.network_traffic_in_bytes = randint(
-            7e9, 9e10
-        )
-        results_ml_object.execution_profile.gpu_temperature = randint(70, 130)
-        results_ml_object.execution_profile.disk_io_utilization = random()
-        results_ml_object.execution_profile.gpu_percent_of_time_accessing_memory = (
-            random()
-        )
-        results_ml_object.execution_profile.cpu_utilization = random()
-        results_ml_object.execution_profile.gpu_utilization = random()
-        results_ml_object.execution_profile.gpu_memory_allocation = random()
+        execution_profiler.fill_execution_profile(results_ml_object)
 
         self.assertTrue(
             verify_result_contract(
@@ -162,28 +152,18 @@ class test_e2e(unittest.TestCase):
         result_ml_object_schema_type = expected_results_schema_type
         result_ml_object_schema_version = expected_results_schema_version
 
-        exec(
-            (Path("tests") / "sample_train_execution.py").read_text(),
-            globals(),
-            locals(),
-        )
+        with ExecutionProfiler() as execution_profiler:
+            exec(
+                (Path("tests") / "sample_train_execution.py").read_text(),
+                globals(),
+                locals(),
+            )
 
         results_ml_object.run_date = datetime.datetime.now()
         results_ml_object.step_id = uuid.uuid4()
         results_ml_object.run_id = uuid.uuid4()
 
-        results_ml_object.execution_profile.system_memory_utilization = random()
-        results_ml_object.execution_profile.network_traffic_in_bytes = randint(
-            7e9, 9e10
-        )
-        results_ml_object.execution_profile.gpu_temperature = randint(70, 130)
-        results_ml_object.execution_profile.disk_io_utilization = random()
-        results_ml_object.execution_profile.gpu_percent_of_time_accessing_memory = (
-            random()
-        )
-        results_ml_object.execution_profile.cpu_utilization = random()
-        results_ml_object.execution_profile.gpu_utilization = random()
-        results_ml_object.execution_profile.gpu_memory_allocation = random()
+        execution_profiler.fill_execution_profile(results_ml_object)
 
         self.assertTrue(
             verify_result_contract(
@@ -226,28 +206,18 @@ class test_e2e(unittest.TestCase):
         result_ml_object_schema_type = expected_results_schema_type
         result_ml_object_schema_version = expected_results_schema_version
 
-        exec(
-            (Path("tests") / "sample_package_execution.py").read_text(),
-            globals(),
-            locals(),
-        )
+        with ExecutionProfiler() as execution_profiler:
+            exec(
+                (Path("tests") / "sample_package_execution.py").read_text(),
+                globals(),
+                locals(),
+            )
 
         results_ml_object.run_date = datetime.datetime.now()
         results_ml_object.step_id = uuid.uuid4()
         results_ml_object.run_id = uuid.uuid4()
 
-        results_ml_object.execution_profile.system_memory_utilization = random()
-        results_ml_object.execution_profile.network_traffic_in_bytes = randint(
-            7e9, 9e10
-        )
-        results_ml_object.execution_profile.gpu_temperature = randint(70, 130)
-        results_ml_object.execution_profile.disk_io_utilization = random()
-        results_ml_object.execution_profile.gpu_percent_of_time_accessing_memory = (
-            random()
-        )
-        results_ml_object.execution_profile.cpu_utilization = random()
-        results_ml_object.execution_profile.gpu_utilization = random()
-        results_ml_object.execution_profile.gpu_memory_allocation = random()
+        execution_profiler.fill_execution_profile(results_ml_object)
 
         self.assertTrue(
             verify_result_contract(
@@ -0,0 +1,256 @@
+import io
+import os
+import sys
+import time
+import base64
+import tempfile
+import unittest
+import uuid
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+from mlspeclib import MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import main  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from execution_budget import (  # noqa E402
+    ExecutionBudget,
+    ExecutionBudgetExceeded,
+    ExecutionFailed,
+    read_rss_bytes,
+)
+from utils.utils import KnownException  # noqa E402
+from tests.benchmarks.phases import (  # noqa E402
+    build_workflow_object,
+    load_step_contract,
+)
+
+
+def sleep_forever():
+    while True:
+        time.sleep(0.1)
+
+
+def use_memory(size_bytes: int):
+    memory = b"x" * size_bytes  # noqa
+    sleep_forever()
+
+
+def fail():
+    raise KnownException("failed in the child")
+
+
+class TwoArgumentError(Exception):
+    # Pickles, but can't be unpickled: its args don't match __init__.
+    def __init__(self, first, second):
+        super().__init__(f"{first} {second}")
+
+
+def fail_with_two_argument_error():
+    raise TwoArgumentError("failed", "twice")
+
+
+# Held by another thread of the parent while the child runs.
+held_lock = threading.Lock()
+
+
+def acquire_held_lock():
+    return (held_lock.acquire(timeout=5), os.environ.get("BUDGET_TEST_VARIABLE"))
+
+
+def read_variable():
+    return os.environ.get("BUDGET_TEST_VARIABLE")
+
+
+class test_execution_budget(unittest.TestCase):
+    """Execution budget test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+    def test_results_and_output_come_back(self):
+        execution_budget = ExecutionBudget(isolated=True)
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            results_ml_object = main.execute_step(
+                str(Path("tests") / "sample_module_execution.py"),
+                build_workflow_object(),
+                load_step_contract("input"),
+                load_step_contract("execution"),
+                "process_data",
+                str(uuid.uuid4()),
+                execution_budget,
+            )
+
+        self.assertEqual(results_ml_object.schema_type, "data_result")
+        self.assertTrue(results_ml_object.data_output_path.endswith("data_output.csv"))
+        # Filled in by the step's profiler, in the parent.
+        self.assertTrue(0 <= results_ml_object.execution_profile.cpu_utilization <= 1)
+        # Printed in the child, by run_execution.
+        self.assertTrue(
+            "Executing '$tests/sample_module_execution.py'" in mock_stdout.getvalue()
+        )
+        self.assertEqual(execution_budget.resource_usage["exit_code"], 0)
+        self.assertTrue(execution_budget.resource_usage["peak_rss_bytes"] >= 0)
+
+    def test_timeout(self):
+        execution_budget = ExecutionBudget(timeout_seconds=0.3)
+        start_time = time.monotonic()
+        with self.assertRaises(ExecutionBudgetExceeded) as context:
+            execution_budget.run(sleep_forever)
+
+        self.assertTrue(time.monotonic() - start_time < 5)
+        self.assertTrue("INPUT_EXECUTION_TIMEOUT" in str(context.exception))
+        self.assertEqual(context.exception.resource_usage["stopped_for"], "timeout")
+        self.assertNotEqual(context.exception.resource_usage["exit_code"], 0)
+
+    @unittest.skipIf(not Path("/proc/self/status").exists(), "needs /proc")
+    def test_memory_limit(self):
+        memory_limit = read_rss_bytes(os.getpid()) + 100 * 1024 * 1024
+        execution_budget = ExecutionBudget(
+            timeout_seconds=30, memory_limit_bytes=memory_limit
+        )
+        with self.assertRaises(ExecutionBudgetExceeded) as context:
+            execution_budget.run(use_memory, 300 * 1024 * 1024)
+
+        self.assertEqual(context.exception.resource_usage["stopped_for"], "memory")
+        self.assertTrue(
+            context.exception.resource_usage["peak_rss_bytes"] > memory_limit
+        )
+
+    def test_child_errors_and_exits(self):
+        with self.assertRaises(KnownException) as context:
+            ExecutionBudget(isolated=True).run(fail)
+        self.assertTrue("failed in the child" in str(context.exception))
+
+        with self.assertRaises(KnownException) as context:
+            ExecutionBudget(isolated=True).run(os._exit, 3)
+        self.assertTrue("exited with code 3" in str(context.exception))
+
+    def test_unreadable_error_is_a_failed_execution(self):
+        execution_budget = ExecutionBudget(isolated=True)
+        with self.assertRaises(ExecutionFailed) as context:
+            execution_budget.run(fail_with_two_argument_error)
+
+        self.assertTrue("could not be read" in str(context.exception))
+        self.assertTrue(
+            context.exception.resource_usage is execution_budget.resource_usage
+        )
+        self.assertEqual(execution_budget.resource_usage["exit_code"], 0)
+        self.assertTrue(execution_budget.resource_usage["wall_seconds"] > 0)
+
+    def test_child_does_not_inherit_threads_locks(self):
+        released = threading.Event()
+        holder = threading.Thread(
+            target=lambda: held_lock.acquire() and released.wait(30)
+        )
+        holder.start()
+        try:
+            with patch.dict(os.environ, {"BUDGET_TEST_VARIABLE": "set"}):
+                self.assertEqual(
+                    ExecutionBudget(timeout_seconds=30).run(acquire_held_lock),
+                    (True, "set"),
+                )
+        finally:
+            released.set()
+            holder.join()
+            held_lock.release()
+
+    def test_child_gets_the_steps_environ(self):
+        # Steps of a DAG or batch each have their own environ, which isn't os.environ.
+        step_environ = {**os.environ, "BUDGET_TEST_VARIABLE": "step"}
+        with patch.dict(os.environ, {"BUDGET_TEST_VARIABLE": "process"}):
+            self.assertEqual(
+                ExecutionBudget(isolated=True).run(read_variable, environ=step_environ),
+                "step",
+            )
+            self.assertEqual(
+                ExecutionBudget(isolated=True).run(read_variable), "process"
+            )
+
+        execution_budget = ExecutionBudget(isolated=True)
+        with patch.object(execution_budget, "run", side_effect=KnownException("stop")):
+            with self.assertRaises(KnownException):
+                main.execute_step(
+                    "execution.py",
+                    build_workflow_object(),
+                    None,
+                    None,
+                    "process_data",
+                    str(uuid.uuid4()),
+                    execution_budget,
+                    environ=step_environ,
+                )
+            self.assertTrue(
+                execution_budget.run.call_args[1]["environ"] is step_environ
+            )
+
+    def test_log_node_recorded_when_stopped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database_path = Path(directory) / "metastore.db"
+            metastore = SQLiteMetastore(database_path)
+            workflow_node_id = metastore.create_workflow_node(build_workflow_object())
+            metastore.close()
+
+            execution_file = Path(directory) / "execution.py"
+            execution_file.write_text(
+                "import time\nprint('started')\nwhile True:\n    time.sleep(0.1)\n"
+            )
+
+            credentials = {"backend": "sqlite", "path": str(database_path)}
+            environ = {
+                "INPUT_WORKFLOW_NODE_ID": workflow_node_id,
+                "INPUT_STEP_NAME": "process_data",
+                "INPUT_METASTORE_CREDENTIALS": str(
+                    base64.urlsafe_b64encode(
+                        YAML.safe_dump(credentials).encode("utf-8")
+                    ),
+                    "utf-8",
+                ),
+                "GITHUB_RUN_ID": str(uuid.uuid4()),
+                "GITHUB_WORKSPACE": ".",
+                "INPUT_SCHEMAS_DIRECTORY": "tests/schemas_for_test",
+                "INPUT_CACHE_DIRECTORY": directory,
+                "INPUT_INPUT_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/input/input.yaml",
+                "INPUT_EXECUTION_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/execution/execution.yaml",
+                "INPUT_EXECUTION_FILE": str(execution_file),
+                "INPUT_EXECUTION_TIMEOUT": "0.5",
+            }
+            with patch.dict(os.environ, environ), patch(
+                "sys.stdout", new_callable=io.StringIO
+            ):
+                with self.assertRaises(ExecutionBudgetExceeded):
+                    main.sub_main()
+
+            metastore = SQLiteMetastore(database_path)
+            node_types = [
+                node_type
+                for (node_type,) in metastore._connection.execute(
+                    "SELECT node_type FROM nodes ORDER BY rowid"
+                ).fetchall()
+            ]
+            (log_node_id,) = metastore._connection.execute(
+                "SELECT id FROM nodes WHERE node_type = 'log'"
+            ).fetchone()
+            (log_object, _) = metastore.get_object(log_node_id)
+            metastore.close()
+
+        self.assertEqual(node_types, ["workflow", "input", "execution", "log"])
+        execution_budget = log_object.log_property_bag["execution_budget"]
+        self.assertEqual(execution_budget["timeout_seconds"], 0.5)
+        self.assertEqual(execution_budget["resource_usage"]["stopped_for"], "timeout")
+        self.assertTrue(
+            log_object.log_property_bag["execution_profile"]["wall_seconds"] > 0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import main  # noqa E402
+import execution_loader  # noqa E402
+from execution_loader import (  # noqa E402
+    compile_execution_file,
+    defines_entry_point,
+    run_execution_file,
+)
+from schema_registry import load_schemas_into_registry  # noqa E402
+from tests.benchmarks.phases import (  # noqa E402
+    build_workflow_object,
+    load_step_contract,
+)
+
+
+class test_execution_loader(unittest.TestCase):
+    """Execution file loader test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": self.directory.name}
+        )
+        self.environ.start()
+        execution_loader._code_cache.clear()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.directory.cleanup()
+        execution_loader._code_cache.clear()
+
+    def write_execution_file(self, source: str) -> Path:
+        execution_file_path = Path(self.directory.name) / f"{uuid.uuid4().hex}.py"
+        execution_file_path.write_text(source)
+        return execution_file_path
+
+    def test_entry_point_module(self):
+        main_globals = set(vars(main).keys())
+        results_ml_object = main.execute_step(
+            str(Path("tests") / "sample_module_execution.py"),
+            build_workflow_object(),
+            load_step_contract("input"),
+            load_step_contract("execution"),
+            "process_data",
+            str(uuid.uuid4()),
+        )
+
+        self.assertEqual(results_ml_object.schema_type, "data_result")
+        self.assertTrue(results_ml_object.data_output_path.endswith("data_output.csv"))
+        self.assertEqual(set(vars(main).keys()), main_globals)
+
+    def test_top_level_file_can_replace_results_object(self):
+        # exec() into a function's locals() could not see this reassignment.
+        execution_file_path = self.write_execution_file(
+            "from mlspeclib import MLObject\n"
+            "results_ml_object = MLObject()\n"
+            "results_ml_object.set_type(\n"
+            "    schema_type=result_ml_object_schema_type,\n"
+            "    schema_version=result_ml_object_schema_version,\n"
+            ")\n"
+            "leaked_name = True\n"
+        )
+        (code, _) = compile_execution_file(execution_file_path)
+        self.assertFalse(defines_entry_point(code))
+
+        results_ml_object = run_execution_file(
+            execution_file_path, None, None, MLObject(), "data_result", "9999.0.1"
+        )
+        self.assertEqual(results_ml_object.schema_type, "data_result")
+        self.assertFalse(hasattr(main, "leaked_name"))
+
+    def test_bytecode_cached_by_content(self):
+        execution_file_path = self.write_execution_file(
+            "def execute(input_object, execution_object, results_ml_object):\n"
+            "    return 1\n"
+        )
+        (code, content_hash) = compile_execution_file(execution_file_path)
+        self.assertTrue(defines_entry_point(code))
+
+        # Compiled code is reused from memory, and nothing is written to disk.
+        with patch("builtins.compile", side_effect=AssertionError("compiled again")):
+            (cached_code, cached_hash) = compile_execution_file(execution_file_path)
+        self.assertTrue(cached_code is code)
+        self.assertEqual(cached_hash, content_hash)
+        self.assertEqual(
+            [path.name for path in Path(self.directory.name).iterdir()],
+            [execution_file_path.name],
+        )
+
+        # New content is a new entry.
+        execution_file_path.write_text(
+            "def execute(input_object, execution_object, results_ml_object):\n"
+            "    return 2\n"
+        )
+        self.assertNotEqual(
+            compile_execution_file(execution_file_path)[1], content_hash
+        )
+        self.assertEqual(
+            run_execution_file(
+                execution_file_path, None, None, MLObject(), "data_result", "9999.0.1"
+            ),
+            2,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
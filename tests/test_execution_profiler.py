@@ -0,0 +1,145 @@
+import sys
+import time
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import execution_profiler  # noqa E402
+from execution_profiler import ExecutionProfiler  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+
+
+def write_proc_files(
+    proc_path: Path, cpu_busy, cpu_idle, available_kb, io_ticks, rx, tx
+):
+    """ Writes the four /proc files the profiler reads, with the given counters. """
+    (proc_path / "net").mkdir(parents=True, exist_ok=True)
+    (proc_path / "stat").write_text(
+        f"cpu  {cpu_busy} 0 0 {cpu_idle} 0 0 0 0 0 0\ncpu0 1 0 0 1 0 0 0 0 0 0\n"
+    )
+    (proc_path / "meminfo").write_text(
+        f"MemTotal:        1000 kB\nMemFree:          100 kB\nMemAvailable:     {available_kb} kB\n"
+    )
+    (proc_path / "diskstats").write_text(
+        f"   8       0 sda 1 0 0 0 0 0 0 0 0 {io_ticks} 0\n"
+        f"   7       0 loop0 1 0 0 0 0 0 0 0 0 999999 0\n"
+    )
+    (proc_path / "net" / "dev").write_text(
+        "Inter-|   Receive                            |  Transmit\n"
+        " face |bytes    packets errs drop fifo frame compressed multicast|bytes\n"
+        f"    lo: 5000 0 0 0 0 0 0 0 5000 0 0 0 0 0 0 0\n"
+        f"  eth0: {rx} 0 0 0 0 0 0 0 {tx} 0 0 0 0 0 0 0\n"
+    )
+
+
+class test_execution_profiler(unittest.TestCase):
+    """Execution profiler test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.proc_path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_averages_and_peaks(self):
+        write_proc_files(self.proc_path, 100, 900, 800, 0, 1000, 1000)
+        with patch.object(execution_profiler, "PROC_PATH", self.proc_path), patch(
+            "time.monotonic", side_effect=[10.0, 12.0, 14.0]
+        ):
+            profiler = ExecutionProfiler(interval=0)
+            profiler.start()
+            # First interval: fully busy CPU, half the memory used, disk busy for 1 of 2s.
+            write_proc_files(self.proc_path, 300, 900, 500, 1000, 3000, 2000)
+            profiler.sample()
+            # Second interval: idle CPU, network only.
+            write_proc_files(self.proc_path, 300, 1100, 800, 1000, 11000, 2000)
+            profiler.sample()
+
+        summary = profiler.summary()
+        self.assertTrue(summary["available"])
+        self.assertEqual(summary["sample_count"], 3)
+        self.assertEqual(summary["wall_seconds"], 4.0)
+        self.assertEqual(summary["cpu_utilization"], {"average": 0.5, "peak": 1.0})
+        self.assertEqual(
+            summary["system_memory_utilization"], {"average": 0.3, "peak": 0.5}
+        )
+        self.assertEqual(summary["disk_io_utilization"], {"average": 0.25, "peak": 0.5})
+        self.assertEqual(
+            summary["network_traffic_in_bytes"],
+            {"total": 11000, "peak_bytes_per_second": 4000.0},
+        )
+
+    def test_fill_keeps_what_the_execution_set(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+        results_ml_object = MLObject()
+        results_ml_object.set_type(schema_type="data_result", schema_version="9999.0.1")
+        results_ml_object.execution_profile.gpu_temperature = 75.0
+
+        write_proc_files(self.proc_path, 100, 900, 800, 0, 1000, 1000)
+        with patch.object(execution_profiler, "PROC_PATH", self.proc_path):
+            with ExecutionProfiler(interval=0.01) as profiler:
+                write_proc_files(self.proc_path, 200, 1000, 800, 0, 1500, 1000)
+                time.sleep(0.05)
+            profiler.fill_execution_profile(results_ml_object)
+
+        execution_profile = results_ml_object.execution_profile
+        self.assertTrue(profiler.sample_count >= 2)
+        self.assertEqual(execution_profile.cpu_utilization, 0.5)
+        self.assertEqual(execution_profile.system_memory_utilization, 0.2)
+        self.assertEqual(execution_profile.disk_io_utilization, 0.0)
+        self.assertEqual(execution_profile.network_traffic_in_bytes, 500)
+        self.assertEqual(execution_profile.gpu_temperature, 75.0)
+        self.assertEqual(execution_profile.gpu_utilization, 0.0)
+
+    def test_without_proc(self):
+        with patch.object(execution_profiler, "PROC_PATH", self.proc_path / "missing"):
+            with ExecutionProfiler(interval=0) as profiler:
+                pass
+
+        summary = profiler.summary()
+        self.assertFalse(summary["available"])
+        self.assertEqual(summary["cpu_utilization"]["average"], 0.0)
+        self.assertEqual(summary["network_traffic_in_bytes"]["total"], 0)
+
+    def test_without_mem_available(self):
+        write_proc_files(self.proc_path, 100, 900, 800, 0, 1000, 1000)
+        (self.proc_path / "meminfo").write_text(
+            "MemTotal:        1000 kB\nMemFree:          100 kB\n"
+            "Buffers:           50 kB\nCached:           250 kB\n"
+        )
+        with patch.object(execution_profiler, "PROC_PATH", self.proc_path):
+            with ExecutionProfiler(interval=0.01) as profiler:
+                time.sleep(0.05)
+            summary = profiler.summary()
+            self.assertTrue(summary["available"])
+            self.assertEqual(
+                summary["system_memory_utilization"], {"average": 0.6, "peak": 0.6}
+            )
+
+            # Readings of a meminfo without the fields needed are skipped, and the sampler
+            # thread keeps going.
+            (self.proc_path / "meminfo").write_text("MemFree:          100 kB\n")
+            with ExecutionProfiler(interval=0.01) as profiler:
+                time.sleep(0.05)
+                self.assertEqual(profiler.sample_count, 1)
+                (self.proc_path / "meminfo").write_text(
+                    "MemTotal:        1000 kB\nMemAvailable:     500 kB\n"
+                )
+                time.sleep(0.05)
+                self.assertTrue(profiler._thread.is_alive())
+        self.assertFalse(profiler.summary()["available"])
+        self.assertTrue(profiler.sample_count >= 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import subprocess
+import unittest
+from pathlib import Path
+
+# Cold-start budget for 'import main', in milliseconds. Almost all of it is mlspeclib,
+# marshmallow, yaml and box, which every step needs.
+DEFAULT_IMPORT_TIME_BUDGET_MS = 1000
+
+# Modules that are only needed on some paths, and so must not be imported by 'import main'.
+DEFERRED_MODULES = [
+    "git",
+    "step_execution",
+    "sqlite_metastore",
+    "step_scheduler",
+    "batch_manifest",
+]
+
+
+def run_python(code: str, *options) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [
+            sys.executable,
+            *options,
+            "-c",
+            f"import sys; sys.path.insert(0, 'src'); {code}",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+def parse_import_time(importtime_output: str, module_name: str) -> float:
+    """ Returns the cumulative import time of module_name in milliseconds from the output
+    of python -X importtime. """
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        (_, cumulative, name) = line[len("import time:") :].split("|")
+        if name.strip() == module_name and cumulative.strip().isdigit():
+            return int(cumulative) / 1000
+    raise ValueError(f"'{module_name}' not found in import time output.")
+
+
+class test_import_time(unittest.TestCase):
+    """Import time test cases."""
+
+    @unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs python 3.7")
+    def test_import_within_budget(self):
+        budget_ms = float(
+            os.environ.get("IMPORT_TIME_BUDGET_MS", DEFAULT_IMPORT_TIME_BUDGET_MS)
+        )
+        # Best of three cold starts, so one slow process start doesn't fail the budget.
+        import_times = [
+            parse_import_time(
+                run_python("import main", "-X", "importtime").stderr, "main"
+            )
+            for _ in range(3)
+        ]
+        self.assertTrue(
+            min(import_times) <= budget_ms,
+            f"'import main' took {min(import_times):.0f}ms, over the {budget_ms:.0f}ms budget.",
+        )
+
+    def test_heavy_modules_deferred(self):
+        result = run_python(
+            f"import main; print([m for m in {DEFERRED_MODULES} if m in sys.modules])"
+        )
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
+    def test_parse_import_time(self):
+        output = "\n".join(
+            [
+                "import time: self [us] | cumulative | imported package",
+                "import time:       100 |        150 |   yaml",
+                "import time:      2000 |     250000 | main",
+            ]
+        )
+        self.assertEqual(parse_import_time(output, "main"), 250)
+        self.assertEqual(parse_import_time(output, "yaml"), 0.15)
+        with self.assertRaises(ValueError):
+            parse_import_time(output, "git")
+
+
+if __name__ == "__main__":
+    unittest.main()
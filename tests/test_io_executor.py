@@ -0,0 +1,59 @@
+import sys
+import time
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from io_executor import get_io_executor, SerialExecutor  # noqa E402
+
+
+def slow_call(value, delay=0.2):
+    time.sleep(delay)
+    return value
+
+
+def failing_call():
+    raise KeyError("url")
+
+
+class test_io_executor(unittest.TestCase):
+    """I/O executor test cases."""
+
+    def test_serial_runs_on_submit(self):
+        calls = []
+        with get_io_executor(False) as executor:
+            self.assertTrue(isinstance(executor, SerialExecutor))
+            future = executor.submit(calls.append, "called")
+            self.assertEqual(calls, ["called"])
+            self.assertTrue(future.done())
+
+    def test_serial_raises_from_submit(self):
+        with get_io_executor(False) as executor:
+            with self.assertRaises(KeyError):
+                executor.submit(failing_call)
+
+    def test_concurrent_overlaps_calls(self):
+        start = time.perf_counter()
+        with get_io_executor(True) as executor:
+            self.assertTrue(isinstance(executor, ThreadPoolExecutor))
+            futures = [executor.submit(slow_call, i) for i in range(3)]
+            self.assertEqual([future.result() for future in futures], [0, 1, 2])
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_concurrent_raises_from_result(self):
+        with get_io_executor(True) as executor:
+            future = executor.submit(failing_call)
+            with self.assertRaises(KeyError) as context:
+                future.result()
+
+        self.assertTrue("url" in str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
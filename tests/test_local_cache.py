@@ -0,0 +1,82 @@
+import os
+import stat
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import local_cache  # noqa E402
+from local_cache import get_cache_root, get_cache_directory  # noqa E402
+from object_cache import ObjectCache  # noqa E402
+from schema_registry import load_schema_index  # noqa E402
+
+
+class test_local_cache(unittest.TestCase):
+    """Cache root permission test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_root = Path(self.directory) / "cache"
+        self.environment = patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": str(self.cache_root)}
+        )
+        self.environment.start()
+        local_cache._refused_roots.clear()
+
+    def tearDown(self):
+        self.environment.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_default_root_is_private_to_the_user(self):
+        with patch.dict(os.environ, {"INPUT_CACHE_DIRECTORY": ""}), patch.object(
+            tempfile, "gettempdir", return_value=self.directory
+        ):
+            cache_root = get_cache_root()
+            cache_directory = get_cache_directory("objects")
+
+        self.assertEqual(
+            cache_root, Path(self.directory) / f"mlspeclib-action-cache-{os.getuid()}",
+        )
+        self.assertEqual(stat.S_IMODE(cache_root.stat().st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(cache_directory.stat().st_mode), 0o700)
+
+    def test_group_or_world_writable_root_is_refused(self):
+        self.cache_root.mkdir()
+        for mode in [0o770, 0o707, 0o1777]:
+            self.cache_root.chmod(mode)
+            self.assertEqual(get_cache_root(), None)
+            self.assertEqual(get_cache_directory("objects"), None)
+
+        self.cache_root.chmod(0o755)
+        self.assertEqual(get_cache_root(), self.cache_root)
+
+    def test_root_of_another_user_is_refused(self):
+        self.cache_root.mkdir(mode=0o700)
+        with patch.object(os, "getuid", return_value=os.getuid() + 1):
+            self.assertEqual(get_cache_root(), None)
+
+    def test_symlinked_root_is_refused(self):
+        target = Path(self.directory) / "target"
+        target.mkdir(mode=0o700)
+        self.cache_root.symlink_to(target)
+        self.assertEqual(get_cache_root(), None)
+
+    def test_caches_are_off_without_a_safe_root(self):
+        self.cache_root.mkdir(mode=0o777)
+        self.cache_root.chmod(0o777)
+
+        self.assertFalse(ObjectCache().enabled)
+        (schema_index, _) = load_schema_index(Path("tests") / "schemas_for_test")
+        self.assertTrue(len(schema_index.entries) > 0)
+        self.assertEqual(list(self.cache_root.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import os
 import sys
 import io
+import threading
 import unittest
 import logging
 import pathlib
@@ -32,6 +33,7 @@ from main import (
     load_contract_object,
     execute_step,
     load_parameters,
+    sub_main,
 )
 
 from utils.utils import (  # noqa E402
@@ -269,6 +271,37 @@ class test_main(unittest.TestCase):
 
             self.assertTrue("schema and version" in str(context.exception))
 
+    def test_load_contract_object_from_dict_skips_yaml(self):
+        with patch.object(
+            mlspeclib.mlobject.MLObject, "create_object_from_string"
+        ) as mock_mlobject:
+            mock_mlobject.return_value = (None, "error")
+            parameters = {"FAKEFIELD": "FAKEVALUE"}
+            with self.assertRaises(KnownException):
+                load_contract_object(parameters, None, None, "input")
+
+            mock_mlobject.assert_called_once_with(parameters)
+
+    def test_load_contract_object_from_mlobject_validates_in_place(self):
+        contract_object = MLObject()
+        with patch.object(
+            mlspeclib.mlobject.MLObject, "create_object_from_string"
+        ) as mock_mlobject, patch.object(
+            MLObject, "validate", return_value={"FAKEFIELD": ["error"]}
+        ) as mock_validate:
+            with self.assertRaises(KnownException) as context:
+                load_contract_object(contract_object, None, None, "output")
+
+            mock_mlobject.assert_not_called()
+            mock_validate.assert_called_once()
+            self.assertTrue("FAKEFIELD" in str(context.exception))
+
+    def test_load_contract_object_bad_parameters_type(self):
+        with self.assertRaises(KnownException) as context:
+            load_contract_object(1234, None, None, "input")
+
+        self.assertTrue("neither a string" in str(context.exception))
+
     @patch.object(StepExecution, "__init__", return_value=None)
     @patch.object(StepExecution, "execute", return_value=None)
     def test_step_exection_return_no_result_object(self, *mock_step_execution):
@@ -325,6 +358,42 @@ class test_main(unittest.TestCase):
 
         self.assertTrue(return_dict["FAKEFIELD"] == expected_dict["FAKEFIELD"])
 
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_startup_phases_run_in_parallel(self, mock_stdout):
+        mock_variables = """\
+            INPUT_WORKFLOW_NODE_ID: 'xxxxx'
+            INPUT_STEP_NAME: 'process_data'
+            INPUT_SCHEMAS_DIRECTORY: 'tests/schemas_for_test'
+            GITHUB_RUN_ID: 'github_run_id'
+            GITHUB_WORKSPACE: 'github_workspace'
+            INPUT_METASTORE_CREDENTIALS: 'a: b'
+            INPUT_CONCURRENT_IO: 'true'"""
+
+        # Each phase waits for the other to start, so this only passes if they overlap.
+        both_phases_started = threading.Barrier(2, timeout=10)
+
+        def load_schemas(parameters):
+            both_phases_started.wait()
+            return (MagicMock(), False, True)
+
+        def connect_to_metastore(credentials):
+            both_phases_started.wait()
+            return MagicMock()
+
+        mock_dict = YAML.safe_load(mock_variables)
+        with patch.dict(os.environ, mock_dict), patch(
+            "main.load_schemas", side_effect=load_schemas
+        ), patch(
+            "main.connect_to_metastore", side_effect=connect_to_metastore
+        ), patch(
+            "main.load_workflow_object", side_effect=KnownException("Stop after startup")
+        ):
+            with self.assertRaises(KnownException) as context:
+                sub_main()
+
+        self.assertTrue("Stop after startup" in str(context.exception))
+        self.assertTrue("ok (hit)" in mock_stdout.getvalue())
+
     @unittest.skip("Fail")
     @patch("sys.stdout", new_callable=io.StringIO)
     def test_registry_error_catcher(self, mock_stdout, *mock_patched_obj):
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import uuid
+import pickle
+import datetime
+import tempfile
+import unittest
+import multiprocessing
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from mlspeclib.experimental.metastore import Metastore  # noqa E402
+
+from main import load_parameters  # noqa E402
+from object_cache import ObjectCache  # noqa E402
+from utils.utils import KnownException  # noqa E402
+
+
+def put_entries(cache_directory: str, size_limit_bytes: int, worker: int):
+    object_cache = ObjectCache(Path(cache_directory), size_limit_bytes)
+    for index in range(20):
+        object_cache.put("metastore", f"node-{worker}-{index}", {"rows": "x" * 1000})
+        object_cache.get("metastore", f"node-{worker}-{index // 2}")
+
+
+class PlantedPickle:
+    def __reduce__(self):
+        return (os.system, ("true",))
+
+
+class test_object_cache(unittest.TestCase):
+    """Metastore object cache test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_directory = Path(self.directory.name) / "objects"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_least_recently_used_are_evicted(self):
+        object_cache = ObjectCache(self.cache_directory, 1024 * 1024)
+        value = {"rows": "x" * 1000}
+        object_cache.put("metastore", "probe", value)
+        entry_size = object_cache.size()
+        object_cache.remove(object_cache.get_entry_path("metastore", "probe"))
+
+        object_cache = ObjectCache(self.cache_directory, entry_size * 3)
+        for node_id in ["a", "b", "c"]:
+            object_cache.put("metastore", node_id, value)
+            time.sleep(0.01)
+        # 'a' is used again, so 'b' is the least recently used when 'd' is added.
+        self.assertEqual(object_cache.get("metastore", "a"), value)
+        time.sleep(0.01)
+        object_cache.put("metastore", "d", value)
+
+        self.assertEqual(object_cache.get("metastore", "b"), None)
+        for node_id in ["a", "c", "d"]:
+            self.assertEqual(object_cache.get("metastore", node_id), value)
+        self.assertTrue(object_cache.size() <= entry_size * 3)
+
+        # Node IDs are kept apart by metastore, and values too big for the cache aren't kept.
+        self.assertEqual(object_cache.get("other metastore", "a"), None)
+        object_cache.put("metastore", "big", {"rows": "x" * entry_size * 3})
+        self.assertEqual(object_cache.get("metastore", "big"), None)
+
+        # A damaged entry is a miss, and is removed.
+        object_cache.get_entry_path("metastore", "a").write_bytes(b"not an entry")
+        self.assertEqual(object_cache.get("metastore", "a"), None)
+        self.assertFalse(object_cache.get_entry_path("metastore", "a").exists())
+
+    def test_entries_are_plain_data(self):
+        object_cache = ObjectCache(self.cache_directory, 1024 * 1024)
+        value = {
+            "run_id": uuid.uuid4(),
+            "run_date": datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+            "day": datetime.date(2020, 1, 2),
+            "nested": {"rows": [1, 2.5, None, True, "x", b"\xff"]},
+        }
+        object_cache.put("metastore", "node", value)
+        self.assertEqual(object_cache.get("metastore", "node"), value)
+
+        # Values msgpack can't hold aren't cached.
+        object_cache.put("metastore", "object", {"value": object()})
+        self.assertEqual(object_cache.get("metastore", "object"), None)
+
+        # A pickle planted in the cache is never unpickled.
+        entry_path = object_cache.get_entry_path("metastore", "node")
+        entry_path.write_bytes(pickle.dumps(PlantedPickle()))
+        with patch.object(os, "system") as system:
+            self.assertEqual(object_cache.get("metastore", "node"), None)
+        system.assert_not_called()
+
+    def test_shared_between_processes(self):
+        size_limit_bytes = 8 * 1024
+        workers = [
+            multiprocessing.Process(
+                target=put_entries,
+                args=(str(self.cache_directory), size_limit_bytes, worker),
+            )
+            for worker in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        object_cache = ObjectCache(self.cache_directory, size_limit_bytes)
+        self.assertTrue(0 < object_cache.size() <= size_limit_bytes)
+        # Nothing partly written is left behind.
+        self.assertEqual(list(self.cache_directory.glob(".tmp-*")), [])
+
+    def test_load_parameters_hits_skip_the_metastore(self):
+        contract_object = MagicMock()
+        contract_object.dict_without_internal_variables.return_value = {"x": 1}
+        metastore = MagicMock()
+        metastore.get_object.return_value = (contract_object, None)
+        environ = {
+            "INPUT_EXECUTION_PARAMETERS_NODE_ID": "node-1",
+            "INPUT_METASTORE_CREDENTIALS": "credentials",
+        }
+
+        with patch.dict(os.environ, {"INPUT_CACHE_DIRECTORY": self.directory.name}):
+            for _ in range(3):
+                parameters = load_parameters("EXECUTION", metastore, environ)
+                self.assertEqual(parameters, {"x": 1})
+                # Callers change the parameters they are given; the cache keeps its own.
+                parameters["run_id"] = "changed"
+            self.assertEqual(metastore.get_object.call_count, 1)
+
+            # Another metastore, and a cache turned off, both fetch.
+            load_parameters(
+                "EXECUTION", metastore, {**environ, "INPUT_METASTORE_CREDENTIALS": "x"}
+            )
+            load_parameters(
+                "EXECUTION", metastore, {**environ, "INPUT_OBJECT_CACHE_SIZE_MB": "0"}
+            )
+            self.assertEqual(metastore.get_object.call_count, 3)
+
+            # Missing nodes aren't cached.
+            metastore.get_object.return_value = (None, None)
+            for _ in range(2):
+                with self.assertRaises(KnownException):
+                    load_parameters(
+                        "EXECUTION",
+                        metastore,
+                        {**environ, "INPUT_EXECUTION_PARAMETERS_NODE_ID": "missing"},
+                    )
+            self.assertEqual(metastore.get_object.call_count, 5)
+
+            with self.assertRaises(KnownException):
+                ObjectCache.from_environ({"INPUT_OBJECT_CACHE_SIZE_MB": "lots"})
+
+    def test_load_parameters_missing_gremlin_node(self):
+        # mlspeclib's gremlin Metastore, with a graph that has no such node.
+        metastore = Metastore.__new__(Metastore)
+        metastore._gc = MagicMock()
+        metastore._gc.get_node.return_value = []
+        environ = {
+            "INPUT_EXECUTION_PARAMETERS_NODE_ID": "missing",
+            "INPUT_METASTORE_CREDENTIALS": "credentials",
+        }
+
+        with patch.dict(os.environ, {"INPUT_CACHE_DIRECTORY": self.directory.name}):
+            with self.assertRaises(KnownException) as context:
+                load_parameters("EXECUTION", metastore, environ)
+        self.assertTrue("No object found" in str(context.exception))
+        metastore._gc.get_node.assert_called_once_with("missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml as YAML
+import msgpack
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import load_parameters  # noqa E402
+from parameter_loader import (  # noqa E402
+    load_parameters_file,
+    detect_format,
+    YAML_LOADER,
+)
+from step_output import write_base64_msgpack, write_base64_yaml  # noqa E402
+from tracing import reset_tracer  # noqa E402
+from utils.utils import KnownException  # noqa E402
+
+PARAMETERS = {
+    "name": "features",
+    "count": 3,
+    "ratio": 0.25,
+    "enabled": True,
+    "nothing": None,
+    "features": [{"id": index, "name": f"feature {index} ✓"} for index in range(100)],
+}
+
+
+class test_parameter_loader(unittest.TestCase):
+    """Parameter file loading test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_formats(self, suffix_for) -> dict:
+        """ Writes PARAMETERS in every format, returns {format: path}. """
+        blocks = []
+        write_base64_msgpack(PARAMETERS, blocks.append)
+        contents = {
+            "yaml": YAML.safe_dump(PARAMETERS).encode("utf-8"),
+            "json": json.dumps(PARAMETERS).encode("utf-8"),
+            "msgpack": msgpack.packb(PARAMETERS, use_bin_type=True),
+            "base64": "".join(blocks).encode("utf-8"),
+        }
+        paths = {}
+        for (parameters_format, content) in contents.items():
+            paths[parameters_format] = self.path / (
+                parameters_format + suffix_for(parameters_format)
+            )
+            paths[parameters_format].write_bytes(content)
+        return paths
+
+    def test_formats_by_extension_and_content(self):
+        suffixes = {
+            "yaml": ".yml",
+            "json": ".json",
+            "msgpack": ".msgpack",
+            "base64": "",
+        }
+        for suffix_for in [lambda f: suffixes[f], lambda f: ""]:
+            for (parameters_format, path) in self.write_formats(suffix_for).items():
+                head = path.read_bytes()[:64]
+                self.assertEqual(detect_format(path, head), parameters_format)
+                self.assertEqual(load_parameters_file(path), PARAMETERS)
+
+    def test_load_parameters_reads_any_format(self):
+        for path in self.write_formats(lambda f: "").values():
+            self.assertEqual(
+                load_parameters(
+                    "EXECUTION",
+                    None,
+                    {"INPUT_EXECUTION_PARAMETERS_FILE_PATH": str(path)},
+                ),
+                PARAMETERS,
+            )
+
+    def test_base64_yaml(self):
+        blocks = []
+        write_base64_yaml(PARAMETERS, blocks.append)
+        for name in ["output.txt", "output"]:
+            path = self.path / name
+            path.write_text("".join(blocks) + "\n")
+            self.assertEqual(detect_format(path, path.read_bytes()[:64]), "base64")
+            self.assertEqual(load_parameters_file(path), PARAMETERS)
+
+        # YAML that only looks like base64 is still read as YAML.
+        for word in ["hello", "test", "abcd"]:
+            path.write_text(f"{word}\n")
+            self.assertEqual(load_parameters_file(path), word)
+
+    def test_yaml_that_looks_like_json(self):
+        path = self.path / "parameters"
+        path.write_text("{name: flow, values: [1, 2]}\n")
+        self.assertEqual(load_parameters_file(path), {"name": "flow", "values": [1, 2]})
+
+        # With a .json extension it has to be JSON.
+        path = self.path / "parameters.json"
+        path.write_text("{name: flow}\n")
+        with self.assertRaises(KnownException) as context:
+            load_parameters_file(path)
+        self.assertTrue("could not be parsed as json" in str(context.exception))
+
+        path = self.path / "empty.yaml"
+        path.write_text("")
+        self.assertEqual(load_parameters_file(path), None)
+
+    def test_parse_is_traced(self):
+        path = self.write_formats(lambda f: ".json")["json"]
+        tracer = reset_tracer()
+        load_parameters_file(path)
+
+        (span,) = [span for span in tracer.spans if span.name == "parse_parameters"]
+        self.assertEqual(span.args["format"], "json")
+        self.assertEqual(span.args["size_bytes"], path.stat().st_size)
+        self.assertEqual(span.args["path"], str(path))
+
+    @unittest.skipIf(not YAML.__with_libyaml__, "PyYAML was built without libyaml")
+    def test_libyaml_loader(self):
+        self.assertTrue(YAML_LOADER is YAML.CSafeLoader)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+import io
+import os
+import sys
+import time
+import base64
+import tempfile
+import threading
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+from mlspeclib import MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import sub_main  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from raw_log_store import (  # noqa E402
+    ChunkedLogWriter,
+    open_blob_store,
+    register_blob_store,
+    read_log_range,
+    capture_log,
+    delete_expired_logs,
+    BLOB_STORES,
+)
+from utils.utils import KnownException  # noqa E402
+from tests.benchmarks.phases import build_workflow_object  # noqa E402
+
+
+class MemoryBlobStore:
+    """ Counts gets, to check range reads only fetch the chunks they need. """
+
+    blobs = {}
+    gets = []
+
+    def __init__(self, url):
+        self.url = url
+
+    def put(self, key, contents):
+        self.blobs[key] = contents
+
+    def get(self, key):
+        self.gets.append(key)
+        return self.blobs[key]
+
+
+class test_raw_log_store(unittest.TestCase):
+    """Chunked raw log test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store_url = f"file://{self.directory.name}"
+
+    def tearDown(self):
+        self.directory.cleanup()
+        BLOB_STORES.pop("memory", None)
+
+    def test_chunks_and_range_reads(self):
+        log_writer = ChunkedLogWriter(open_blob_store(self.store_url), chunk_size=10)
+        text = "".join(f"line {index}\n" for index in range(100))
+        for index in range(0, len(text), 7):
+            log_writer.write(text[index : index + 7])
+            # Never more than one chunk is held in memory.
+            self.assertTrue(len(log_writer._buffer) < 10)
+        reference = log_writer.close()
+
+        self.assertEqual(log_writer.size, len(text))
+        self.assertEqual(len(log_writer.chunks), (len(text) + 9) // 10)
+        self.assertEqual(read_log_range(reference).decode("utf-8"), text)
+        for (start, length) in [(0, 1), (5, 10), (9, 2), (95, 300), (len(text) - 1, 5)]:
+            self.assertEqual(
+                read_log_range(reference, start, length).decode("utf-8"),
+                text[start : start + length],
+            )
+        self.assertEqual(read_log_range(reference, len(text) + 5, 10), b"")
+
+    def test_range_read_fetches_only_covering_chunks(self):
+        register_blob_store("memory", MemoryBlobStore)
+        log_writer = ChunkedLogWriter(open_blob_store("memory://logs"), chunk_size=100)
+        log_writer.write("x" * 1000)
+        reference = log_writer.close()
+
+        MemoryBlobStore.gets.clear()
+        self.assertEqual(read_log_range(reference, 250, 100), b"x" * 100)
+        self.assertEqual(
+            MemoryBlobStore.gets,
+            [
+                f"{log_writer.log_id}/manifest.json",
+                f"{log_writer.log_id}/00000002.zz",
+                f"{log_writer.log_id}/00000003.zz",
+            ],
+        )
+
+    def test_unknown_store(self):
+        with self.assertRaises(KnownException):
+            open_blob_store("s3://bucket/logs")
+
+    def test_expired_logs_are_deleted(self):
+        blob_store = open_blob_store(self.store_url)
+        log_ids = []
+        for _ in range(2):
+            log_writer = ChunkedLogWriter(blob_store)
+            log_writer.write("text")
+            log_writer.close()
+            log_ids.append(log_writer.log_id)
+        # One log is two days old, and a run that died left one without a manifest.
+        two_days_ago = time.time() - 2 * 24 * 60 * 60
+        os.utime(blob_store.root / log_ids[0] / "manifest.json", (two_days_ago,) * 2)
+        (blob_store.root / "unfinished").mkdir()
+        os.utime(blob_store.root / "unfinished", (two_days_ago,) * 2)
+
+        self.assertEqual(delete_expired_logs(blob_store, 0), 0)
+        self.assertEqual(delete_expired_logs(blob_store, 1), 2)
+        self.assertEqual(
+            sorted(path.name for path in blob_store.root.iterdir()), [log_ids[1]]
+        )
+        self.assertEqual(read_log_range(log_writer.reference), b"text")
+
+        # Stores without delete_older_than keep their own retention.
+        register_blob_store("memory", MemoryBlobStore)
+        self.assertEqual(delete_expired_logs(open_blob_store("memory://logs"), 1), 0)
+
+    def test_capture_keeps_threads_apart(self):
+        blob_store = open_blob_store(self.store_url)
+        references = {}
+
+        def run(name):
+            with capture_log(ChunkedLogWriter(blob_store)) as log_writer:
+                print(f"from {name}")
+            references[name] = log_writer.reference
+
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            threads = [threading.Thread(target=run, args=(n,)) for n in ["a", "b"]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # The original stream is put back once no thread is capturing.
+            self.assertTrue(sys.stdout is mock_stdout)
+            print("not captured")
+
+        self.assertEqual(read_log_range(references["a"]), b"from a\n")
+        self.assertEqual(read_log_range(references["b"]), b"from b\n")
+        self.assertTrue("from a" in mock_stdout.getvalue())
+
+    def run_step(self, environ: dict):
+        """ Runs the sample process_data step with environ added to its settings, and returns
+        its log object. """
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+        database_path = Path(self.directory.name) / "metastore.db"
+        metastore = SQLiteMetastore(database_path)
+        workflow_node_id = metastore.create_workflow_node(build_workflow_object())
+        metastore.close()
+
+        execution_file = Path(self.directory.name) / "execution.py"
+        execution_file.write_text(
+            "import sys\n"
+            "print('hello from the execution file')\n"
+            "sys.stderr.write('and from its stderr\\n')\n"
+            + (Path("tests") / "sample_process_data_execution.py").read_text()
+        )
+
+        credentials = {"backend": "sqlite", "path": str(database_path)}
+        environ = {
+            "INPUT_WORKFLOW_NODE_ID": workflow_node_id,
+            "INPUT_STEP_NAME": "process_data",
+            "INPUT_METASTORE_CREDENTIALS": str(
+                base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")),
+                "utf-8",
+            ),
+            "GITHUB_RUN_ID": str(uuid.uuid4()),
+            "GITHUB_WORKSPACE": ".",
+            "INPUT_SCHEMAS_DIRECTORY": "tests/schemas_for_test",
+            "INPUT_CACHE_DIRECTORY": self.directory.name,
+            "INPUT_INPUT_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/input/input.yaml",
+            "INPUT_EXECUTION_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/execution/execution.yaml",
+            "INPUT_EXECUTION_FILE": str(execution_file),
+            **environ,
+        }
+        with patch.dict(os.environ, environ), patch(
+            "sys.stdout", new_callable=io.StringIO
+        ), patch("sys.stderr", new_callable=io.StringIO):
+            sub_main()
+
+        metastore = SQLiteMetastore(database_path)
+        (log_node_id,) = metastore._connection.execute(
+            "SELECT id FROM nodes WHERE node_type = 'log'"
+        ).fetchone()
+        (log_object, _) = metastore.get_object(log_node_id)
+        metastore.close()
+        return log_object
+
+    def test_log_node_references_captured_log(self):
+        expired_log_path = Path(self.directory.name) / "logs" / "expired"
+        expired_log_path.mkdir(parents=True)
+        os.utime(expired_log_path, (0, 0))
+
+        store_url = f"file://{expired_log_path.parent}"
+        log_object = self.run_step(
+            {"INPUT_RAW_LOG_STORE": store_url, "INPUT_RAW_LOG_CHUNK_SIZE": "256"}
+        )
+
+        self.assertFalse(expired_log_path.exists())
+        self.assertTrue(log_object.raw_log.startswith(store_url + "/"))
+        raw_log = read_log_range(log_object.raw_log).decode("utf-8")
+        self.assertTrue("hello from the execution file" in raw_log)
+        self.assertTrue("and from its stderr" in raw_log)
+        self.assertTrue("Loading contract for 'process_data.input'" in raw_log)
+        self.assertEqual(
+            log_object.log_property_bag["raw_log"]["size"], len(raw_log.encode("utf-8"))
+        )
+        self.assertTrue(log_object.log_property_bag["raw_log"]["chunk_count"] > 1)
+
+    def test_no_raw_log_without_a_store(self):
+        with patch.dict(os.environ):
+            os.environ.pop("INPUT_RAW_LOG_STORE", None)
+            log_object = self.run_step({})
+
+        self.assertEqual(log_object.raw_log, "")
+        self.assertFalse("raw_log" in log_object.log_property_bag)
+        self.assertTrue("trace" in log_object.log_property_bag)
+
+
+if __name__ == "__main__":
+    unittest.main()
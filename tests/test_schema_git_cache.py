@@ -0,0 +1,164 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import git
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from schema_git_cache import (  # noqa E402
+    fetch_schemas_from_git,
+    get_remote_commit,
+    open_mirror,
+)
+
+from utils.utils import KnownException  # noqa E402
+
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+class test_schema_git_cache(unittest.TestCase):
+    """Schema git mirror cache test cases (offline, against a file:// repo)."""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.schemas_directory = self.root / "schemas"
+        self.schemas_directory.mkdir()
+
+        self.environment = patch.dict(
+            os.environ,
+            dict(GIT_IDENTITY, INPUT_CACHE_DIRECTORY=str(self.root / "cache")),
+        )
+        self.environment.start()
+
+        self.remote_path = self.root / "remote"
+        self.remote_path.mkdir()
+        self.remote = git.Git(str(self.remote_path))
+        self.remote.init()
+        shutil.copy(
+            str(Path("tests") / "schemas_for_test" / "base.yaml"),
+            str(self.remote_path / "base.yaml"),
+        )
+        (self.remote_path / "README.md").write_text("Not a schema")
+        self.commit("Initial schemas")
+
+        self.git_url = self.remote_path.resolve().as_uri()
+
+    def tearDown(self):
+        self.environment.stop()
+        shutil.rmtree(str(self.root), ignore_errors=True)
+
+    def commit(self, message):
+        self.remote.add("--all")
+        self.remote.commit("-m", message)
+
+    def test_fetches_once_until_remote_moves(self):
+        (checkout_path, fetched) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory
+        )
+        self.assertTrue(fetched)
+        self.assertTrue((checkout_path / "base.yaml").exists())
+
+        (second_checkout_path, fetched) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory
+        )
+        self.assertFalse(fetched)
+        self.assertEqual(checkout_path, second_checkout_path)
+
+        (self.remote_path / "base.yaml").write_text("# moved\n")
+        self.commit("Move the ref")
+
+        (third_checkout_path, fetched) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory
+        )
+        self.assertTrue(fetched)
+        self.assertEqual(checkout_path, third_checkout_path)
+        self.assertEqual((checkout_path / "base.yaml").read_text(), "# moved\n")
+        self.assertEqual(len(list(self.schemas_directory.iterdir())), 1)
+
+    def test_only_schema_paths_checked_out(self):
+        (checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory
+        )
+        self.assertFalse((checkout_path / "README.md").exists())
+
+        (checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.root / "other", schema_paths=["README.md"]
+        )
+        self.assertTrue((checkout_path / "README.md").exists())
+        self.assertFalse((checkout_path / "base.yaml").exists())
+
+    def test_ref_matches_exact_name(self):
+        self.remote.branch("schemas")
+        self.remote.checkout("-b", "feature/schemas")
+        (self.remote_path / "base.yaml").write_text("# feature\n")
+        self.commit("Feature schemas")
+
+        # ls-remote lists refs/heads/feature/schemas for 'schemas' too.
+        mirror = open_mirror(self.root / "mirror")
+        for ref in ["schemas", "feature/schemas", "refs/heads/schemas"]:
+            self.assertEqual(
+                get_remote_commit(mirror, self.git_url, ref),
+                self.remote.rev_parse(ref),
+            )
+
+        (checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory, ref="schemas"
+        )
+        self.assertNotEqual((checkout_path / "base.yaml").read_text(), "# feature\n")
+
+        (checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory, ref="feature/schemas"
+        )
+        self.assertEqual((checkout_path / "base.yaml").read_text(), "# feature\n")
+
+        with self.assertRaises(KnownException):
+            fetch_schemas_from_git(self.git_url, self.schemas_directory, ref="feature")
+
+    def test_other_checkouts_are_removed(self):
+        self.remote.branch("schemas")
+        (self.remote_path / "other.yaml").write_text("# master only\n")
+        self.commit("Master schemas")
+        not_a_checkout = self.schemas_directory / "git-notes"
+        not_a_checkout.mkdir()
+
+        (master_checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory
+        )
+        (checkout_path, _) = fetch_schemas_from_git(
+            self.git_url, self.schemas_directory, ref="schemas"
+        )
+
+        self.assertFalse(master_checkout_path.exists())
+        self.assertEqual(
+            sorted(self.schemas_directory.iterdir()),
+            sorted([checkout_path, not_a_checkout]),
+        )
+        self.assertEqual(
+            [path.name for path in self.schemas_directory.glob("**/*.yaml")],
+            ["base.yaml"],
+        )
+
+    def test_missing_ref(self):
+        with self.assertRaises(KnownException) as context:
+            fetch_schemas_from_git(
+                self.git_url, self.schemas_directory, ref="no_such_branch"
+            )
+
+        self.assertTrue("no_such_branch" in str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import unittest
+from pathlib import Path
+
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import schema_hash  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from schema_hash import get_schema_hash  # noqa E402
+
+
+def build_schema_class(schema_type: str, count_field: dict):
+    return type(
+        MLSchema.create_schema(
+            {
+                "mlspec_schema_version": {"meta": "0.0.1"},
+                "mlspec_schema_type": {"meta": schema_type},
+                "schema_version": {"type": "semver", "required": True},
+                "schema_type": {"type": "string", "required": True},
+                "count": count_field,
+            }
+        )
+    )
+
+
+class test_schema_hash(unittest.TestCase):
+    """Schema hash test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+    def test_schema_hash(self):
+        required_count = {"type": "int", "required": True}
+        self.assertEqual(
+            get_schema_hash(build_schema_class("hash_a", required_count)),
+            get_schema_hash(build_schema_class("hash_b", required_count)),
+        )
+        for count_field in [
+            {"type": "int", "required": False},
+            {"type": "string", "required": True},
+            {"type": "int", "required": True, "constraint": "x > 1"},
+        ]:
+            self.assertNotEqual(
+                get_schema_hash(build_schema_class("hash_a", required_count)),
+                get_schema_hash(build_schema_class("hash_c", count_field)),
+            )
+        self.assertNotEqual(
+            get_schema_hash(
+                build_schema_class(
+                    "hash_d", {"type": "int", "required": True, "constraint": "x > 1"}
+                )
+            ),
+            get_schema_hash(
+                build_schema_class(
+                    "hash_e", {"type": "int", "required": True, "constraint": "x > 2"}
+                )
+            ),
+        )
+
+        # Validating doesn't change the hash of a schema (or of the schemas it nests).
+        result_object = MLObject()
+        result_object.set_type(schema_type="data_result", schema_version="9999.0.1")
+        schema_class = type(result_object.get_schema())
+        first_hash = get_schema_hash(schema_class)
+        result_object.validate()
+        schema_hash._schema_hashes.clear()
+        self.assertEqual(get_schema_hash(schema_class), first_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
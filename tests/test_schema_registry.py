@@ -0,0 +1,233 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import marshmallow
+from marshmallow.class_registry import RegistryError
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import schema_registry  # noqa E402
+from schema_registry import (  # noqa E402
+    load_schemas_into_registry,
+    load_schema_index,
+    find_schema_files,
+    get_snapshot_path,
+    lazy_loading_scope,
+    populate_registry_once,
+)
+
+
+class test_schema_registry(unittest.TestCase):
+    """Schema registry snapshot test cases."""
+
+    def setUp(self):
+        self.cache_directory = tempfile.mkdtemp()
+        self.schemas_directory = Path(tempfile.mkdtemp()) / "schemas"
+        shutil.copytree(Path("tests") / "schemas_for_test", self.schemas_directory)
+
+        self.environment = patch.dict(
+            os.environ, {"INPUT_CACHE_DIRECTORY": self.cache_directory}
+        )
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        shutil.rmtree(self.schemas_directory.parent, ignore_errors=True)
+
+    def test_snapshot_miss_then_hit(self):
+        self.assertFalse(load_schemas_into_registry(self.schemas_directory))
+        self.assertTrue(load_schemas_into_registry(self.schemas_directory))
+
+    def test_snapshot_invalidated_on_change(self):
+        self.assertFalse(load_schemas_into_registry(self.schemas_directory))
+
+        workflow_file = self.schemas_directory / "workflow.yaml"
+        workflow_file.write_text(workflow_file.read_text() + "\n# changed\n")
+
+        self.assertFalse(load_schemas_into_registry(self.schemas_directory))
+        self.assertTrue(load_schemas_into_registry(self.schemas_directory))
+
+    def test_snapshot_hit_registers_schemas(self):
+        data_result_file = self.schemas_directory / "data_result.yaml"
+        data_result_file.write_text(
+            data_result_file.read_text().replace(
+                "meta: data_result", "meta: data_result_snapshot"
+            )
+        )
+        load_schemas_into_registry(self.schemas_directory)
+
+        marshmallow.class_registry._registry.pop("9999_0_1_data_result_snapshot")
+        with self.assertRaises(RegistryError):
+            marshmallow.class_registry.get_class("9999_0_1_data_result_snapshot")
+
+        self.assertTrue(load_schemas_into_registry(self.schemas_directory))
+        self.assertTrue(
+            marshmallow.class_registry.get_class("9999_0_1_data_result_snapshot")
+        )
+
+    def test_unchanged_files_are_not_hashed(self):
+        schema_files = find_schema_files(self.schemas_directory)
+        snapshot_path = get_snapshot_path(self.schemas_directory, schema_files)
+        with patch.object(schema_registry, "hash_files") as hash_files:
+            self.assertEqual(
+                get_snapshot_path(self.schemas_directory, schema_files), snapshot_path
+            )
+            hash_files.assert_not_called()
+
+        # A same-size edit still changes the modification time.
+        workflow_file = self.schemas_directory / "workflow.yaml"
+        workflow_file.write_text(workflow_file.read_text().replace("9999", "9998"))
+        file_stat = workflow_file.stat()
+        os.utime(
+            str(workflow_file), ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1)
+        )
+        self.assertNotEqual(
+            get_snapshot_path(self.schemas_directory, schema_files), snapshot_path
+        )
+
+    def test_corrupt_snapshot_is_a_miss(self):
+        load_schemas_into_registry(self.schemas_directory)
+        snapshot_path = get_snapshot_path(
+            self.schemas_directory, find_schema_files(self.schemas_directory)
+        )
+        snapshot_path.write_bytes(b"not a pickle")
+        schema_registry._loaded_indexes.clear()
+
+        self.assertFalse(load_schemas_into_registry(self.schemas_directory))
+        self.assertTrue(load_schemas_into_registry(self.schemas_directory))
+
+    def rename_schema_version(self, version):
+        for schema_file in self.schemas_directory.glob("*.yaml"):
+            schema_file.write_text(schema_file.read_text().replace("9999.0.1", version))
+
+    def is_registered(self, schema_name):
+        try:
+            schema_registry._registry_get_class(schema_name)
+            return True
+        except RegistryError:
+            return False
+
+    def test_index_maps_type_and_version_to_file(self):
+        (schema_index, snapshot_hit) = load_schema_index(self.schemas_directory)
+        self.assertFalse(snapshot_hit)
+        self.assertEqual(
+            schema_index.get_file("training_run", "9999.0.1"), "training_run.yaml"
+        )
+        self.assertTrue(("workflow", "9999.0.1") in schema_index)
+
+        schema_registry._loaded_indexes.clear()
+        (schema_index, snapshot_hit) = load_schema_index(self.schemas_directory)
+        self.assertTrue(snapshot_hit)
+        self.assertEqual(len(schema_index), 9)
+
+    def test_closure_includes_base(self):
+        (schema_index, _) = load_schema_index(self.schemas_directory)
+        self.assertEqual(
+            schema_index.get_closure([("data_result", "9999.0.1")]),
+            [("base", "9999.0.1"), ("data_result", "9999.0.1")],
+        )
+
+    def test_register_step_schemas_only(self):
+        self.rename_schema_version("7777.0.1")
+        (schema_index, _) = load_schema_index(self.schemas_directory)
+
+        workflow_object = {
+            "steps": {
+                "process_data": {
+                    "input": {
+                        "schema_type": "data_source",
+                        "schema_version": "7777.0.1",
+                    },
+                    "execution": {
+                        "schema_type": "data_process_run",
+                        "schema_version": "7777.0.1",
+                    },
+                    "output": {
+                        "schema_type": "data_result",
+                        "schema_version": "7777.0.1",
+                    },
+                }
+            }
+        }
+        self.assertEqual(
+            schema_index.register_step_schemas(workflow_object, "process_data"), 4
+        )
+
+        self.assertTrue(self.is_registered("7777_0_1_base"))
+        self.assertTrue(self.is_registered("7777_0_1_data_result"))
+        self.assertFalse(self.is_registered("7777_0_1_training_run"))
+        self.assertFalse(self.is_registered("7777_0_1_workflow"))
+
+        self.assertEqual(schema_index.register_schema_name("7777_0_1_workflow"), 1)
+        self.assertTrue(self.is_registered("7777_0_1_workflow"))
+
+    def test_lazy_loading_registers_on_lookup(self):
+        self.rename_schema_version("6666.0.1")
+        (schema_index, _) = load_schema_index(self.schemas_directory)
+
+        self.assertFalse(self.is_registered("6666_0_1_training_run"))
+        with lazy_loading_scope():
+            schema_index.enable_lazy_loading()
+            self.assertTrue(
+                marshmallow.class_registry.get_class("6666_0_1_training_run")
+            )
+            self.assertTrue(self.is_registered("6666_0_1_base"))
+            self.assertFalse(self.is_registered("6666_0_1_package_run"))
+
+        # The registry's own lookup is back once the scope ends.
+        self.assertTrue(
+            marshmallow.class_registry.get_class is schema_registry._registry_get_class
+        )
+        self.assertEqual(schema_registry._lazy_indexes, [])
+        with self.assertRaises(RegistryError):
+            marshmallow.class_registry.get_class("6666_0_1_package_run")
+
+    def test_mlspeclib_schemas_parsed_once(self):
+        with lazy_loading_scope():
+            MLSchema.populate_registry()
+            with patch("mlspeclib.mlschema.convert_yaml_to_dict") as mock_convert:
+                ml_object = MLObject()
+                ml_object.set_type(schema_type="base", schema_version="0.0.1")
+                MLSchema.populate_registry()
+        mock_convert.assert_not_called()
+        self.assertTrue(self.is_registered("0_0_1_base"))
+
+    def test_populate_registry_patched_only_in_scope(self):
+        original = MLSchema.__dict__["populate_registry"]
+        # Importing schema_registry doesn't change mlspeclib.
+        self.assertTrue(original is schema_registry._populate_registry_attribute)
+        self.assertFalse(MLSchema.populate_registry is populate_registry_once)
+
+        with self.assertRaises(ValueError):
+            with lazy_loading_scope():
+                self.assertTrue(MLSchema.populate_registry is populate_registry_once)
+                with lazy_loading_scope():
+                    pass
+                # Still patched until the outermost block exits.
+                self.assertTrue(MLSchema.populate_registry is populate_registry_once)
+                raise ValueError()
+
+        self.assertTrue(MLSchema.__dict__["populate_registry"] is original)
+        self.assertEqual(schema_registry._scope_depth, 0)
+
+    def test_empty_directory(self):
+        empty_directory = Path(tempfile.mkdtemp())
+        with self.assertRaises(FileNotFoundError) as context:
+            load_schemas_into_registry(empty_directory)
+
+        self.assertTrue("No files ending in" in str(context.exception))
+        shutil.rmtree(empty_directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
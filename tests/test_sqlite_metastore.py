@@ -0,0 +1,218 @@
+import os
+import io
+import sys
+import base64
+import datetime
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import yaml as YAML
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+import main  # noqa E402
+from main import connect_to_metastore, sync_metastore  # noqa E402
+from utils.utils import KnownException  # noqa E402
+
+RUN_ID = "6a9a5931-1c1d-47cc-aaf3-ad8b03f70575"
+
+
+class test_sqlite_metastore(unittest.TestCase):
+    """SQLite metastore test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.metastore = SQLiteMetastore(Path(self.directory.name) / "metastore.db")
+
+    def tearDown(self):
+        self.metastore.close()
+        self.directory.cleanup()
+
+    def build_workflow_object(self):
+        workflow_dict = YAML.safe_load(
+            (Path("tests") / ".parameters" / "workflow.yaml").read_text()
+        )
+        # The fixture's package step names schema types the test schemas spell with an 's'.
+        workflow_dict["steps"]["package"]["input"]["schema_type"] = "training_results"
+        workflow_dict["steps"]["package"]["output"]["schema_type"] = "package_results"
+        workflow_dict["workflow_version"] = "1.0.0"
+        workflow_dict["run_id"] = str(uuid.uuid4())
+        workflow_dict["step_id"] = str(uuid.uuid4())
+        workflow_dict["run_date"] = datetime.datetime.now()
+        (workflow_object, errors) = MLObject.create_object_from_string(workflow_dict)
+        self.assertEqual(len(errors), 0)
+        return workflow_object
+
+    def build_log_object(self, run_id=RUN_ID):
+        log_object = MLObject()
+        log_object.set_type(schema_version="0.1.0", schema_type="log")
+        log_object.run_id = run_id
+        log_object.step_name = "process_data"
+        log_object.run_date = datetime.datetime.now()
+        log_object.raw_log = "raw log"
+        log_object.log_property_bag = {}
+        return log_object
+
+    def test_workflow_round_trip(self):
+        workflow_node_id = self.metastore.create_workflow_node(
+            self.build_workflow_object()
+        )
+        self.assertTrue(workflow_node_id.startswith("workflow|workflow|1.0.0|"))
+
+        (workflow_object, errors) = self.metastore.get_workflow_object(workflow_node_id)
+        self.assertEqual(len(errors), 0)
+        self.assertTrue("process_data" in workflow_object.steps)
+
+    def test_get_missing_object(self):
+        self.assertEqual(self.metastore.get_object("missing"), (None, None))
+
+    def test_attach_step_info(self):
+        workflow_node_id = self.metastore.create_workflow_node(
+            self.build_workflow_object()
+        )
+        node_id = self.metastore.attach_step_info(
+            self.build_log_object(), "1.0.0", workflow_node_id, "process_data", "log",
+        )
+        self.assertTrue(node_id.startswith(f"process_data|log|{RUN_ID}|"))
+
+        (log_object, errors) = self.metastore.get_object(node_id)
+        self.assertEqual(len(errors), 0)
+        self.assertEqual(log_object.raw_log, "raw log")
+
+        all_runs = self.metastore.get_all_runs(workflow_node_id, "process_data")
+        self.assertEqual(list(all_runs.keys()), [node_id])
+
+        with self.assertRaises(ValueError):
+            self.metastore.attach_step_info(
+                self.build_log_object(),
+                "1.0.0",
+                workflow_node_id,
+                "process_data",
+                "not_a_type",
+            )
+
+    def test_attach_step_info_batch(self):
+        node_ids = self.metastore.attach_step_info_batch(
+            [(self.build_log_object(), "input"), (self.build_log_object(), "output"),],
+            "1.0.0",
+            "workflow_id",
+            "process_data",
+        )
+        self.assertEqual(len(node_ids), 2)
+        self.assertEqual(
+            len(self.metastore.get_all_runs("workflow_id", "process_data")), 2
+        )
+
+    def test_database_persists(self):
+        workflow_node_id = self.metastore.create_workflow_node(
+            self.build_workflow_object()
+        )
+        reopened = SQLiteMetastore(self.metastore.path)
+        (workflow_object, _) = reopened.get_workflow_object(workflow_node_id)
+        reopened.close()
+        self.assertTrue(workflow_object is not None)
+
+    def test_sync_to_remote(self):
+        workflow_node_id = self.metastore.create_workflow_node(
+            self.build_workflow_object()
+        )
+        self.metastore.attach_step_info(
+            self.build_log_object(), "1.0.0", workflow_node_id, "process_data", "log",
+        )
+
+        remote = MagicMock()
+        remote.create_workflow_node.return_value = "remote_workflow"
+        remote.attach_step_info.return_value = "remote_log"
+
+        self.assertEqual(self.metastore.sync_to(remote), 2)
+        remote.create_workflow_steps.assert_called_once()
+        self.assertEqual(remote.attach_step_info.call_args[0][2], "remote_workflow")
+        self.assertEqual(remote.attach_step_info.call_args[0][4], "log")
+        self.assertEqual(
+            self.metastore.get_remote_id(workflow_node_id), "remote_workflow"
+        )
+
+        # Nothing left to sync.
+        self.assertEqual(self.metastore.sync_to(remote), 0)
+
+    def test_connect_selects_sqlite_backend(self):
+        credentials = {
+            "backend": "sqlite",
+            "path": str(Path(self.directory.name) / "selected.db"),
+        }
+        credentials_packed = str(
+            base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")),
+            "utf-8",
+        )
+        metastore = connect_to_metastore(credentials_packed)
+        self.assertTrue(isinstance(metastore, SQLiteMetastore))
+        self.assertTrue(Path(credentials["path"]).exists())
+        metastore.close()
+
+    def test_sync_metastore(self):
+        workflow_node_id = self.metastore.create_workflow_node(
+            self.build_workflow_object()
+        )
+        local_credentials = pack_credentials(
+            {"backend": "sqlite", "path": str(self.metastore.path)}
+        )
+        remote_credentials = pack_credentials(
+            {"url": "u", "key": "k", "database_name": "d", "container_name": "c"}
+        )
+        remote = MagicMock()
+        remote.create_workflow_node.return_value = "remote_workflow"
+
+        with patch.object(
+            main, "load_metastore_connection", return_value=remote
+        ), patch("sys.stdout", new_callable=io.StringIO):
+            # Nothing happens unless it is asked for.
+            with patch.dict(
+                os.environ, {"INPUT_METASTORE_CREDENTIALS": local_credentials}
+            ):
+                sync_metastore()
+            self.assertEqual(self.metastore.get_remote_id(workflow_node_id), None)
+
+            with patch.dict(
+                os.environ,
+                {
+                    "INPUT_METASTORE_CREDENTIALS": local_credentials,
+                    "INPUT_SYNC_TO_METASTORE_CREDENTIALS": remote_credentials,
+                },
+            ):
+                sync_metastore()
+            self.assertEqual(
+                self.metastore.get_remote_id(workflow_node_id), "remote_workflow"
+            )
+
+            # Only a SQLite metastore has anything to sync.
+            with patch.dict(
+                os.environ,
+                {
+                    "INPUT_METASTORE_CREDENTIALS": remote_credentials,
+                    "INPUT_SYNC_TO_METASTORE_CREDENTIALS": remote_credentials,
+                },
+            ):
+                with self.assertRaises(KnownException):
+                    sync_metastore()
+
+
+def pack_credentials(credentials: dict) -> str:
+    return str(
+        base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")), "utf-8"
+    )
+
+
+if __name__ == "__main__":
+    unittest.main()
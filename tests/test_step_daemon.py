@@ -0,0 +1,112 @@
+import io
+import os
+import sys
+import stat
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import main  # noqa E402
+from step_daemon import StepDaemonServer, StepJobHandler  # noqa E402
+from step_client import run_on_daemon  # noqa E402
+from utils.utils import KnownException  # noqa E402
+
+
+class test_step_daemon(unittest.TestCase):
+    """Step daemon test cases."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = str(Path(self.directory.name) / "daemon.sock")
+        self.server = StepDaemonServer(self.socket_path, StepJobHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        self.directory.cleanup()
+        main._metastore_connections = None
+
+    def run_job(self, environ: dict) -> (int, str):
+        output = io.StringIO()
+        exit_code = run_on_daemon(
+            self.socket_path, environ, self.directory.name, output=output
+        )
+        return (exit_code, output.getvalue())
+
+    def test_job_runs_with_client_environment(self):
+        def sub_main():
+            print(f"step={os.environ['INPUT_STEP_NAME']}")
+            print(f"cwd={os.getcwd()}")
+
+        saved_cwd = os.getcwd()
+        with patch("main.sub_main", side_effect=sub_main):
+            (exit_code, output) = self.run_job({"INPUT_STEP_NAME": "process_data"})
+
+        self.assertEqual(exit_code, 0)
+        self.assertTrue("step=process_data" in output)
+        self.assertTrue(f"cwd={Path(self.directory.name).resolve()}" in output)
+
+        # The daemon's own environment and directory are restored after the job.
+        self.assertEqual(os.getcwd(), saved_cwd)
+        self.assertFalse(os.environ.get("INPUT_STEP_NAME") == "process_data")
+
+    def test_known_exception_exits_with_error(self):
+        with patch("main.sub_main", side_effect=KnownException("Known problem")):
+            (exit_code, _) = self.run_job({})
+        self.assertEqual(exit_code, 1)
+
+    def test_unexpected_exception_is_reported(self):
+        with patch("main.sub_main", side_effect=ValueError("Unexpected problem")):
+            (exit_code, output) = self.run_job({})
+        self.assertEqual(exit_code, 1)
+        self.assertTrue("Unexpected problem" in output)
+
+    def test_system_exit_codes(self):
+        for (code, expected_exit_code) in [(None, 0), (0, 0), (3, 3), ("message", 1)]:
+            with patch("main.sub_main", side_effect=SystemExit(code)):
+                (exit_code, _) = self.run_job({})
+            self.assertEqual(exit_code, expected_exit_code)
+
+    def test_socket_is_private(self):
+        socket_mode = os.stat(self.socket_path).st_mode
+        self.assertTrue(stat.S_ISSOCK(socket_mode))
+        self.assertEqual(stat.S_IMODE(socket_mode), 0o600)
+
+    def test_other_users_are_refused(self):
+        with patch("main.sub_main", side_effect=lambda: print("ran")) as sub_main:
+            with patch("step_daemon.get_peer_uid", return_value=os.getuid() + 1):
+                (exit_code, output) = self.run_job({})
+            sub_main.assert_not_called()
+            self.assertEqual((exit_code, output), (1, ""))
+
+            # The client's own user is accepted.
+            self.assertEqual(self.run_job({}), (0, "ran\n"))
+
+    def test_consecutive_jobs(self):
+        with patch("main.sub_main", side_effect=lambda: print("ran")):
+            results = [self.run_job({}) for _ in range(3)]
+        self.assertEqual(results, [(0, "ran\n")] * 3)
+
+    def test_metastore_connections_kept(self):
+        main.keep_metastore_connections()
+        with patch(
+            "main.open_metastore_connection", return_value="connection"
+        ) as mock_open:
+            self.assertEqual(main.connect_to_metastore("credentials"), "connection")
+            self.assertEqual(main.connect_to_metastore("credentials"), "connection")
+            main.connect_to_metastore("other credentials")
+        self.assertEqual(mock_open.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
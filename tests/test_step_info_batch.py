@@ -0,0 +1,164 @@
+import sys
+import base64
+import datetime
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+import yaml as YAML
+import gremlin_python
+from gremlin_python.driver import client
+from mlspeclib import MLObject
+from mlspeclib.experimental.metastore import Metastore
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import step_info_batch  # noqa E402
+from step_info_batch import StepInfoBatch, StepInfoWriter  # noqa E402
+from io_executor import SerialExecutor  # noqa E402
+from tracing import TracedMetastore, Tracer  # noqa E402
+from utils.utils import KnownException  # noqa E402
+
+CONTENT_TYPES = ["input", "execution", "output", "log"]
+
+
+def build_log_object(step_name):
+    log_object = MLObject()
+    log_object.set_type(schema_version="0.1.0", schema_type="log")
+    log_object.run_id = "6a9a5931-1c1d-47cc-aaf3-ad8b03f70575"
+    log_object.step_name = step_name
+    log_object.run_date = datetime.datetime(2020, 1, 1)
+    log_object.raw_log = "raw log"
+    log_object.log_property_bag = {}
+    return log_object
+
+
+class test_step_info_batch(unittest.TestCase):
+    """Batched step info write test cases."""
+
+    def setUp(self):
+        credentials = {
+            "url": "wss://localhost",
+            "key": "key",
+            "database_name": "database",
+            "container_name": "container",
+        }
+        credentials_packed = str(
+            base64.urlsafe_b64encode(YAML.safe_dump(credentials).encode("utf-8")),
+            "utf-8",
+        )
+        with patch.object(gremlin_python.driver.client, "Client"):
+            self.metastore = Metastore(credentials_packed)
+        # A gremlin server adds every vertex and returns how many it added.
+        self.metastore.execute_query = MagicMock(
+            side_effect=lambda query: [query.count(".addV(")]
+        )
+
+    def attach_all(self, writer):
+        return [
+            writer.attach(build_log_object("process_data"), content_type)
+            for content_type in CONTENT_TYPES
+        ]
+
+    def test_batch_writes_one_traversal(self):
+        batch = StepInfoBatch(
+            self.metastore, SerialExecutor(), "9999.0.1", "workflow_id", "process_data"
+        )
+        futures = self.attach_all(batch)
+        self.assertFalse(any(future.done() for future in futures))
+        self.metastore.execute_query.assert_not_called()
+
+        batch.flush()
+
+        self.assertEqual(self.metastore.execute_query.call_count, 1)
+        traversal = self.metastore.execute_query.call_args[0][0]
+        self.assertEqual(traversal.count(".hasId('process_data')"), 1)
+        self.assertEqual(traversal.count(".addV("), 4)
+        self.assertEqual(traversal.count(".addE('results')"), 4)
+        self.assertEqual(traversal.count(".addE('root')"), 4)
+
+        node_ids = [future.result() for future in futures]
+        for (node_id, content_type) in zip(node_ids, CONTENT_TYPES):
+            self.assertTrue(node_id.startswith(f"process_data|{content_type}|"))
+            self.assertTrue(f"'{node_id}'" in traversal)
+
+    def test_batch_splits_long_traversals(self):
+        batch = StepInfoBatch(
+            self.metastore, SerialExecutor(), "9999.0.1", "workflow_id", "process_data"
+        )
+        futures = self.attach_all(batch)
+        with patch.object(step_info_batch, "MAX_TRAVERSAL_LENGTH", 10):
+            batch.flush()
+
+        self.assertEqual(self.metastore.execute_query.call_count, 4)
+        for call in self.metastore.execute_query.call_args_list:
+            self.assertTrue("as('c0')" in call[0][0])
+            self.assertTrue(
+                call[0][0].startswith(
+                    "g.V('id', 'workflow_id').out().hasId('process_data')"
+                )
+            )
+            self.assertTrue(call[0][0].endswith(".union(select('c0')).count()"))
+        self.assertEqual(len(set(future.result() for future in futures)), 4)
+
+    def test_batch_failure_sets_exceptions(self):
+        self.metastore.execute_query.side_effect = ValueError(
+            "Query returned zero results."
+        )
+        batch = StepInfoBatch(
+            self.metastore, SerialExecutor(), "9999.0.1", "workflow_id", "process_data"
+        )
+        futures = self.attach_all(batch)
+        batch.flush()
+
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result()
+
+    def test_batch_checks_vertex_count(self):
+        # The step vertex wasn't found (or wasn't unique), so nothing was added.
+        self.metastore.execute_query = MagicMock(return_value=[0])
+        batch = StepInfoBatch(
+            TracedMetastore(self.metastore, Tracer()),
+            SerialExecutor(),
+            "9999.0.1",
+            "workflow_id",
+            "process_data",
+        )
+        futures = self.attach_all(batch)
+        batch.flush()
+
+        self.metastore.execute_query.assert_called_once()
+        for future in futures:
+            with self.assertRaises(KnownException):
+                future.result()
+
+    def test_batch_uses_metastore_batch_call(self):
+        metastore = MagicMock(spec=["attach_step_info_batch"])
+        metastore.attach_step_info_batch.return_value = ["a", "b", "c", "d"]
+        batch = StepInfoBatch(
+            metastore, SerialExecutor(), "9999.0.1", "workflow_id", "process_data"
+        )
+        futures = self.attach_all(batch)
+        batch.flush()
+
+        metastore.attach_step_info_batch.assert_called_once()
+        self.assertEqual([future.result() for future in futures], ["a", "b", "c", "d"])
+
+    def test_writer_attaches_each_object(self):
+        metastore = MagicMock(spec=["attach_step_info"])
+        metastore.attach_step_info.side_effect = ["a", "b", "c", "d"]
+        writer = StepInfoWriter(
+            metastore, SerialExecutor(), "9999.0.1", "workflow_id", "process_data"
+        )
+        futures = self.attach_all(writer)
+
+        self.assertEqual(metastore.attach_step_info.call_count, 4)
+        self.assertEqual([future.result() for future in futures], ["a", "b", "c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import io
+import sys
+import uuid
+import base64
+import datetime
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import (  # noqa E402
+    StepResult,
+    write_step_outputs,
+    encode_results_object,
+    load_parameters,
+)
+from step_output import (  # noqa E402
+    OutputSink,
+    Base64Writer,
+    dump_yaml,
+    write_base64_yaml,
+    write_base64_msgpack,
+    repr_uuid,
+    BASE64_BLOCK_SIZE,
+    MSGPACK_PREFIX,
+)
+from parameter_loader import decode_base64_parameters  # noqa E402
+from utils.utils import KnownException  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+import step_output  # noqa E402
+
+
+class NullStream:
+    """ Counts what is written without keeping it. """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+class test_step_output(unittest.TestCase):
+    """Step output test cases."""
+
+    def test_dump_yaml_matches_safe_dump(self):
+        YAML.SafeDumper.add_representer(uuid.UUID, repr_uuid)
+        data = {
+            "b": 1,
+            "a": [1, 2.5, None, True, "x"],
+            "empty": [{}, []],
+            "multi_line": "first\nsecond",
+            "looks_like_a_number": "123",
+            "looks_like_a_bool": "yes",
+            "unicode": "ünïcode",
+            "date": datetime.datetime(2020, 1, 2, 3, 4, 5),
+            "id": uuid.uuid4(),
+            "long": "x" * 200 + " " + "y" * 50,
+            "nested": {
+                "rows": [{"id": index, "tags": ["a", "b"]} for index in range(5)]
+            },
+            3: "key that isn't a string",
+        }
+        for value in [data, [], {}, "scalar", None]:
+            stream = io.StringIO()
+            dump_yaml(value, stream)
+            self.assertEqual(stream.getvalue(), YAML.safe_dump(value))
+
+    def test_base64_written_in_blocks(self):
+        data = {"rows": [f"row {index} ✓" for index in range(20000)]}
+        blocks = []
+        size = write_base64_yaml(data, blocks.append)
+
+        self.assertTrue(len(blocks) > 1)
+        # Every block but the last is whole groups of 3 bytes, so has no padding.
+        for block in blocks[:-1]:
+            self.assertTrue(len(block) >= BASE64_BLOCK_SIZE * 4 // 3)
+            self.assertFalse(block.endswith("="))
+        encoded = "".join(blocks)
+        self.assertEqual(size, len(encoded))
+        self.assertEqual(
+            base64.urlsafe_b64decode(encoded).decode("utf-8"), YAML.safe_dump(data)
+        )
+
+        # Short writes that split characters and 3 byte groups are joined up again.
+        blocks = []
+        base64_writer = Base64Writer(blocks.append)
+        for text in ["a", "ü", "bc", "✓✓", "d"]:
+            base64_writer.write(text)
+        base64_writer.close()
+        self.assertEqual(
+            base64.urlsafe_b64decode("".join(blocks)).decode("utf-8"), "aübc✓✓d"
+        )
+
+    def test_peak_memory_stays_small(self):
+        data = {
+            "rows": [{"id": index, "name": f"row {index}"} for index in range(5000)]
+        }
+        yaml_size = len(YAML.safe_dump(data))
+
+        tracemalloc.start()
+        try:
+            with patch.object(step_output, "BASE64_BLOCK_SIZE", 3 * 1024):
+                write_base64_yaml(data, NullStream().write)
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Neither the YAML nodes nor the YAML text of the whole object are held.
+        self.assertTrue(peak < yaml_size / 4)
+
+    def build_step_result(self) -> StepResult:
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+        results_ml_object = MLObject()
+        results_ml_object.set_type(schema_type="data_result", schema_version="9999.0.1")
+        results_ml_object.data_output_path = "tests/data/data_output.csv"
+        results_ml_object.data_statistics_path = "tests/data/data_stats.csv"
+        results_ml_object.data_schemas_path = "tests/data/data_schemas.yaml"
+        results_ml_object.feature_file_path = "tests/data/feature_file.yaml"
+        results_ml_object.run_id = str(uuid.uuid4())
+        results_ml_object.step_id = uuid.uuid4()
+        results_ml_object.run_date = datetime.datetime.now()
+        for field_name in results_ml_object.execution_profile.keys():
+            results_ml_object.execution_profile[field_name] = 0.5
+        results_ml_object.execution_profile.network_traffic_in_bytes = 12345
+        results_ml_object.execution_profile.nvidia_metrics = {}
+        return StepResult(results_ml_object, "input-id", "exec-id", "out-id", "log-id")
+
+    def test_step_outputs(self):
+        step_result = self.build_step_result()
+        results_ml_object = step_result.results_ml_object
+
+        with tempfile.TemporaryFile() as output_file, patch(
+            "sys.stdout", new_callable=io.StringIO
+        ) as mock_stdout, patch.object(
+            MLObject,
+            "dict_without_internal_variables",
+            wraps=results_ml_object.dict_without_internal_variables,
+        ) as mock_dict:
+            output_sink = OutputSink(output_file)
+            write_step_outputs(output_sink, step_result, "process_data_")
+            output_file.seek(0)
+            output_message = output_file.read().decode("utf-8")
+
+        # The results object is converted once for both outputs.
+        self.assertEqual(mock_dict.call_count, 1)
+        self.assertEqual(mock_stdout.getvalue(), output_message)
+
+        outputs = dict(
+            line[len("::set-output name=") :].split("::", 1)
+            for line in output_message.splitlines()
+        )
+        self.assertEqual(
+            sorted(outputs.keys()),
+            [
+                "process_data_execution_node_id",
+                "process_data_input_node_id",
+                "process_data_log_node_id",
+                "process_data_output_base64_encoded",
+                "process_data_output_node_id",
+                "process_data_output_raw",
+            ],
+        )
+        self.assertEqual(outputs["process_data_log_node_id"], "log-id")
+        self.assertEqual(
+            outputs["process_data_output_base64_encoded"],
+            encode_results_object(results_ml_object),
+        )
+        decoded = YAML.safe_load(
+            base64.urlsafe_b64decode(outputs["process_data_output_base64_encoded"])
+        )
+        self.assertEqual(decoded["data_output_path"], "tests/data/data_output.csv")
+        self.assertEqual(decoded["schema_type"], "data_result")
+
+    def test_msgpack_round_trip(self):
+        step_result = self.build_step_result()
+        results_dict = step_result.results_ml_object.dict_without_internal_variables()
+
+        with tempfile.TemporaryFile() as output_file, patch(
+            "sys.stdout", new_callable=io.StringIO
+        ):
+            write_step_outputs(OutputSink(output_file), step_result, "", "msgpack")
+            output_file.seek(0)
+            output_message = output_file.read().decode("utf-8")
+        encoded = [
+            line.split("::", 2)[2]
+            for line in output_message.splitlines()
+            if line.startswith("::set-output name=output_base64_encoded::")
+        ][0]
+
+        self.assertTrue(encoded.startswith(MSGPACK_PREFIX))
+        self.assertTrue(
+            len(encoded) < len(encode_results_object(step_result.results_ml_object))
+        )
+
+        # Chained steps get it back through INPUT_*_PARAMETERS_BASE64, as with YAML.
+        for parameters_base64 in [
+            encoded,
+            encode_results_object(step_result.results_ml_object),
+        ]:
+            decoded = load_parameters(
+                "INPUT", None, {"INPUT_INPUT_PARAMETERS_BASE64": parameters_base64}
+            )
+            self.assertEqual(
+                decoded["data_output_path"], results_dict["data_output_path"]
+            )
+            self.assertEqual(decoded["step_id"], str(results_dict["step_id"]))
+            (contract_object, errors) = MLObject.create_object_from_string(decoded)
+            self.assertEqual(errors, {})
+
+        decoded = decode_base64_parameters(encoded)
+        self.assertEqual(decoded["run_date"], results_dict["run_date"].isoformat())
+        self.assertEqual(
+            decoded["execution_profile"], results_dict["execution_profile"]
+        )
+
+    def test_msgpack_blocks_and_errors(self):
+        data = {
+            "rows": [f"row {index}" for index in range(50000)],
+            "bytes": b"\x00\x01",
+        }
+        blocks = []
+        size = write_base64_msgpack(data, blocks.append)
+        self.assertEqual(size, len("".join(blocks)))
+        self.assertEqual(decode_base64_parameters("".join(blocks)), data)
+
+        with self.assertRaises(TypeError):
+            write_base64_msgpack({"value": object()}, blocks.append)
+
+        with tempfile.TemporaryFile() as output_file:
+            with self.assertRaises(KnownException):
+                OutputSink(output_file).write_encoded_output("output", {}, "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import io
+import os
+import sys
+import base64
+import datetime
+import tempfile
+import threading
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+from box import Box
+from mlspeclib import MLObject, MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import sub_main  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from step_scheduler import (  # noqa E402
+    select_steps,
+    build_step_graph,
+    get_step_environ,
+    has_own_input_parameters,
+    run_steps,
+)
+from utils.utils import KnownException  # noqa E402
+
+TRAIN_EXECUTION_PARAMETERS = """\
+schema_version: 9999.0.1
+schema_type: training_run
+nodes: 2
+cpu_per_node: 8
+ram_per_node: 16
+gpu_required: True
+output_path: /tmp/model
+training_params:
+  learning_rate: 0.01
+  loss: 0.1
+  batch_size: 32.0
+  epoch: 10.0
+  optimizer: [adam]
+  train_op: minimize
+  other_tags: {framework: none}
+"""
+
+
+def build_workflow_dict():
+    workflow_dict = YAML.safe_load(
+        (Path("tests") / ".parameters" / "workflow.yaml").read_text()
+    )
+    # The fixture names schema types the test schemas spell with an 's'.
+    workflow_dict["steps"]["train"]["output"]["schema_type"] = "training_results"
+    workflow_dict["steps"]["package"]["input"]["schema_type"] = "training_results"
+    workflow_dict["steps"]["package"]["output"]["schema_type"] = "package_results"
+    return workflow_dict
+
+
+class test_step_scheduler(unittest.TestCase):
+    """Multi-step scheduling test cases."""
+
+    def setUp(self):
+        self.workflow_object = Box(build_workflow_dict())
+
+    def test_build_step_graph_follows_previous(self):
+        step_names = select_steps(self.workflow_object, ["*"])
+        self.assertEqual(step_names, ["process_data", "train", "package"])
+        self.assertEqual(
+            build_step_graph(self.workflow_object, step_names),
+            {"process_data": [], "train": ["process_data"], "package": ["train"]},
+        )
+
+        # A previous step that isn't being run is assumed to have run already.
+        self.assertEqual(
+            build_step_graph(self.workflow_object, ["package"]), {"package": []}
+        )
+
+    def test_unknown_step_and_cycle(self):
+        with self.assertRaises(KnownException):
+            select_steps(self.workflow_object, ["process_data", "deploy"])
+
+        self.workflow_object.steps.process_data.previous = "package"
+        with self.assertRaises(KnownException) as context:
+            build_step_graph(self.workflow_object, ["process_data", "train", "package"])
+        self.assertTrue("cycle" in str(context.exception))
+
+    def test_get_step_environ(self):
+        environ = {
+            "INPUT_EXECUTION_FILE": "default.py",
+            "INPUT_PROCESS_DATA__EXECUTION_FILE": "process_data.py",
+            "INPUT_TRAIN__INPUT_PARAMETERS_RAW": "schema_type: data_result",
+        }
+        step_environ = get_step_environ(environ, "process_data")
+        self.assertEqual(step_environ["INPUT_STEP_NAME"], "process_data")
+        self.assertEqual(step_environ["INPUT_EXECUTION_FILE"], "process_data.py")
+        self.assertEqual(
+            get_step_environ(environ, "train")["INPUT_EXECUTION_FILE"], "default.py"
+        )
+        self.assertTrue(has_own_input_parameters(environ, "train"))
+        self.assertFalse(has_own_input_parameters(environ, "process_data"))
+
+    def test_independent_steps_run_in_parallel(self):
+        # Both steps have to be running at once to get past the barrier.
+        barrier = threading.Barrier(2, timeout=10)
+
+        def run_step_function(step_name, previous_results):
+            if step_name in ["left", "right"]:
+                barrier.wait()
+            return sorted(previous_results.keys())
+
+        (results, failures) = run_steps(
+            {"left": [], "right": [], "join": ["left", "right"]}, run_step_function
+        )
+        self.assertEqual(failures, {})
+        self.assertEqual(results["join"], ["left", "right"])
+
+    def test_failed_step_skips_dependents_only(self):
+        def run_step_function(step_name, previous_results):
+            if step_name == "train":
+                raise KnownException("train failed")
+            return step_name
+
+        (results, failures) = run_steps(
+            {
+                "process_data": [],
+                "train": ["process_data"],
+                "package": ["train"],
+                "report": ["process_data"],
+            },
+            run_step_function,
+        )
+        self.assertEqual(sorted(results.keys()), ["process_data", "report"])
+        self.assertEqual(sorted(failures.keys()), ["package", "train"])
+
+    def test_sub_main_chains_steps(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+
+        workflow_dict = build_workflow_dict()
+        workflow_dict["workflow_version"] = "1.0.0"
+        workflow_dict["run_id"] = str(uuid.uuid4())
+        workflow_dict["step_id"] = str(uuid.uuid4())
+        workflow_dict["run_date"] = datetime.datetime.now()
+        (workflow_object, errors) = MLObject.create_object_from_string(workflow_dict)
+        self.assertEqual(len(errors), 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            database_path = Path(directory) / "metastore.db"
+            metastore = SQLiteMetastore(database_path)
+            workflow_node_id = metastore.create_workflow_node(workflow_object)
+            metastore.close()
+
+            train_parameters_path = Path(directory) / "train_execution.yaml"
+            train_parameters_path.write_text(TRAIN_EXECUTION_PARAMETERS)
+
+            credentials = {"backend": "sqlite", "path": str(database_path)}
+            environ = {
+                "INPUT_WORKFLOW_NODE_ID": workflow_node_id,
+                "INPUT_STEP_NAMES": "process_data, train",
+                "INPUT_METASTORE_CREDENTIALS": str(
+                    base64.urlsafe_b64encode(
+                        YAML.safe_dump(credentials).encode("utf-8")
+                    ),
+                    "utf-8",
+                ),
+                "GITHUB_RUN_ID": str(uuid.uuid4()),
+                "GITHUB_WORKSPACE": ".",
+                "INPUT_SCHEMAS_DIRECTORY": "tests/schemas_for_test",
+                "INPUT_CACHE_DIRECTORY": directory,
+                "INPUT_INPUT_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/input/input.yaml",
+                "INPUT_PROCESS_DATA__EXECUTION_PARAMETERS_FILE_PATH": "tests/.parameters/process_data/execution/execution.yaml",
+                "INPUT_PROCESS_DATA__EXECUTION_FILE": "tests/sample_process_data_execution.py",
+                "INPUT_TRAIN__EXECUTION_PARAMETERS_FILE_PATH": str(
+                    train_parameters_path
+                ),
+                "INPUT_TRAIN__EXECUTION_FILE": "tests/sample_train_execution.py",
+            }
+            with patch.dict(os.environ, environ), patch(
+                "sys.stdout", new_callable=io.StringIO
+            ) as mock_stdout:
+                sub_main()
+
+            output = mock_stdout.getvalue()
+            self.assertTrue("name=process_data_output_node_id::" in output)
+            self.assertTrue("name=train_output_node_id::" in output)
+
+            metastore = SQLiteMetastore(database_path)
+            rows = metastore._connection.execute(
+                "SELECT step_name, node_type FROM nodes WHERE node_type = 'input' ORDER BY rowid"
+            ).fetchall()
+            log_node_ids = metastore._connection.execute(
+                "SELECT id FROM nodes WHERE node_type = 'log' ORDER BY rowid"
+            ).fetchall()
+            traces = [
+                metastore.get_object(log_node_id)[0].log_property_bag["trace"]
+                for (log_node_id,) in log_node_ids
+            ]
+            metastore.close()
+
+        # train ran after process_data, with its results as input.
+        self.assertEqual(rows, [("process_data", "input"), ("train", "input")])
+        # Each step's log only covers that step's spans.
+        self.assertEqual(len(traces), 2)
+        for trace in traces:
+            self.assertEqual(trace["phases"]["execute_step"]["count"], 1)
+            self.assertEqual(trace["phases"]["metastore.attach_step_info"]["count"], 3)
+            self.assertFalse("startup.load_schemas" in trace["phases"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+import tempfile
+import unittest
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from tracing import Tracer, TracedMetastore, get_tracer, reset_tracer  # noqa E402
+
+
+class test_tracing(unittest.TestCase):
+    """Span tracing test cases."""
+
+    def test_span_records_duration(self):
+        tracer = Tracer()
+        with tracer.span("phase", detail="value"):
+            time.sleep(0.01)
+
+        self.assertEqual(len(tracer.spans), 1)
+        self.assertEqual(tracer.spans[0].name, "phase")
+        self.assertTrue(tracer.spans[0].duration >= 0.01)
+        self.assertEqual(tracer.spans[0].args, {"detail": "value"})
+
+    def test_span_recorded_on_exception(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("failed")
+        self.assertEqual([span.name for span in tracer.spans], ["failing"])
+
+    def test_wrap(self):
+        tracer = Tracer()
+        self.assertEqual(tracer.wrap("add", lambda a, b: a + b)(1, b=2), 3)
+        self.assertEqual([span.name for span in tracer.spans], ["add"])
+
+    def test_chrome_trace(self):
+        tracer = Tracer()
+        with tracer.span("outer"):
+            with tracer.span("inner"):
+                pass
+        thread = threading.Thread(target=tracer.wrap("threaded", lambda: None))
+        thread.start()
+        thread.join()
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace_path = Path(directory) / "trace" / "trace.json"
+            tracer.write_chrome_trace(trace_path)
+            trace = json.loads(trace_path.read_text())
+
+        events = trace["traceEvents"]
+        self.assertEqual(
+            [event["name"] for event in events], ["outer", "inner", "threaded"]
+        )
+        self.assertTrue(all(event["ph"] == "X" for event in events))
+        self.assertTrue(events[0]["ts"] <= events[1]["ts"])
+        self.assertTrue(events[0]["dur"] >= events[1]["dur"])
+        self.assertEqual([event["tid"] for event in events], [0, 0, 1])
+
+    def test_summarize(self):
+        tracer = Tracer()
+        for _ in range(3):
+            with tracer.span("repeated"):
+                pass
+
+        summary = tracer.summarize()
+        self.assertEqual(summary["phases"]["repeated"]["count"], 3)
+        self.assertTrue(
+            summary["phases"]["repeated"]["max_ms"]
+            <= summary["phases"]["repeated"]["total_ms"]
+        )
+        self.assertTrue(
+            summary["elapsed_ms"] >= summary["phases"]["repeated"]["total_ms"]
+        )
+
+    def test_traced_metastore(self):
+        tracer = Tracer()
+        metastore = MagicMock()
+        metastore.get_object.return_value = ("object", None)
+        metastore._gc = "gremlin helpers"
+
+        traced_metastore = TracedMetastore(metastore, tracer)
+        self.assertEqual(traced_metastore.get_object("node"), ("object", None))
+        self.assertEqual(traced_metastore._gc, "gremlin helpers")
+        metastore.get_object.assert_called_once_with("node")
+        self.assertEqual([span.name for span in tracer.spans], ["metastore.get_object"])
+
+    def test_child_summarizes_its_own_spans(self):
+        tracer = Tracer(keep_spans=False)
+        with tracer.span("startup"):
+            pass
+        children = [tracer.child(), tracer.child()]
+
+        def load():
+            with get_tracer().span("nested"):
+                pass
+
+        def run_step(step_tracer):
+            with step_tracer.activate(), get_tracer().span("step"):
+                # Work handed to another thread through wrap() stays with the step.
+                thread = threading.Thread(target=get_tracer().wrap("io", load))
+                thread.start()
+                thread.join()
+
+        threads = [
+            threading.Thread(target=run_step, args=(child,)) for child in children
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for child in children:
+            self.assertEqual(
+                {
+                    name: phase["count"]
+                    for (name, phase) in child.summarize()["phases"].items()
+                },
+                {"step": 1, "io": 1, "nested": 1},
+            )
+        # The parent has every span's totals, but keeps no spans.
+        self.assertEqual(
+            {
+                name: phase["count"]
+                for (name, phase) in tracer.summarize()["phases"].items()
+            },
+            {"startup": 1, "step": 2, "io": 2, "nested": 2},
+        )
+        self.assertEqual(tracer.spans, [])
+        self.assertEqual(children[0].spans, [])
+        # Outside activate(), get_tracer() is the run's tracer again.
+        self.assertFalse(get_tracer() in children)
+
+    def test_traced_metastore_uses_the_current_tracer(self):
+        metastore = MagicMock()
+        traced_metastore = TracedMetastore(metastore)
+        tracer = Tracer()
+        with tracer.activate():
+            traced_metastore.get_object("node")
+        self.assertEqual([span.name for span in tracer.spans], ["metastore.get_object"])
+
+    def test_reset_tracer(self):
+        tracer = reset_tracer()
+        self.assertTrue(get_tracer() is tracer)
+        self.assertFalse(reset_tracer() is tracer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,365 @@
+import sys
+import math
+import uuid
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml as YAML
+import marshmallow
+from box import Box
+from marshmallow import fields
+from mlspeclib import MLObject, MLSchema
+from mlspeclib.helpers import return_schema_name
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+import validator_codegen  # noqa E402
+from main import load_contract_object  # noqa E402
+from schema_registry import load_schema_index  # noqa E402
+from validator_codegen import (  # noqa E402
+    clear_validators,
+    create_object_from_string,
+    generate_validators,
+    get_validator,
+    validate_object,
+)
+
+TEST_SCHEMAS_DIRECTORY = Path("tests") / "schemas_for_test"
+
+# Every mlspeclib field type, with the options that change how a field is declared.
+KITCHEN_SINK_SCHEMA = {
+    "mlspec_schema_version": {"meta": "9998.0.1"},
+    "mlspec_schema_type": {"meta": "kitchen_sink"},
+    "schema_version": {"type": "semver", "required": True},
+    "schema_type": {"type": "string", "required": True},
+    "an_email": {"type": "email"},
+    "a_bucket": {"type": "bucket"},
+    "a_uri": {"type": "uri"},
+    "a_regex": {"type": "string", "regex": "^[a-z]+$", "required": True},
+    "an_allowed": {"type": "string", "allowed": ["red", "green"]},
+    "a_constrained_int": {"type": "int", "constraint": "x > 2", "required": True},
+    "a_constrained_float": {"type": "float", "constraint": "x < 2.0"},
+    "strings": {"type": "list_strings"},
+    "tags": {"type": "tags"},
+    "shapes": {"type": "list_of_tensor_shapes"},
+    "interfaces": {"type": "list_interfaces"},
+    "a_boolean": {"type": "boolean", "required": True, "empty": True},
+    "a_uuid": {"type": "uuid"},
+    "a_date": {"type": "datetime"},
+    "a_list": {"type": "list"},
+    "outer": {
+        "type": "nested",
+        "schema": {
+            "a_path": {"type": "path", "required": True},
+            "inner": {
+                "type": "nested",
+                "schema": {
+                    "a_float": {"type": "float", "required": True},
+                    "a_dict": {"type": "dict"},
+                },
+            },
+        },
+    },
+}
+
+# Values put in place of each field, valid for some fields and not others.
+PROBES = [
+    None,
+    "text",
+    "",
+    "1.0.0",
+    "5",
+    "1.5",
+    "nan",
+    "true",
+    "a: 1",
+    "2020-01-01T00:00:00",
+    5,
+    0,
+    1.5,
+    math.nan,
+    math.inf,
+    2 ** 5000,
+    True,
+    False,
+    {"a": 1},
+    {},
+    [1, "a"],
+    [],
+    [None],
+    ["a", "b"],
+    str(uuid.uuid4()),
+    uuid.uuid4(),
+    datetime.datetime.now(),
+    b"bytes",
+    b"\xff",
+]
+MISSING = object()
+
+
+def build_sample_value(field):
+    """ A value field accepts. """
+    for validator in field.validators:
+        if isinstance(validator, marshmallow.validate.OneOf):
+            return validator.choices[0]
+        if isinstance(validator, marshmallow.validate.Regexp):
+            return "abc"
+        validator_name = getattr(validator, "__name__", "")
+        if validator_name == "validate_type_semver":
+            return "1.0.0"
+        if validator_name == "validate_type_URI":
+            return "https://example.com/a"
+        if validator_name == "validate_type_bucket":
+            return "a-bucket"
+        if validator_name == "validate_type_interfaces":
+            return {"an_input": {"type": "String"}}
+
+    field_type = type(field)
+    if isinstance(field, fields.Nested):
+        return {
+            field_name: build_sample_value(nested_field)
+            for (field_name, nested_field) in field.schema.load_fields.items()
+        }
+    if isinstance(field, fields.DateTime):
+        return datetime.datetime.now()
+    sample_values = {
+        fields.UUID: str(uuid.uuid4()),
+        fields.Email: "someone@example.com",
+        fields.String: "/a/path",
+        fields.Integer: 5,
+        fields.Float: 1.5,
+        fields.Boolean: True,
+        fields.Dict: {"a": 1},
+        fields.Raw: "raw",
+    }
+    if field_type in sample_values:
+        return sample_values[field_type]
+    if field_type is fields.Tuple:
+        return [build_sample_value(item_field) for item_field in field.tuple_fields]
+    if field_type is fields.List:
+        return [build_sample_value(field.inner)]
+    raise NotImplementedError(field_type)
+
+
+def get_outcome(function):
+    """ What function returns, or the type of what it raises. """
+    try:
+        return function()
+    except Exception as error:  # noqa
+        return type(error)
+
+
+class test_validator_codegen(unittest.TestCase):
+    """Generated contract validator test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.kitchen_sink_directory = Path(self.directory.name) / "kitchen_sink"
+        self.kitchen_sink_directory.mkdir()
+        (self.kitchen_sink_directory / "kitchen_sink.yaml").write_text(
+            YAML.safe_dump(KITCHEN_SINK_SCHEMA)
+        )
+
+        self.validators_directory = Path(self.directory.name) / "generated_validators"
+        generate_validators(TEST_SCHEMAS_DIRECTORY, self.validators_directory)
+        generate_validators(self.kitchen_sink_directory, self.validators_directory)
+        self.validators_directory_patch = patch.object(
+            validator_codegen,
+            "GENERATED_VALIDATORS_DIRECTORY",
+            self.validators_directory,
+        )
+        self.validators_directory_patch.start()
+        clear_validators()
+
+    def tearDown(self):
+        self.validators_directory_patch.stop()
+        clear_validators()
+        self.directory.cleanup()
+
+    def build_sample_object(self, schema_type: str, schema_version: str) -> MLObject:
+        schema_class = marshmallow.class_registry.get_class(
+            return_schema_name(schema_version, schema_type)
+        )
+        sample_object = MLObject()
+        sample_object.set_type(schema_version=schema_version, schema_type=schema_type)
+        MLObject.update_tree(
+            sample_object,
+            {
+                **{
+                    field_name: build_sample_value(field)
+                    for (field_name, field) in schema_class().load_fields.items()
+                },
+                "schema_type": schema_type,
+                "schema_version": schema_version,
+            },
+        )
+        return sample_object
+
+    def assert_same_outcome(self, sample_object: MLObject, description: str):
+        schema = sample_object.get_schema()
+        expected_errors = get_outcome(sample_object.validate)
+        is_valid = get_outcome(
+            lambda: get_validator(type(schema)).is_valid(sample_object, schema)
+        )
+        if isinstance(expected_errors, dict):
+            self.assertEqual(is_valid, len(expected_errors) == 0, description)
+        else:
+            # mlspeclib raises; the generated validator must not accept the object.
+            self.assertTrue(is_valid is False or isinstance(is_valid, type))
+        self.assertEqual(
+            get_outcome(lambda: validate_object(sample_object)),
+            expected_errors,
+            description,
+        )
+
+    def test_same_outcome_as_mlspeclib(self):
+        for schemas_directory in [TEST_SCHEMAS_DIRECTORY, self.kitchen_sink_directory]:
+            (schema_index, _) = load_schema_index(schemas_directory)
+            for (schema_type, schema_version) in sorted(schema_index.entries):
+                sample_object = self.build_sample_object(schema_type, schema_version)
+                schema = sample_object.get_schema()
+                self.assertTrue(get_validator(type(schema)) is not None)
+                if schema_type != "workflow":
+                    # Sample workflow steps aren't valid ones.
+                    self.assertEqual(validate_object(sample_object), {})
+
+                # Every field (and every field of a nested schema) in turn, set to each probe
+                # or left out, plus a key the schema doesn't have.
+                targets = [
+                    (sample_object, field_name)
+                    for field_name in list(schema.load_fields) + ["not_a_field"]
+                ]
+                for (field_name, field) in schema.load_fields.items():
+                    if isinstance(field, fields.Nested):
+                        targets.extend(
+                            (sample_object[field_name], nested_field_name)
+                            for nested_field_name in list(field.schema.load_fields)
+                            + ["not_a_field"]
+                        )
+
+                for (container, key) in targets:
+                    had_key = key in container
+                    sample_value = container.get(key)
+                    for probe in PROBES + [MISSING]:
+                        if probe is MISSING:
+                            container.pop(key, None)
+                        else:
+                            container[key] = probe
+                        self.assert_same_outcome(
+                            sample_object, f"{schema_type}: {key}={probe!r}"
+                        )
+                    if had_key:
+                        container[key] = sample_value
+                    else:
+                        container.pop(key, None)
+
+    def test_object_is_not_changed(self):
+        sample_object = self.build_sample_object("kitchen_sink", "9998.0.1")
+        contents = sample_object.to_dict()
+        # Fields with validators that change their value are checked on a copy.
+        self.assertEqual(validate_object(sample_object), {})
+        self.assertEqual(sample_object.to_dict(), contents)
+        self.assertEqual(
+            sample_object.interfaces[0].to_dict(), {"an_input": {"type": "String"}}
+        )
+
+    def test_falls_back_to_mlspeclib(self):
+        sample_object = self.build_sample_object("data_result", "9999.0.1")
+        with patch.object(
+            MLObject, "validate", autospec=True, return_value={}
+        ) as validate:
+            self.assertEqual(validate_object(sample_object), {})
+            validate.assert_not_called()
+
+            # An object that doesn't validate gets mlspeclib's errors.
+            sample_object.run_id = "not a uuid"
+            validate.return_value = {"run_id": ["Not a valid UUID."]}
+            self.assertEqual(
+                validate_object(sample_object), {"run_id": ["Not a valid UUID."]}
+            )
+            self.assertEqual(validate.call_count, 1)
+
+        # As does every object without a module for its schema as registered now.
+        module_path = self.validators_directory / "9999_0_1_data_result.py"
+        source = module_path.read_text()
+        schema_hash = get_validator(type(sample_object.get_schema())).SCHEMA_HASH
+        for changed_source in [
+            source.replace(schema_hash, "0" * len(schema_hash)),
+            source.replace("FORMAT_VERSION = '1'", "FORMAT_VERSION = '0'"),
+            None,
+        ]:
+            if changed_source is None:
+                module_path.unlink()
+            else:
+                module_path.write_text(changed_source)
+            clear_validators()
+            self.assertEqual(get_validator(type(sample_object.get_schema())), None)
+
+    def test_load_contract_object_uses_generated_validator(self):
+        sample_object = self.build_sample_object("data_result", "9999.0.1")
+        workflow_object = Box(
+            {
+                "steps": {
+                    "process_data": {
+                        "output": {
+                            "schema_type": "data_result",
+                            "schema_version": "9999.0.1",
+                        }
+                    }
+                }
+            }
+        )
+        with patch.object(MLObject, "validate") as validate:
+            contract_object = load_contract_object(
+                sample_object, workflow_object, "process_data", "output"
+            )
+        validate.assert_not_called()
+        self.assertTrue(contract_object is sample_object)
+
+    def test_create_object_from_string(self):
+        contents = self.build_sample_object("data_result", "9999.0.1").to_dict()
+        with patch.object(MLObject, "validate") as validate:
+            (contract_object, errors) = create_object_from_string(dict(contents))
+        validate.assert_not_called()
+        self.assertEqual(errors, {})
+        self.assertEqual(contract_object.to_dict(), contents)
+
+        # Invalid contents get mlspeclib's errors.
+        contents["run_id"] = "not a uuid"
+        (contract_object, errors) = create_object_from_string(dict(contents))
+        self.assertEqual(contract_object, None)
+        self.assertEqual(list(errors), ["run_id"])
+
+        # Contents without a type are left to mlspeclib.
+        with patch.object(
+            MLObject, "create_object_from_string", return_value=(None, "error")
+        ) as mlspeclib_create:
+            self.assertEqual(create_object_from_string("run_id: '1'"), (None, "error"))
+        mlspeclib_create.assert_called_once_with("run_id: '1'")
+
+    def test_generates_a_module_per_schema(self):
+        schemas_directory = Path(".parameters") / "schemas"
+        module_paths = generate_validators(
+            schemas_directory, Path(self.directory.name) / "parameters"
+        )
+        self.assertEqual(
+            sorted(module_path.stem for module_path in module_paths),
+            sorted(
+                f"999_0_1_{schema_path.stem}"
+                for schema_path in schemas_directory.glob("*.yaml")
+            ),
+        )
+        for module_path in module_paths:
+            compile(module_path.read_text(), str(module_path), "exec")
+
+
+if __name__ == "__main__":
+    unittest.main()
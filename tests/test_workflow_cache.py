@@ -0,0 +1,135 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from mlspeclib import MLSchema
+
+if Path("src").exists():
+    sys.path.append(str(Path("src")))
+sys.path.append(str(Path.cwd()))
+sys.path.append(str(Path.cwd().parent))
+
+from main import load_workflow_object  # noqa E402
+from sqlite_metastore import SQLiteMetastore  # noqa E402
+from schema_registry import load_schemas_into_registry  # noqa E402
+from workflow_cache import clear_workflow_objects, get_workflow_version  # noqa E402
+from tests.benchmarks.phases import build_workflow_object  # noqa E402
+
+
+class CountingMetastore:
+    """ Counts the calls made to the wrapped metastore. """
+
+    def __init__(self, metastore):
+        self.metastore = metastore
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.metastore, name)
+
+        def counted(*args):
+            self.calls.append(name)
+            return method(*args)
+
+        return counted
+
+
+class GremlinMetastore:
+    """ Stands in for mlspeclib's gremlin Metastore, which has no get_workflow_version. """
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.queries = []
+
+    def execute_query(self, query):
+        self.queries.append(query)
+        if len(self.versions) == 0:
+            raise ValueError("Query returned zero results.")
+        return self.versions
+
+
+class test_workflow_cache(unittest.TestCase):
+    """Workflow object cache test cases."""
+
+    def setUp(self):
+        MLSchema.populate_registry()
+        load_schemas_into_registry(Path.cwd() / "tests" / "schemas_for_test")
+        clear_workflow_objects()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.metastore = SQLiteMetastore(Path(self.directory.name) / "metastore.db")
+        self.workflow_object = build_workflow_object()
+        self.workflow_node_id = self.metastore.create_workflow_node(
+            self.workflow_object, "partition"
+        )
+        self.environ = {"INPUT_METASTORE_CREDENTIALS": self.directory.name}
+
+    def tearDown(self):
+        clear_workflow_objects()
+        self.metastore.close()
+        self.directory.cleanup()
+
+    def load(self, metastore, environ=None):
+        with patch.dict(os.environ, {"INPUT_CACHE_DIRECTORY": self.directory.name}):
+            return load_workflow_object(
+                self.workflow_node_id, metastore, environ or self.environ
+            )
+
+    def test_later_loads_only_revalidate(self):
+        metastore = CountingMetastore(self.metastore)
+        first_object = self.load(metastore)
+        self.assertEqual(
+            metastore.calls, ["get_workflow_version", "get_workflow_object"]
+        )
+
+        # Later steps in this process get the same object.
+        metastore.calls = []
+        self.assertTrue(self.load(metastore) is first_object)
+        self.assertEqual(metastore.calls, ["get_workflow_version"])
+
+        # A new process on the same runner rebuilds it from disk.
+        clear_workflow_objects()
+        cached_object = self.load(metastore)
+        self.assertEqual(metastore.calls, ["get_workflow_version"] * 2)
+        self.assertFalse(cached_object is first_object)
+        self.assertEqual(
+            cached_object.dict_without_internal_variables(),
+            self.workflow_object.dict_without_internal_variables(),
+        )
+        self.assertEqual(
+            cached_object.steps["train"].input.schema_type,
+            self.workflow_object.steps["train"].input.schema_type,
+        )
+
+    def test_new_version_is_fetched(self):
+        self.load(self.metastore)
+
+        with self.metastore._lock:
+            self.metastore._connection.execute(
+                "UPDATE nodes SET workflow_version = '2.0.0' WHERE id = ?",
+                (self.workflow_node_id,),
+            )
+        metastore = CountingMetastore(self.metastore)
+        self.load(metastore)
+        self.assertEqual(
+            metastore.calls, ["get_workflow_version", "get_workflow_object"]
+        )
+
+        # As does every load with the cache turned off.
+        metastore.calls = []
+        self.load(metastore, {**self.environ, "INPUT_OBJECT_CACHE_SIZE_MB": "0"})
+        self.assertEqual(metastore.calls, ["get_workflow_object"])
+
+    def test_gremlin_version_query(self):
+        gremlin_metastore = GremlinMetastore(["1.0.0"])
+        self.assertEqual(get_workflow_version(gremlin_metastore, "it's"), "1.0.0")
+        self.assertEqual(gremlin_metastore.queries, ["g.V('it\\'s').values('version')"])
+
+        self.assertEqual(get_workflow_version(GremlinMetastore([]), "missing"), None)
+        self.assertEqual(get_workflow_version(object(), "unknown metastore"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()